@@ -1,17 +1,118 @@
+import os
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS 
 from lexer import lexer
 from parser import Parser
 from semantic_analyzer import SemanticAnalyzer
 from intermediate_code_generator import IntermediateCodeGenerator
+from fused_compiler import FusedCompiler
 from optimizer import Optimizer
+from inliner import FunctionInliner
+from purity_analyzer import PurityAnalyzer
 from target_code_generator import TargetCodeGenerator
 from virtual_machine import VirtualMachine
+from threaded_virtual_machine import ThreadedVirtualMachine
+from scheduler import Scheduler
+from profiler import Profiler
+from incremental_checker import DocumentCache
+from native_functions import load_native_modules
+from snapshot import SnapshotCodec, program_id
+from sandbox_pool import SandboxPool
+from grader import ExpectedOutput, GradedOutput, OutputMismatch
+from module_library import ModuleLibrary, link, linked_modules
 
 app = Flask(__name__)
 
+# Execution engines a request can pick with "engine"; both run the same target code.
+ENGINES = {
+    "interpreter": VirtualMachine,
+    "threaded": ThreadedVirtualMachine,
+}
+
+# Every execution in this worker is time-sliced on one scheduler, so a slow
+# program cannot block the requests queued behind it.
+scheduler = Scheduler(
+    quantum=int(os.environ.get("FEKRA_QUANTUM", 1000)),
+    policy=os.environ.get("FEKRA_SCHEDULING_POLICY", "round_robin"),
+)
+RUN_TIMEOUT = float(os.environ.get("FEKRA_RUN_TIMEOUT", 30))
+# Cached results of pure function calls per run; "memoize": false turns it off.
+MEMO_SIZE = int(os.environ.get("FEKRA_MEMO_SIZE", 4096))
+
+# Resume tokens for runs that stop unfinished. Workers (and hosts) that
+# share FEKRA_SNAPSHOT_SECRET can resume each other's runs; without it only
+# this process (and the workers forked from it) can.
+snapshots = SnapshotCodec(
+    os.environ.get("FEKRA_SNAPSHOT_SECRET", "").encode() or os.urandom(32),
+    ttl=float(os.environ.get("FEKRA_SNAPSHOT_TTL", 3600)),
+)
+
+# With FEKRA_SANDBOX_WORKERS set, programs run in that many pre-forked
+# processes under CPU and memory limits instead of on this worker's
+# scheduler. Profiled runs always stay in-process.
+SANDBOX_WORKERS = int(os.environ.get("FEKRA_SANDBOX_WORKERS", 0))
+# Modules registering a deployment's own native functions, comma-separated.
+NATIVE_MODULES = os.environ.get("FEKRA_NATIVE_MODULES", "")
+sandbox = SandboxPool(
+    size=SANDBOX_WORKERS,
+    max_runs=int(os.environ.get("FEKRA_SANDBOX_MAX_RUNS", 100)),
+    cpu_seconds=int(os.environ.get("FEKRA_SANDBOX_CPU_SECONDS", 10)),
+    memory_bytes=int(os.environ.get("FEKRA_SANDBOX_MEMORY_MB", 512)) * 1024 * 1024,
+    native_modules=NATIVE_MODULES,
+) if SANDBOX_WORKERS else None
+
+# Largest string a run may build by concatenation. In a sandbox it also
+# stays under a quarter of the memory limit, leaving room to join and
+# print it, so a runaway string fails with its own error first.
+MAX_STRING_BYTES = int(os.environ.get("FEKRA_MAX_STRING_MB", 64)) * 1024 * 1024
+if sandbox is not None and sandbox.memory_bytes:
+    MAX_STRING_BYTES = min(MAX_STRING_BYTES, sandbox.memory_bytes // 4)
+
+# Modules programs can import with استورد: "<name>.fk" files in this
+# directory, each compiled once and linked into the programs importing it.
+LIBRARY_PATH = os.environ.get("FEKRA_LIBRARY_PATH")
+library = ModuleLibrary(LIBRARY_PATH) if LIBRARY_PATH else None
+
+# Parsed statements of the documents being edited, for /check.
+documents = DocumentCache(int(os.environ.get("FEKRA_CHECK_DOCUMENTS", 256)), modules=library)
+
+load_native_modules(NATIVE_MODULES)
+
 CORS(app)
 
+def graded_response(expected, vm, program, mismatch=None):
+    """The verdict of a graded run, without the compiler stages: graders
+    send many runs and only need to know whether the output was right.
+    Without a VM (the run stopped in a sandbox) the mismatch carries the
+    instruction count."""
+    if mismatch is not None:
+        response = expected.verdict(mismatch)
+        response["instructions_executed"] = mismatch.instructions_executed if vm is None else vm.instructions_executed
+        return jsonify(response), 200
+    if not vm.finished():
+        # Out of max_instructions, and right so far.
+        response = {"verdict": "incomplete", "resume_token": snapshots.dump(vm, program)}
+    else:
+        try:
+            expected.check(vm.output)
+            response = expected.verdict()
+        except OutputMismatch as e:
+            response = expected.verdict(e)  # Lines missing at the end
+    response["instructions_executed"] = vm.instructions_executed
+    return jsonify(response), 200
+
+def graded_error_response(error, vm):
+    """The verdict of a graded run stopped by a runtime error. Without a VM
+    the error carries the instruction count, as a sandbox sends it back."""
+    response = {
+        "verdict": "runtime_error",
+        "error": str(error),
+        "line": getattr(error, "source_line", None),
+        "instructions_executed": getattr(error, "instructions_executed", None) if vm is None else vm.instructions_executed,
+    }
+    return jsonify(response), 200
+
 @app.route('/run', methods=['POST'])
 def run_code():
     try:
@@ -21,48 +122,201 @@ def run_code():
         
         if not code:
             return jsonify({"error": "No code provided"}), 400
+
+        engine = data.get("engine", "interpreter")
+        if engine not in ENGINES:
+            return jsonify({"error": f"Unknown engine: {engine}"}), 400
+
+        # Run at most this many instructions, then stop with a resume token.
+        max_instructions = data.get("max_instructions")
+        if max_instructions is not None and (type(max_instructions) is not int or max_instructions < 1):
+            return jsonify({"error": "max_instructions must be a positive integer"}), 400
+
+        # Lower runs first under the "priority" scheduling policy.
+        priority = data.get("priority", 0)
+        if type(priority) is not int:
+            return jsonify({"error": "priority must be an integer"}), 400
+
+        # Grading mode: every printed value is checked as it is printed, and
+        # the run stops at the first wrong one.
+        expected = None
+        if data.get("expected_output") is not None:
+            try:
+                expected = ExpectedOutput(data["expected_output"])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
         
         # Step 1: Tokenize the source code
         tokens = lexer(code)
         
-        # Step 2: Parse tokens into an AST
-        parser = Parser(tokens)
-        ast = parser.parse_program()
-        
-        # Step 3: Perform semantic analysis
-        semantic_analyzer = SemanticAnalyzer(ast)
-        try:
-            semantic_analyzer.analyze()
-        except ValueError as e:
-            return jsonify({"error": f"Semantic analysis error: {e}"}), 400
-        
-        # Step 4: Generate Intermediate Code
-        icg = IntermediateCodeGenerator(ast)
-        ir_code = icg.generate()
+        # Steps 2-4 in one pass over the tokens, when the response does not
+        # include the AST. A program with an error goes through the full
+        # pipeline below, which reports it.
+        include_ast = data.get("include_ast", True) and expected is None
+        fused = None if include_ast else FusedCompiler(tokens, modules=library)
+        if fused is not None and fused.compile():
+            ast = None
+            ir_code, types, source_lines, imports = fused.code, fused.types, fused.source_lines, fused.imports
+        else:
+            # Step 2: Parse tokens into an AST
+            parser = Parser(tokens)
+            ast = parser.parse_program()
+
+            # Step 3: Perform semantic analysis
+            semantic_analyzer = SemanticAnalyzer(ast, modules=library)
+            try:
+                semantic_analyzer.analyze()
+            except ValueError as e:
+                return jsonify({"error": f"Semantic analysis error: {e}"}), 400
+
+            # Step 4: Generate Intermediate Code
+            icg = IntermediateCodeGenerator(ast)
+            ir_code = icg.generate()
+            types, source_lines, imports = icg.types, icg.source_lines, semantic_analyzer.imports
         
         # Step 5: Optimize Intermediate Code
         # optimizer = Optimizer(ir_code)
         # optimized_code = optimizer.optimize()
+        inliner = None
+        if data.get("inline", True):
+            inliner = FunctionInliner(ir_code, types, source_lines)
+            ir_code = inliner.optimize()
+            source_lines = inliner.source_lines
+        modules = linked_modules(imports.values())
+        known_pure = set().union(*(module.pure_functions for module in modules))
+        ir_code = PurityAnalyzer(ir_code, known_pure).analyze()
         
         # Step 6: Generate Target Code
-        tcg = TargetCodeGenerator(ir_code)
+        tcg = TargetCodeGenerator(ir_code, types, source_lines)
         target_code = tcg.generate()
+        # Step 6b: Link the compiled code of the imported modules
+        target_code, source_map = link(modules, target_code, tcg.source_map)
         
         # Step 7: Execute with Virtual Machine
-        vm = VirtualMachine(target_code)
-        output = vm.run()
+        profiler = Profiler(target_code, source_map) if data.get("profile") else None
+        memo_size = MEMO_SIZE if data.get("memoize", True) else 0
+        program = program_id(target_code)
+        state = None
+        if data.get("resume_token"):
+            try:
+                state = snapshots.load(data["resume_token"], program)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if expected is not None:
+                # The run may not have been graded so far.
+                try:
+                    expected.check(state["output"], finished=False)
+                except OutputMismatch as mismatch:
+                    mismatch.instructions_executed = state["instructions_executed"]
+                    return graded_response(expected, None, program, mismatch)
+        if sandbox is not None and profiler is None:
+            # The sandbox's result stands in for the VM below.
+            try:
+                vm = sandbox.run({
+                    "engine": ENGINES[engine],
+                    "target_code": target_code,
+                    "source_map": source_map,
+                    "memo_size": memo_size,
+                    "state": state,
+                    "max_instructions": max_instructions,
+                    "max_string_bytes": MAX_STRING_BYTES,
+                    "expected_output": expected,
+                }, RUN_TIMEOUT)
+            except OutputMismatch as mismatch:
+                return graded_response(expected, None, program, mismatch)
+            except Exception as error:
+                # The program's errors carry the instruction count; the
+                # sandbox's own (it died or timed out) do not.
+                if expected is None or not hasattr(error, "instructions_executed"):
+                    raise
+                return graded_error_response(error, None)
+            if vm.timed_out:
+                response = {
+                    "error": f"Execution did not finish within {RUN_TIMEOUT} seconds.",
+                    "output": vm.output,
+                    "resume_token": snapshots.dump(vm, program),
+                }
+                if expected is not None:
+                    response["verdict"] = "time_limit_exceeded"
+                return jsonify(response), 408
+            output = vm.output
+        else:
+            output = GradedOutput(expected) if expected is not None else None
+            vm = ENGINES[engine](
+                target_code, source_map=source_map, profiler=profiler, memo_size=memo_size, output=output,
+                max_string_bytes=MAX_STRING_BYTES,
+            )
+            if state is not None:
+                vm.restore(state)
+            scheduler.start()
+            task = scheduler.submit(vm, priority=priority, max_instructions=max_instructions)
+            try:
+                output = task.wait(RUN_TIMEOUT)
+            except OutputMismatch as mismatch:
+                return graded_response(expected, vm, program, mismatch)
+            except TimeoutError as e:
+                # Progress is kept: the same code with this token continues the run.
+                response = {"error": str(e), "output": vm.output}
+                if task.error is None and not vm.finished():
+                    response["resume_token"] = snapshots.dump(vm, program)
+                if expected is not None:
+                    response["verdict"] = "time_limit_exceeded"
+                return jsonify(response), 408
+            except Exception as error:
+                if expected is None:
+                    raise
+                return graded_error_response(error, vm)
+        if expected is not None:
+            return graded_response(expected, vm, program)
         
         # Return all stages as a response
-        return jsonify({
+        response = {
             "tokens": tokens,
-            "ast": ast,
             "ir_code": ir_code,
             "target_code": target_code,
-            "output": output
-        }), 200
+            "source_map": source_map.to_json(),
+            "output": output,
+            "instructions_executed": vm.instructions_executed,
+            "finished": vm.finished(),
+        }
+        if include_ast:
+            response["ast"] = ast
+        if not vm.finished():
+            response["resume_token"] = snapshots.dump(vm, program)
+        if inliner is not None:
+            response["inline"] = inliner.stats
+        if profiler is not None:
+            response["profile"] = profiler.report()
+            if vm.memo is not None:
+                response["profile"]["memoization"] = vm.memo.stats()
+            response["profile_collapsed"] = profiler.collapsed_stacks()
+        return jsonify(response), 200
 
     except Exception as e:
-        return jsonify({"error": f"An error occurred: {e}"}), 500
+        response = {"error": f"An error occurred: {e}"}
+        # Runtime errors carry the source line from the source map, syntax
+        # errors the line of the offending token.
+        line = getattr(e, "source_line", None) or getattr(e, "lineno", None)
+        if line is not None:
+            response["line"] = line
+        return jsonify(response), 500
+
+@app.route('/check', methods=['POST'])
+def check_code():
+    # Diagnostics only: nothing is executed. Sending a document_id lets the
+    # next version of the same document reuse the unchanged statements.
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "The request body must be a JSON object"}), 400
+    code = data.get("code", "")
+    if not isinstance(code, str):
+        return jsonify({"error": "code must be a string"}), 400
+    document_id = data.get("document_id")
+    if document_id is not None and not isinstance(document_id, (str, int)):
+        return jsonify({"error": "document_id must be a string or an integer"}), 400
+    checker = documents.checker(document_id)
+    diagnostics, stats = checker.check(code)
+    return jsonify({"diagnostics": diagnostics, "stats": stats}), 200
 
 if __name__ == "__main__":
     # Use the PORT environment variable provided by Render, default to 5000 locally
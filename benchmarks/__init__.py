@@ -0,0 +1,24 @@
+import contextlib
+import io
+
+from inliner import FunctionInliner
+from intermediate_code_generator import IntermediateCodeGenerator
+from lexer import lexer
+from parser import Parser
+from purity_analyzer import PurityAnalyzer
+from semantic_analyzer import SemanticAnalyzer
+from target_code_generator import TargetCodeGenerator
+
+
+def compile_program(code, inline=True):
+    """Run the compiler pipeline the same way app.py does and return the target code."""
+    # The code generators trace to stdout; keep that out of the timings' output.
+    with contextlib.redirect_stdout(io.StringIO()):
+        ast = Parser(lexer(code)).parse_program()
+        SemanticAnalyzer(ast).analyze()
+        icg = IntermediateCodeGenerator(ast)
+        ir_code = icg.generate()
+        if inline:
+            ir_code = FunctionInliner(ir_code, icg.types).optimize()
+        ir_code = PurityAnalyzer(ir_code).analyze()
+        return TargetCodeGenerator(ir_code, icg.types).generate()
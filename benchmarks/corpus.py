@@ -0,0 +1,33 @@
+import os
+
+PROGRAMS_DIR = os.path.join(os.path.dirname(__file__), "programs")
+
+
+def generated_program(blocks):
+    """A large, valid program made of `blocks` repetitions of declarations,
+    arithmetic, a conditional, a short loop and a print, for measuring how
+    the compiler stages cope with big inputs."""
+    lines = []
+    for i in range(blocks):
+        lines.append(f"عرف س_{i} = {i} ؟")
+        lines.append(f"عرف ص_{i} = س_{i} * 2 + {i % 7} ؟")
+        lines.append(f"لو (ص_{i} > س_{i}) {{")
+        lines.append(f"    س_{i} = س_{i} + 1 ؟")
+        lines.append("}")
+        lines.append(f"بينما (س_{i} < {i + 3}) {{")
+        lines.append(f"    س_{i} = س_{i} + 1 ؟")
+        lines.append("}")
+        lines.append('عرض ("كتلة") ؟')
+        lines.append(f"عرض (ص_{i}) ؟")
+    return "\n".join(lines) + "\n"
+
+
+def load_corpus(generated_blocks=300):
+    """Return {name: source} for the shipped programs plus a generated one."""
+    corpus = {}
+    for filename in sorted(os.listdir(PROGRAMS_DIR)):
+        if filename.endswith(".fk"):
+            with open(os.path.join(PROGRAMS_DIR, filename), encoding="utf-8") as f:
+                corpus[filename[:-len(".fk")]] = f.read()
+    corpus[f"generated_{generated_blocks}"] = generated_program(generated_blocks)
+    return corpus
@@ -0,0 +1,97 @@
+"""Compare the execution engines on loop-heavy programs.
+
+    python -m benchmarks.engines [--repeat N]
+"""
+import argparse
+import time
+
+from benchmarks import compile_program
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+PROGRAMS = {
+    "counting_loop": """
+عرف ع = 0 ؟
+عرف مجموع = 0 ؟
+بينما (ع < 20000) {
+    مجموع = مجموع + ع ؟
+    ع = ع + 1 ؟
+}
+عرض (مجموع) ؟
+""",
+    "nested_loops": """
+عرف س = 0 ؟
+عرف عدد = 0 ؟
+بينما (س < 150) {
+    عرف ص = 0 ؟
+    بينما (ص < 150) {
+        لو (ص > س) {
+            عدد = عدد + 1 ؟
+        }
+        ص = ص + 1 ؟
+    }
+    س = س + 1 ؟
+}
+عرض (عدد) ؟
+""",
+    "float_loop": """
+عرف ع = 0 ؟
+عرف ق = 1.0 ؟
+بينما (ع < 10000) {
+    ق = ق * 1.0001 ؟
+    ع = ع + 1 ؟
+}
+عرض (ق) ؟
+""",
+    "calls_in_loop": """
+دالة ضعف (س) {
+    اعد (س * 2) ؟
+}
+عرف ع = 0 ؟
+عرف مجموع = 0 ؟
+بينما (ع < 5000) {
+    مجموع = مجموع + ضعف(ع) ؟
+    ع = ع + 1 ؟
+}
+عرض (مجموع) ؟
+""",
+}
+
+ENGINES = {
+    "interpreter": lambda target_code: VirtualMachine(target_code, debug=False),
+    "threaded": ThreadedVirtualMachine,
+}
+
+
+def time_engine(make_vm, target_code, repeat):
+    best = None
+    output = None
+    for _ in range(repeat):
+        vm = make_vm(target_code)
+        start = time.perf_counter()
+        output = vm.run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    print(f"{'program':<16}" + "".join(f"{name:>14}" for name in ENGINES) + f"{'speedup':>10}")
+    for program_name, code in PROGRAMS.items():
+        target_code = compile_program(code)
+        timings = {}
+        outputs = {}
+        for engine_name, make_vm in ENGINES.items():
+            timings[engine_name], outputs[engine_name] = time_engine(make_vm, target_code, args.repeat)
+        if outputs["threaded"] != outputs["interpreter"]:
+            raise SystemExit(f"{program_name}: engines disagree: {outputs}")
+        speedup = timings["interpreter"] / timings["threaded"]
+        print(f"{program_name:<16}" + "".join(f"{timings[name] * 1000:>12.1f}ms" for name in ENGINES) + f"{speedup:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Differential fuzzing of the execution backends with generated programs.
+
+    python -m benchmarks.fuzz [--iterations N] [--seed S] [--statements N]
+
+Every generated program is compiled with and without function inlining
+and each build is run on each backend, including one that moves the run
+between VMs through a resume token every few hundred instructions; the
+outputs (or the errors raised) must be identical. The fused front end must
+compile it to the same IR as the full pipeline. A failing program is
+written out so it can be replayed.
+"""
+import argparse
+import sys
+
+from benchmarks import compile_program
+from benchmarks.generator import ProgramGenerator
+from fused_compiler import FusedCompiler
+from intermediate_code_generator import IntermediateCodeGenerator
+from lexer import lexer
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from snapshot import SnapshotCodec, program_id
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+
+class ResumedRun:
+    """Runs a program in slices, each on a fresh VM (alternating engines)
+    restored from the resume token of the one before."""
+
+    SLICE = 397
+
+    def __init__(self, target_code):
+        self.target_code = target_code
+        self.codec = SnapshotCodec(b"fuzz")
+        self.program = program_id(target_code)
+        self.vm = VirtualMachine(target_code, debug=False)
+
+    @property
+    def output(self):
+        return self.vm.output
+
+    def step(self, n):
+        executed = 0
+        while executed < n:
+            before = self.vm.instructions_executed
+            if self.vm.step(min(self.SLICE, n - executed)):
+                return True
+            executed += self.vm.instructions_executed - before
+            token = self.codec.dump(self.vm, self.program)
+            if isinstance(self.vm, ThreadedVirtualMachine):
+                self.vm = VirtualMachine(self.target_code, debug=False)
+            else:
+                self.vm = ThreadedVirtualMachine(self.target_code)
+            self.vm.restore(self.codec.load(token, self.program))
+        return False
+
+
+BACKENDS = {
+    "interpreter": lambda target_code: VirtualMachine(target_code, debug=False),
+    "threaded": ThreadedVirtualMachine,
+    "interpreter (no memoization)": lambda target_code: VirtualMachine(target_code, debug=False, memo_size=0),
+    "resumed": ResumedRun,
+}
+
+INSTRUCTION_BUDGET = 2_000_000
+
+
+def outcome(make_vm, target_code):
+    vm = make_vm(target_code)
+    try:
+        finished = vm.step(INSTRUCTION_BUDGET)
+    except Exception as e:
+        return ("error", type(e).__name__, str(e), vm.output)
+    return ("finished" if finished else "budget exhausted", vm.output)
+
+
+def front_end_outcome(code):
+    """(IR, types, source lines) from the full pipeline and from the fused
+    front end, or None for a program either one rejects."""
+    try:
+        ast = Parser(lexer(code)).parse_program()
+        SemanticAnalyzer(ast).analyze()
+    except (SyntaxError, ValueError):
+        full = None
+    else:
+        icg = IntermediateCodeGenerator(ast)
+        full = (icg.generate(), icg.types, icg.source_lines)
+    fused = FusedCompiler(lexer(code))
+    return full, (fused.code, fused.types, fused.source_lines) if fused.compile() else None
+
+
+def check_program(code):
+    """Return None if every backend agrees, otherwise {backend: outcome}."""
+    full, fused = front_end_outcome(code)
+    if full != fused:
+        return {"front end (full pipeline)": full, "front end (fused)": fused}
+    outcomes = {}
+    for inline in (False, True):
+        target_code = compile_program(code, inline=inline)
+        for name, make_vm in BACKENDS.items():
+            outcomes[f"{name}{' (inlined)' if inline else ''}"] = outcome(make_vm, target_code)
+    if len({repr(result) for result in outcomes.values()}) == 1:
+        return None
+    return outcomes
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--iterations", type=int, default=200)
+    arg_parser.add_argument("--seed", type=int, default=0, help="seed of the first program")
+    arg_parser.add_argument("--statements", type=int, default=40)
+    arg_parser.add_argument("--depth", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    for seed in range(args.seed, args.seed + args.iterations):
+        code = ProgramGenerator(seed=seed, max_depth=args.depth).generate(args.statements)
+        mismatch = check_program(code)
+        if mismatch is not None:
+            path = f"fuzz_failure_{seed}.fk"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(code)
+            print(f"Seed {seed}: backends disagree, program written to {path}")
+            for name, result in mismatch.items():
+                print(f"  {name}: {result!r}"[:500])
+            sys.exit(1)
+    print(f"{args.iterations} programs, all backends agree.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import random
+
+INT_OPERATORS = ("+", "-", "*")
+INT_NATIVES = (("مطلق", 1), ("اصغر", 2), ("اكبر", 3))
+COMPARISON_OPERATORS = ("<", ">", "<=", ">=", "==", "!=")
+
+
+class ProgramGenerator:
+    """Grammar-driven generator of valid Fekra programs.
+
+    Programs are built statement by statement from the grammar in
+    info/grammer.txt, tracking which variables are in scope and their types,
+    so every program passes semantic analysis. Loops always count up to a
+    small bound, so every program terminates. The same seed always gives the
+    same program."""
+
+    def __init__(self, seed=0, max_depth=3, loop_bound=3):
+        self.random = random.Random(seed)
+        self.max_depth = max_depth
+        self.loop_bound = loop_bound
+        self.name_counter = 0
+        self.functions = []  # (name, parameter count)
+        self.list_lengths = {}  # Lists never change length, so indexes stay in range
+
+    def generate(self, statements):
+        """Return source text with `statements` top-level statements."""
+        self.lines = []
+        scope = [self.new_frame()]
+        for _ in range(statements):
+            self.statement(scope, depth=0, loop_depth=0, top_level=True)
+        return "\n".join(self.lines) + "\n"
+
+    def fresh_name(self, prefix):
+        self.name_counter += 1
+        return f"{prefix}_{self.name_counter}"
+
+    def emit(self, depth, text):
+        self.lines.append("    " * depth + text)
+
+    def new_frame(self):
+        return {"int": [], "string": [], "counter": [], "list": []}
+
+    def pick(self, scope, *value_types):
+        """A random variable of one of the given types, or None. Frames keep a
+        list per type, so this stays cheap however many variables exist."""
+        pools = [frame[value_type] for frame in scope for value_type in value_types]
+        total = sum(len(pool) for pool in pools)
+        if not total:
+            return None
+        index = self.random.randrange(total)
+        for pool in pools:
+            if index < len(pool):
+                return pool[index]
+            index -= len(pool)
+
+    def statement(self, scope, depth, loop_depth, top_level=False):
+        choices = ["declare", "declare", "assign", "print"]
+        if depth < self.max_depth:
+            choices.append("if")
+            if loop_depth < 2:
+                choices.append("while")
+        if top_level and self.random.random() < 0.1:
+            choices.append("function")
+        kind = self.random.choice(choices)
+        target = self.pick(scope, "int")
+        if kind == "assign" and target is None:
+            kind = "declare"
+
+        if kind == "assign" and self.random.random() < 0.3:
+            name = self.pick(scope, "list")
+            if name is not None:
+                element = f"{name}[{self.random.randrange(self.list_lengths[name])}]"
+                self.emit(depth, f"{element} = {element} + {self.int_expression(scope, 1)} ؟")
+                return
+
+        if kind == "declare":
+            roll = self.random.random()
+            if roll < 0.1:
+                name = self.fresh_name("ق")
+                elements = [self.int_expression(scope, 1) for _ in range(self.random.randint(1, 4))]
+                self.emit(depth, f"عرف {name} = [{', '.join(elements)}] ؟")
+                scope[-1]["list"].append(name)
+                self.list_lengths[name] = len(elements)
+            elif roll < 0.3:
+                name = self.fresh_name("نص")
+                self.emit(depth, f"عرف {name} = {self.string_expression(scope)} ؟")
+                scope[-1]["string"].append(name)
+            else:
+                name = self.fresh_name("س")
+                self.emit(depth, f"عرف {name} = {self.int_expression(scope, 2)} ؟")
+                scope[-1]["int"].append(name)
+        elif kind == "assign":
+            self.emit(depth, f"{target} = {target} + {self.int_expression(scope, 1)} ؟")
+        elif kind == "print":
+            if self.random.random() < 0.3:
+                self.emit(depth, f"عرض ({self.string_expression(scope)}) ؟")
+            else:
+                self.emit(depth, f"عرض ({self.int_expression(scope, 2)}) ؟")
+        elif kind == "if":
+            self.emit(depth, f"لو ({self.condition(scope)}) {{")
+            self.block(scope, depth, loop_depth)
+            self.emit(depth, "}")
+        elif kind == "while":
+            counter = self.fresh_name("ع")
+            self.emit(depth, f"عرف {counter} = 0 ؟")
+            scope[-1]["counter"].append(counter)  # Read-only for the body, so the loop ends
+            self.emit(depth, f"بينما ({counter} < {self.random.randint(1, self.loop_bound)}) {{")
+            self.block(scope, depth, loop_depth + 1)
+            self.emit(depth + 1, f"{counter} = {counter} + 1 ؟")
+            self.emit(depth, "}")
+        elif kind == "function":
+            self.function(depth)
+
+    def block(self, scope, depth, loop_depth):
+        scope.append(self.new_frame())
+        for _ in range(self.random.randint(1, 3)):
+            self.statement(scope, depth + 1, loop_depth)
+        scope.pop()
+
+    def function(self, depth):
+        name = self.fresh_name("دالة")
+        params = [self.fresh_name("م") for _ in range(self.random.randint(0, 3))]
+        self.emit(depth, f"دالة {name} ({', '.join(params)}) {{")
+        # Function bodies only see their parameters and their own locals.
+        scope = [self.new_frame()]
+        scope[0]["int"].extend(params)
+        for _ in range(self.random.randint(0, 3)):
+            self.statement(scope, depth + 1, loop_depth=1)
+        self.emit(depth + 1, f"اعد ({self.int_expression(scope, 2)}) ؟")
+        self.emit(depth, "}")
+        self.functions.append((name, len(params)))
+
+    def int_operand(self, scope):
+        if self.random.random() < 0.1:
+            name = self.pick(scope, "list")
+            if name is not None:
+                return f"{name}[{self.random.randrange(self.list_lengths[name])}]"
+        name = self.pick(scope, "int", "counter")
+        if name is not None and self.random.random() < 0.6:
+            return name
+        return str(self.random.randint(0, 9))
+
+    def int_expression(self, scope, depth):
+        roll = self.random.random()
+        if depth <= 0 or roll < 0.4:
+            return self.int_operand(scope)
+        if self.functions and roll < 0.5:
+            name, arity = self.random.choice(self.functions)
+            args = ", ".join(self.int_operand(scope) for _ in range(arity))
+            return f"{name}({args})"
+        if roll < 0.55:
+            name = self.pick(scope, "string")
+            if name is not None and self.random.random() < 0.3:
+                return f"طول({name})"
+            name = self.pick(scope, "list")
+            if name is not None and self.random.random() < 0.3:
+                return f"{self.random.choice(['مجموع', 'اكبر', 'طول'])}({name})"
+            name, arity = self.random.choice(INT_NATIVES)
+            return f"{name}({', '.join(self.int_operand(scope) for _ in range(arity))})"
+        operator = self.random.choice(INT_OPERATORS)
+        left = self.int_expression(scope, depth - 1)
+        right = self.int_operand(scope) if operator == "*" else self.int_expression(scope, depth - 1)
+        return f"({left} {operator} {right})" if self.random.random() < 0.5 else f"{left} {operator} {right}"
+
+    def string_expression(self, scope):
+        name = self.pick(scope, "string")
+        literal = f'"{self.random.choice(["أ", "ب", "ت", "نص"])}"'
+        if name is not None and self.random.random() < 0.5:
+            return f"{name} + {literal}"
+        return literal
+
+    def condition(self, scope):
+        comparison = f"{self.int_operand(scope)} {self.random.choice(COMPARISON_OPERATORS)} {self.int_operand(scope)}"
+        if self.random.random() < 0.2:
+            other = f"{self.int_operand(scope)} {self.random.choice(COMPARISON_OPERATORS)} {self.int_operand(scope)}"
+            return f"{comparison} {self.random.choice(['&&', '||'])} {other}"
+        return comparison
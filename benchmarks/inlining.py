@@ -0,0 +1,50 @@
+"""Report what function inlining does to dispatch counts and run time.
+
+    python -m benchmarks.inlining [--repeat N]
+
+Every program is compiled with and without the inlining pass; both builds
+must print the same output. For each build this shows the number of VM
+instructions dispatched and the best run time.
+"""
+import argparse
+import time
+
+from benchmarks import compile_program
+from benchmarks.corpus import load_corpus
+from benchmarks.engines import PROGRAMS
+from virtual_machine import VirtualMachine
+
+
+def run(target_code, repeat):
+    best = None
+    for _ in range(repeat):
+        vm = VirtualMachine(target_code, debug=False)
+        start = time.perf_counter()
+        vm.run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return vm.output, vm.instructions_executed, best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    programs = dict(PROGRAMS)
+    programs.update(load_corpus())
+    print(f"{'program':<24}{'dispatched':>12}{'inlined':>12}{'change':>9}{'time':>11}{'inlined':>11}")
+    for name, code in programs.items():
+        output, dispatched, elapsed = run(compile_program(code, inline=False), args.repeat)
+        inlined_output, inlined_dispatched, inlined_elapsed = run(compile_program(code), args.repeat)
+        if inlined_output != output:
+            raise SystemExit(f"{name}: inlining changed the output")
+        change = (inlined_dispatched - dispatched) / dispatched
+        print(
+            f"{name:<24}{dispatched:>12}{inlined_dispatched:>12}{change:>+9.1%}"
+            f"{elapsed * 1000:>9.1f}ms{inlined_elapsed * 1000:>9.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
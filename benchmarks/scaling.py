@@ -0,0 +1,106 @@
+"""Measure how each stage scales with program size and flag superlinear ones.
+
+    python -m benchmarks.scaling [--sizes 10,100,1000,10000,100000] [--depth N]
+
+Programs come from the random program generator. For each stage the growth
+exponent is fitted on a log-log scale over the larger sizes (where fixed
+overheads no longer dominate); a stage growing faster than the threshold
+(linear plus tolerance) is flagged and the exit status is 1.
+"""
+import argparse
+import contextlib
+import math
+import os
+import sys
+import time
+
+from benchmarks.generator import ProgramGenerator
+from inliner import FunctionInliner
+from intermediate_code_generator import IntermediateCodeGenerator
+from lexer import lexer
+from optimizer import Optimizer
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from target_code_generator import TargetCodeGenerator
+from virtual_machine import VirtualMachine
+
+STAGES = (
+    "lexer",
+    "parser",
+    "semantic_analyzer",
+    "intermediate_code",
+    "optimizer",
+    "inliner",
+    "target_code",
+    "virtual_machine",
+)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def time_stages(code):
+    timings = {}
+    timings["lexer"], tokens = timed(lambda: lexer(code))
+    timings["parser"], ast = timed(lambda: Parser(tokens).parse_program())
+    timings["semantic_analyzer"], _ = timed(lambda: SemanticAnalyzer(ast).analyze())
+    icg = IntermediateCodeGenerator(ast)
+    timings["intermediate_code"], ir_code = timed(icg.generate)
+    timings["optimizer"], _ = timed(lambda: Optimizer(list(ir_code)).optimize())
+    timings["inliner"], _ = timed(lambda: FunctionInliner(ir_code, dict(icg.types), icg.source_lines).optimize())
+    tcg = TargetCodeGenerator(ir_code, icg.types, icg.source_lines)
+    timings["target_code"], target_code = timed(tcg.generate)
+    timings["virtual_machine"], _ = timed(lambda: VirtualMachine(target_code, debug=False).run())
+    return timings
+
+
+def fit_exponent(sizes, times):
+    """Least-squares slope of log(time) against log(size)."""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    denominator = sum((x - mean_x) ** 2 for x in xs)
+    return numerator / denominator
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", default="10,100,1000,10000,100000")
+    arg_parser.add_argument("--depth", type=int, default=2, help="maximum nesting depth")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--threshold", type=float, default=1.2, help="largest acceptable growth exponent")
+    arg_parser.add_argument("--fit-points", type=int, default=3, help="number of largest sizes to fit on")
+    args = arg_parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = {stage: [] for stage in STAGES}
+    print(f"{'statements':>10}" + "".join(f"{stage[:14]:>16}" for stage in STAGES))
+    for size in sizes:
+        code = ProgramGenerator(seed=args.seed, max_depth=args.depth).generate(size)
+        # The code generators trace every line to stdout.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            timings = time_stages(code)
+        for stage in STAGES:
+            results[stage].append(timings[stage])
+        print(f"{size:>10}" + "".join(f"{timings[stage] * 1000:>14.2f}ms" for stage in STAGES))
+
+    fit_sizes = sizes[-args.fit_points:]
+    superlinear = []
+    print()
+    for stage in STAGES:
+        exponent = fit_exponent(fit_sizes, results[stage][-args.fit_points:])
+        flag = "SUPERLINEAR" if exponent > args.threshold else "ok"
+        print(f"{stage:<20} growth exponent {exponent:5.2f}  {flag}")
+        if exponent > args.threshold:
+            superlinear.append(stage)
+    if superlinear:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Time every compiler stage and the VM separately over the benchmark corpus.
+
+    python -m benchmarks.stages [--output FILE] [--baseline FILE] [--save-baseline | --add-missing]
+
+For each program and stage this reports runs per second (best round), peak traced memory
+and the number of memory blocks the stage allocated that are still live when
+it returns (what its output costs). Results are written as JSON and compared
+with a stored baseline, adjusted for machine speed with a fixed calibration
+workload; a stage whose throughput drops by more than the
+tolerance is reported as a regression and the exit status is 1. So is a
+stage the baseline has no entry for: --add-missing stores just those
+entries, scaled to the baseline's machine speed, and keeps the others.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.corpus import load_corpus
+from fused_compiler import FusedCompiler
+from inliner import FunctionInliner
+from intermediate_code_generator import IntermediateCodeGenerator
+from lexer import lexer
+from optimizer import Optimizer
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from target_code_generator import TargetCodeGenerator
+from virtual_machine import VirtualMachine
+
+BENCHMARKS_DIR = os.path.dirname(__file__)
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+
+
+def build_stages(code):
+    """Run the pipeline once and return each stage as a callable that
+    repeats just that stage on the previous stage's output."""
+    tokens = lexer(code)
+    ast = Parser(tokens).parse_program()
+    SemanticAnalyzer(ast).analyze()
+    icg = IntermediateCodeGenerator(ast)
+    ir_code = icg.generate()
+    target_code = TargetCodeGenerator(ir_code, icg.types, icg.source_lines).generate()
+    return {
+        "lexer": lambda: lexer(code),
+        "parser": lambda: Parser(tokens).parse_program(),
+        "semantic_analyzer": lambda: SemanticAnalyzer(ast).analyze(),
+        "intermediate_code": lambda: IntermediateCodeGenerator(ast).generate(),
+        # Parser, semantic analyzer and intermediate code in one pass.
+        "fused_front_end": lambda: FusedCompiler(tokens).compile(),
+        "optimizer": lambda: Optimizer(list(ir_code)).optimize(),
+        "inliner": lambda: FunctionInliner(ir_code, dict(icg.types), icg.source_lines).optimize(),
+        "target_code": lambda: TargetCodeGenerator(ir_code, icg.types, icg.source_lines).generate(),
+        "virtual_machine": lambda: VirtualMachine(target_code, debug=False).run(),
+    }
+
+
+def measure(stage, min_time, rounds=5):
+    # Best of several rounds, so a collection pause in one round does not
+    # read as a regression.
+    best = None
+    for _ in range(rounds):
+        gc.collect()
+        runs = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while runs == 0 or elapsed < min_time / rounds:
+            stage()
+            runs += 1
+            elapsed = time.perf_counter() - start
+        if best is None or elapsed / runs < best:
+            best = elapsed / runs
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = stage()  # Keep the output alive for the block count
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    allocated_blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return {
+        "ops_per_sec": 1 / best,
+        "mean_ms": best * 1000,
+        "peak_kb": peak / 1024,
+        "allocated_blocks": allocated_blocks,
+    }
+
+
+def calibration_workload():
+    table = {}
+    for i in range(20000):
+        table[str(i)] = i * 2
+    return sum(table.values())
+
+
+def run_suite(min_time):
+    # Throughput of a fixed pure-Python workload, measured alongside the
+    # stages so runs on a slower or busier machine compare fairly. Like the
+    # stages it keeps its best reading, taken before or after the suite.
+    calibration = measure(calibration_workload, min_time)["ops_per_sec"]
+    results = {}
+    # The code generators trace every line to stdout.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, code in load_corpus().items():
+            results[name] = {
+                stage_name: measure(stage, min_time)
+                for stage_name, stage in build_stages(code).items()
+            }
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_ops_per_sec": max(calibration, measure(calibration_workload, min_time)["ops_per_sec"]),
+        "programs": results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return (regressions, missing): (program, stage, ratio) of the stages
+    slower than the baseline allows, and (program, stage) of those it has
+    no entry for."""
+    speed = results["calibration_ops_per_sec"] / baseline["calibration_ops_per_sec"]
+    regressions = []
+    missing = []
+    for program, stages in results["programs"].items():
+        for stage, stats in stages.items():
+            expected = baseline.get("programs", {}).get(program, {}).get(stage)
+            if expected is None:
+                missing.append((program, stage))
+                continue
+            ratio = stats["ops_per_sec"] / (expected["ops_per_sec"] * speed)
+            if ratio < 1 - tolerance:
+                regressions.append((program, stage, ratio))
+    return regressions, missing
+
+
+def add_missing(results, baseline):
+    """Copy the entries the baseline lacks from results into it, with
+    throughput scaled to the machine speed the baseline was measured at."""
+    speed = results["calibration_ops_per_sec"] / baseline["calibration_ops_per_sec"]
+    added = []
+    for program, stages in results["programs"].items():
+        entries = baseline.setdefault("programs", {}).setdefault(program, {})
+        for stage, stats in stages.items():
+            if stage not in entries:
+                entries[stage] = dict(stats, ops_per_sec=stats["ops_per_sec"] / speed, mean_ms=stats["mean_ms"] * speed)
+                added.append((program, stage))
+    return added
+
+
+def print_table(results):
+    print(f"{'program':<24}{'stage':<20}{'ops/sec':>12}{'mean ms':>10}{'peak KB':>10}{'blocks':>10}")
+    for program, stages in results["programs"].items():
+        for stage, stats in stages.items():
+            print(
+                f"{program:<24}{stage:<20}{stats['ops_per_sec']:>12.1f}{stats['mean_ms']:>10.3f}"
+                f"{stats['peak_kb']:>10.1f}{stats['allocated_blocks']:>10}"
+            )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--output", default="bench_output.json", help="where to write the results")
+    arg_parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    arg_parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    arg_parser.add_argument(
+        "--add-missing", action="store_true", help="add the stages the baseline lacks to it, keeping its other entries",
+    )
+    arg_parser.add_argument("--tolerance", type=float, default=0.35, help="allowed throughput drop (fraction)")
+    arg_parser.add_argument("--min-time", type=float, default=0.5, help="seconds to repeat each stage for")
+    args = arg_parser.parse_args()
+
+    results = run_suite(args.min_time)
+    print_table(results)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if args.add_missing:
+        added = add_missing(results, baseline)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"Added {len(added)} entries to {args.baseline}")
+        return
+    regressions, missing = compare(results, baseline, args.tolerance)
+    for program, stage, ratio in regressions:
+        print(f"REGRESSION {program}/{stage}: {ratio:.2f}x baseline throughput (machine-speed adjusted)")
+    for program, stage in missing:
+        print(f"NO BASELINE {program}/{stage}: run with --add-missing to record it")
+    if regressions or missing:
+        sys.exit(1)
+    print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
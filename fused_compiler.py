@@ -0,0 +1,402 @@
+from lexer import COMPARISON_OPS, MODULE_SEPARATOR, display_name
+from native_functions import NATIVE_FUNCTIONS
+from semantic_analyzer import (
+    SymbolTable, binary_result_type, check_assignable, element_assignment_type, index_result_type, join_types,
+    literal_type,
+)
+
+# Binding power of the binary operators, as in Parser's chain of
+# parse_*_expr methods: logical, comparison, additive, multiplicative.
+PRECEDENCE = {"&&": 1, "||": 1, **{op: 2 for op in COMPARISON_OPS}, "+": 3, "-": 3, "*": 4, "/": 4}
+BINARY_TOKENS = {"OPERATOR", "COMPARISON_OP"}
+
+# Stands in for the token after the last one, so lookahead needs no bounds check.
+END = (None, None, None, None)
+
+
+class FusedCompiler:
+    """Parser, semantic analyzer and intermediate code generator in one pass
+    over the tokens: each name is checked against the scope stack and the
+    IR is emitted while the statement is parsed, without building an AST.
+
+    Types follow SemanticAnalyzer.analyze(): when an assignment widens a
+    variable that an earlier statement already used at the narrower type,
+    the program is compiled again with the wider type. The result is the
+    same IR, types and source lines as the full pipeline. compile() returns
+    False for a program with an error, so the caller runs the full pipeline
+    and reports its diagnostics instead."""
+
+    def __init__(self, tokens, modules=None):
+        self.tokens = tokens
+        self.modules = modules
+        self.widened = {}
+        # Every function the program declares, once a pass has found a
+        # call compiled as native before a function of that name.
+        self.hoisted_functions = None
+        self.start_pass()
+
+    def start_pass(self):
+        self.pos = 0
+        self.token = self.tokens[0] if self.tokens else END
+        self.symbol_table = SymbolTable()
+        # Functions declared so far; calls to any other name in
+        # NATIVE_FUNCTIONS are native calls.
+        self.functions = set(self.hoisted_functions or ())
+        self.declared_functions = set()
+        self.native_calls = set()
+        self.imports = {}
+        # Names this pass has read, and how often it has declared each.
+        self.reads = set()
+        self.declarations = {}
+        self.code = []
+        self.temp_counter = 0
+        self.label_counter = 0
+        self.types = {}
+        self.source_lines = []
+        self.current_line = None
+        self.changed = False
+        self.deferred_errors = 0
+
+    def compile(self):
+        """Compile the program into self.code, returning False if it has an
+        error."""
+        while True:
+            try:
+                while self.token is not END:
+                    self.parse_statement(top_level=True)
+            except (SyntaxError, ValueError):
+                return False
+            if self.native_calls & self.declared_functions:
+                # The analyzer knows every function up front: start over
+                # from the types it starts with.
+                self.hoisted_functions = self.declared_functions
+                self.widened = {}
+            elif not self.changed:
+                break
+            self.start_pass()
+        if self.deferred_errors:
+            return False
+        self.mark_lines()
+        return True
+
+    # Scopes and types, as in SemanticAnalyzer
+
+    def declare(self, name, value_type):
+        value_type = join_types(self.widened.get(name), value_type)
+        self.symbol_table.declare(name, value_type)
+        self.declarations[name] = self.declarations.get(name, 0) + 1
+        return value_type
+
+    def lookup(self, name):
+        self.reads.add(name)
+        return self.symbol_table.lookup(name)
+
+    def widen(self, name, value_type):
+        declared = self.symbol_table.lookup(name)
+        widened = join_types(declared, value_type)
+        if widened != declared:
+            self.symbol_table.update(name, widened)
+            self.widened[name] = join_types(self.widened.get(name), widened)
+            # Declarations after this one start out wider, like on the
+            # analyzer's next pass; only uses before it need another pass.
+            if name in self.reads or self.declarations.get(name, 0) > 1:
+                self.changed = True
+
+    def checked(self, check, *types):
+        """check(*types), with type errors deferred until the types are final."""
+        try:
+            return check(*types)
+        except ValueError:
+            self.deferred_errors += 1
+            return "any"
+
+    # Token stream
+
+    def advance(self):
+        self.pos += 1
+        self.token = self.tokens[self.pos] if self.pos < len(self.tokens) else END
+
+    def match(self, token_type):
+        token = self.token
+        if token[0] != token_type:
+            raise SyntaxError(f"Expected {token_type}, got {token}")
+        self.advance()
+        return token
+
+    # Emitting, as in IntermediateCodeGenerator
+
+    def record_type(self, name, value_type):
+        self.types[name] = join_types(self.types.get(name), value_type)
+
+    def new_label(self):
+        self.label_counter += 1
+        return f"L{self.label_counter}"
+
+    def mark_lines(self):
+        self.source_lines.extend([self.current_line] * (len(self.code) - len(self.source_lines)))
+
+    def emit_temp(self, instruction, value_type):
+        self.temp_counter += 1
+        temp = f"t{self.temp_counter}"
+        self.code.append(f"{temp} = {instruction}")
+        self.record_type(temp, value_type)
+        return temp
+
+    # Statements
+
+    def parse_statement(self, top_level=False):
+        kind, value, line, _ = self.token
+        self.mark_lines()
+        outer_line, self.current_line = self.current_line, line
+        if kind == "IDENTIFIER":
+            self.parse_assignment_or_function_call()
+        elif kind == "COMMENT":
+            self.advance()
+        elif kind != "KEYWORD":
+            raise SyntaxError(f"Unexpected token {self.token}")
+        elif value == "عرف":
+            self.parse_variable_decl()
+        elif value == "عرض":
+            self.parse_print_statement()
+        elif value == "لو":
+            self.parse_if_statement()
+        elif value == "بينما":
+            self.parse_while_statement()
+        elif value == "دالة":
+            self.parse_function_decl()
+        elif value == "اعد":
+            self.parse_return_statement()
+        elif value == "استورد" and top_level:
+            self.parse_import()
+        else:
+            raise SyntaxError(f"Unexpected token {self.token}")
+        self.mark_lines()
+        self.current_line = outer_line
+
+    def parse_block(self):
+        self.match("LBRACE")
+        while self.token[0] != "RBRACE":
+            if self.token is END:
+                raise SyntaxError("Expected RBRACE")
+            self.parse_statement()
+        self.advance()
+
+    def parse_import(self):
+        self.advance()
+        name = self.match("IDENTIFIER")[1]
+        if MODULE_SEPARATOR in name:
+            raise SyntaxError("Expected a module name")
+        self.match("TERMINATOR")
+        if self.modules is None:
+            raise ValueError(f"Cannot import '{name}': no module library is configured.")
+        module = self.imports[name] = self.modules.load(name)
+        self.functions |= module.functions
+        scope = self.symbol_table.stack[-1]
+        for export, value_type in module.exports.items():
+            if export not in scope:
+                self.declare(export, value_type)
+
+    def parse_variable_decl(self):
+        self.advance()
+        name = self.match("IDENTIFIER")[1]
+        if self.token[1] == "=":
+            self.advance()
+            value, value_type = self.parse_expression()
+        else:
+            value, value_type = "0", "int"  # Default to 0
+        self.match("TERMINATOR")
+        check_assignable(name)
+        value_type = self.declare(name, value_type)
+        self.code.append(f"decl {name} = {value}")
+        self.record_type(name, value_type)
+
+    def parse_assignment_or_function_call(self):
+        name = self.token[1]
+        self.advance()
+        if self.token[0] == "LBRACKET":
+            self.parse_index_assignment(name)
+        elif self.token[1] == "=":
+            self.advance()
+            value, value_type = self.parse_expression()
+            self.match("TERMINATOR")
+            check_assignable(name)
+            self.widen(name, value_type)
+            self.code.append(f"{name} = {value}")
+            self.record_type(name, value_type)
+        elif self.token[0] == "LPAREN":
+            self.parse_function_call(name)
+            self.match("TERMINATOR")
+        else:
+            raise SyntaxError("Expected assignment or function call")
+
+    def parse_index_assignment(self, name):
+        target, target_type = name, self.lookup(name)
+        self.advance()
+        index, index_type = self.parse_expression()
+        self.match("RBRACKET")
+        while self.token[0] == "LBRACKET":
+            # An element of a nested list: all but the last index are reads.
+            target_type = self.checked(index_result_type, target_type, index_type)
+            target = self.emit_temp(f"{target}[{index}]", target_type)
+            self.advance()
+            index, index_type = self.parse_expression()
+            self.match("RBRACKET")
+        if self.token[1] != "=":
+            raise SyntaxError("Expected '=' after list element")
+        self.advance()
+        self.checked(element_assignment_type, target_type, index_type)
+        value, _ = self.parse_expression()
+        self.match("TERMINATOR")
+        self.code.append(f"{target}[{index}] = {value}")
+
+    def parse_condition(self):
+        self.match("LPAREN")
+        condition, condition_type = self.parse_expression()
+        self.match("RPAREN")
+        return self.emit_temp(condition, condition_type)
+
+    def parse_if_statement(self):
+        self.advance()
+        condition = self.parse_condition()
+        true_label = self.new_label()
+        end_label = self.new_label()
+        self.code.append(f"if {condition} goto {true_label}")
+        self.code.append(f"goto {end_label}")
+        self.code.append(f"{true_label}:")
+        self.symbol_table.enter_scope()
+        self.parse_block()
+        self.symbol_table.exit_scope()
+        self.code.append(f"{end_label}:")
+
+    def parse_while_statement(self):
+        self.advance()
+        condition_label = self.new_label()
+        end_label = self.new_label()
+        self.code.append(f"{condition_label}:")
+        condition = self.parse_condition()
+        self.code.append(f"if not {condition} goto {end_label}")
+        self.symbol_table.enter_scope()
+        self.parse_block()
+        self.symbol_table.exit_scope()
+        self.code.append(f"goto {condition_label}")
+        self.code.append(f"{end_label}:")
+
+    def parse_function_decl(self):
+        self.advance()
+        name = self.match("IDENTIFIER")[1]
+        self.functions.add(name)
+        self.declared_functions.add(name)
+        self.match("LPAREN")
+        params = []
+        if self.token[0] == "IDENTIFIER":
+            params.append(self.match("IDENTIFIER")[1])
+            while self.token[0] == "COMMA":
+                self.advance()
+                params.append(self.match("IDENTIFIER")[1])
+        self.match("RPAREN")
+        self.code.append(f"function {name}({', '.join(params)}) {{")
+        self.symbol_table.enter_scope()
+        for param in params:
+            self.symbol_table.declare(param, "any")
+            self.record_type(param, "any")
+        self.parse_block()
+        self.symbol_table.exit_scope()
+        self.code.append("}")
+
+    def parse_return_statement(self):
+        self.advance()
+        self.match("LPAREN")
+        value = "0"
+        if self.token[0] != "RPAREN":
+            value, _ = self.parse_expression()
+        self.match("RPAREN")
+        self.match("TERMINATOR")
+        self.code.append(f"return {value}")
+
+    def parse_print_statement(self):
+        self.advance()
+        self.match("LPAREN")
+        value, _ = self.parse_expression()
+        self.match("RPAREN")
+        self.match("TERMINATOR")
+        self.code.append(f"print {value}")
+
+    # Expressions: each returns (IR operand, static type)
+
+    def parse_expression(self, precedence=1):
+        """Binary operators by precedence climbing: the same left-associative
+        trees as Parser, and the same order of IR, in one loop."""
+        left, left_type = self.parse_factor()
+        while self.token[0] in BINARY_TOKENS:
+            operator = self.token[1]
+            operator_precedence = PRECEDENCE.get(operator)
+            if operator_precedence is None or operator_precedence < precedence:
+                break
+            self.advance()
+            right, right_type = self.parse_expression(operator_precedence + 1)
+            left_type = self.checked(binary_result_type, operator, left_type, right_type)
+            left = self.emit_temp(f"{left} {operator} {right}", left_type)
+        return left, left_type
+
+    def parse_factor(self):
+        value, value_type = self.parse_primary()
+        while self.token[0] == "LBRACKET":
+            self.advance()
+            index, index_type = self.parse_expression()
+            self.match("RBRACKET")
+            value_type = self.checked(index_result_type, value_type, index_type)
+            value = self.emit_temp(f"{value}[{index}]", value_type)
+        return value, value_type
+
+    def parse_primary(self):
+        kind, text, _, _ = token = self.token
+        if kind == "IDENTIFIER":
+            self.advance()
+            if self.token[0] == "LPAREN":
+                return self.parse_function_call(text)
+            return text, self.lookup(text)
+        elif kind == "NUMBER":
+            self.advance()
+            value = float(text) if "." in text else int(text)
+            return str(value), literal_type(value)
+        elif kind == "STRING":
+            self.advance()
+            return text, "string"
+        elif kind == "LPAREN":
+            self.advance()
+            value = self.parse_expression()
+            self.match("RPAREN")
+            return value
+        elif kind == "LBRACKET":
+            self.advance()
+            elements, _ = self.parse_arguments("RBRACKET")
+            return self.emit_temp(f"list({', '.join(elements)})", "list"), "list"
+        raise SyntaxError(f"Unexpected token {token}")
+
+    def parse_arguments(self, closing):
+        """Comma-separated expressions up to the closing token, which is
+        consumed."""
+        values, value_types = [], []
+        if self.token[0] != closing:
+            while True:
+                value, value_type = self.parse_expression()
+                values.append(value)
+                value_types.append(value_type)
+                if self.token[0] != "COMMA":
+                    break
+                self.advance()
+        self.match(closing)
+        return values, value_types
+
+    def parse_function_call(self, callee):
+        self.advance()  # "("
+        if MODULE_SEPARATOR in callee and callee not in self.functions:
+            raise ValueError(f"Function '{display_name(callee)}' is not defined by an imported module.")
+        args, arg_types = self.parse_arguments("RPAREN")
+        native = None if callee in self.functions else NATIVE_FUNCTIONS.get(callee)
+        if native is None:
+            return self.emit_temp(f"call {callee}({', '.join(args)})", "any"), "any"
+        self.native_calls.add(callee)
+        native.check_arity(len(arg_types))
+        value_type = self.checked(native.check, arg_types)
+        return self.emit_temp(f"native {callee}({', '.join(args)})", value_type), value_type
@@ -0,0 +1,148 @@
+import re
+import re._parser as regex_parser  # re has no public parser
+
+# Default allowed difference for an "approx" rule.
+TOLERANCE = 1e-9
+
+# Regex rules are matched where the program runs, on the scheduler thread
+# unless sandboxed, so a slow match holds up every run. Patterns are kept
+# short and without nested repetition, which backtracks exponentially.
+MAX_REGEX_LENGTH = 200
+REPEATS = {regex_parser.MAX_REPEAT, regex_parser.MIN_REPEAT, regex_parser.POSSESSIVE_REPEAT}
+
+
+def line_text(value):
+    """A printed value as the line a student sees."""
+    return value if isinstance(value, str) else str(value)
+
+
+def repetition_depth(node):
+    """How deeply repeats of a variable count nest in a parsed regex."""
+    if isinstance(node, regex_parser.SubPattern):
+        return max((repetition_depth(item) for item in node), default=0)
+    if not isinstance(node, (tuple, list)):
+        return 0
+    if len(node) == 2 and node[0] in REPEATS:
+        minimum, maximum, body = node[1]
+        return repetition_depth(body) + (minimum != maximum)
+    return max((repetition_depth(item) for item in node), default=0)
+
+
+def compile_regex(pattern):
+    if not isinstance(pattern, str):
+        raise ValueError(f"Invalid regex in output rule: expected a string, got {pattern!r}")
+    if len(pattern) > MAX_REGEX_LENGTH:
+        raise ValueError(f"Regex in output rule is longer than {MAX_REGEX_LENGTH} characters.")
+    try:
+        compiled = re.compile(pattern)
+        nested = repetition_depth(regex_parser.parse(pattern)) > 1
+    except re.error as e:
+        raise ValueError(f"Invalid regex in output rule: {e}") from None
+    if nested:
+        raise ValueError(f"Regex in output rule repeats inside a repeat: {pattern!r}")
+    return compiled
+
+
+class OutputMismatch(Exception):
+    """The first printed value that breaks its rule. Raised from the PRINT
+    path, so the run stops right there. `position` counts printed values
+    from 0; `reason` is "different", "extra" or "missing"."""
+
+    def __init__(self, position, expected, actual, reason):
+        super().__init__(position, expected, actual, reason)
+        self.position = position
+        self.expected = expected
+        self.actual = actual
+        self.reason = reason
+
+    def __str__(self):
+        return f"Output line {self.position + 1} is {self.reason}: expected {self.expected!r}, got {self.actual!r}."
+
+
+class ExpectedOutput:
+    """What a graded run must print, one rule per printed value.
+
+    The spec is a string (one line per value) or a list. A plain list entry
+    must equal the value, or its text for a string entry. A dict entry is a
+    rule: {"equals": v}, {"regex": pattern} matched against the whole line,
+    {"approx": number, "tolerance": t} or {"any": true}."""
+
+    def __init__(self, spec):
+        if isinstance(spec, str):
+            spec = spec.splitlines()
+        if not isinstance(spec, list):
+            raise ValueError("expected_output must be a string or a list of lines")
+        self.spec = spec
+        self.rules = [self.compile_rule(entry) for entry in spec]
+
+    @staticmethod
+    def compile_rule(entry):
+        if not isinstance(entry, dict):
+            return ("equals", entry, None)
+        if len(entry.keys() - {"tolerance"}) != 1:
+            raise ValueError(f"An output rule needs exactly one of equals, regex, approx or any: {entry}")
+        if "equals" in entry:
+            return ("equals", entry["equals"], None)
+        if "regex" in entry:
+            return ("regex", compile_regex(entry["regex"]), None)
+        if "approx" in entry:
+            number, tolerance = entry["approx"], entry.get("tolerance", TOLERANCE)
+            if not all(type(n) in (int, float) for n in (number, tolerance)):
+                raise ValueError(f"approx and tolerance must be numbers: {entry}")
+            return ("approx", number, tolerance)
+        if "any" in entry:
+            return ("any", None, None)
+        raise ValueError(f"Unknown output rule: {entry}")
+
+    def matches(self, rule, value):
+        kind, expected, tolerance = rule
+        if kind == "equals":
+            return value == expected or (isinstance(expected, str) and line_text(value) == expected)
+        if kind == "regex":
+            return expected.fullmatch(line_text(value)) is not None
+        if kind == "approx":
+            return type(value) in (int, float) and abs(value - expected) <= tolerance
+        return True
+
+    def check_line(self, position, value):
+        if position >= len(self.rules):
+            raise OutputMismatch(position, None, value, "extra")
+        if not self.matches(self.rules[position], value):
+            raise OutputMismatch(position, self.spec[position], value, "different")
+
+    def check(self, output, finished=True):
+        """Check a whole output at once, raising OutputMismatch. Only a
+        finished run can be missing lines."""
+        for position, value in enumerate(output):
+            self.check_line(position, value)
+        if finished and len(output) < len(self.rules):
+            raise OutputMismatch(len(output), self.spec[len(output)], None, "missing")
+
+    @staticmethod
+    def verdict(mismatch=None):
+        if mismatch is None:
+            return {"verdict": "accepted"}
+        return {
+            "verdict": "wrong_answer",
+            "mismatch": {
+                "output_line": mismatch.position + 1,
+                "reason": mismatch.reason,
+                "expected": mismatch.expected,
+                "actual": mismatch.actual,
+                "line": getattr(mismatch, "source_line", None),  # Of the PRINT
+            },
+        }
+
+
+class GradedOutput(list):
+    """VM output that checks each value against an ExpectedOutput as it is
+    printed, so a wrong program stops at its first wrong line instead of
+    running to the end."""
+
+    def __init__(self, expected):
+        super().__init__()
+        self.expected = expected
+
+    def append(self, value):
+        self.expected.check_line(len(self), value)
+        super().append(value)
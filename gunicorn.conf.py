@@ -0,0 +1,49 @@
+"""Gunicorn settings: the app is imported and warmed up once in the master,
+and the workers forked from it share those pages instead of each
+importing Flask and the compiler again."""
+import gc
+import time
+
+STARTED = time.perf_counter()
+
+# Objects the master creates while importing the app stay alive in every
+# worker. With the collector off until the fork nothing frees memory in
+# their pages, and gc.freeze() keeps the workers' collections from writing
+# to them, so the pages stay shared copy-on-write.
+gc.disable()
+
+# Gunicorn binds to $PORT and takes the worker count from $WEB_CONCURRENCY.
+preload_app = True
+worker_class = "gthread"
+threads = 8
+
+
+def when_ready(server):
+    import app
+    import startup
+
+    startup.warm_up(app.app)
+    server.log.info(
+        "Master ready in %.0f ms (%s)", (time.perf_counter() - STARTED) * 1000, startup.describe_memory(),
+    )
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    worker.forked = time.perf_counter()
+
+
+def post_worker_init(worker):
+    # An exception here stops the worker before it accepts a connection.
+    import app
+    import startup
+
+    startup.self_test(app.app)
+    worker.log.info(
+        "Worker %s ready in %.0f ms (%s)",
+        worker.pid, (time.perf_counter() - worker.forked) * 1000, startup.describe_memory(),
+    )
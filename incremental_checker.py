@@ -0,0 +1,316 @@
+import re
+import threading
+from collections import OrderedDict
+
+from lexer import MODULE_SEPARATOR, lexer
+from native_functions import NATIVE_FUNCTIONS
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer, join_types
+
+# What decides where a top-level statement ends: strings and comments are
+# skipped whole, braces nest, and a terminator or closing brace at depth 0
+# ends the statement.
+STATEMENT_BOUNDARY = re.compile(r'"(?:[^"\\]|\\.)*"|//[^\n]*|/\*.*?\*/|[{}؟]')
+
+# Bound on the rounds of re-analysis when an edit changes the type a
+# variable is assigned somewhere else in the document.
+MAX_ROUNDS = 10
+
+
+def split_statements(code):
+    """Split source text into top-level statements, as (text, line, column)
+    of each statement's first character. This only scans for boundaries, so
+    it stays cheap next to lexing and parsing the whole document."""
+    chunks = []
+    depth = 0
+    start = 0
+    for match in STATEMENT_BOUNDARY.finditer(code):
+        text = match.group()
+        if text == "{":
+            depth += 1
+            continue
+        if text == "}":
+            depth = max(depth - 1, 0)
+        elif text == "؟" or (text.startswith("/") and not code[start:match.start()].strip()):
+            pass  # A terminator, or a comment standing on its own
+        else:
+            continue
+        if depth == 0:
+            chunks.append((start, match.end()))
+            start = match.end()
+    if code[start:].strip():
+        chunks.append((start, len(code)))  # An unfinished last statement
+
+    statements = []
+    line, line_start, position = 1, 0, 0
+    for start, end in chunks:
+        start += len(code[start:end]) - len(code[start:end].lstrip())
+        newlines = code.count("\n", position, start)
+        if newlines:
+            line += newlines
+            line_start = code.rfind("\n", position, start) + 1
+        position = start
+        statements.append((code[start:end], line, start - line_start + 1))
+    return statements
+
+
+def collect_names(node, names, assignments):
+    if isinstance(node, list):
+        for item in node:
+            collect_names(item, names, assignments)
+        return
+    if not isinstance(node, dict):
+        return
+    node_type = node.get("type")
+    if node_type == "Identifier":
+        names.add(node["name"])
+    elif node_type in ("VariableDecl", "Assignment"):
+        names.add(node["id"])
+        if node_type == "Assignment":
+            assignments.append(node)
+    elif node_type == "FunctionCall" and (node["callee"] in NATIVE_FUNCTIONS or MODULE_SEPARATOR in node["callee"]):
+        names.add(node["callee"])  # Native unless a user function shadows it, or a module's
+    elif node_type == "FunctionDeclaration" and node["name"] in NATIVE_FUNCTIONS:
+        names.add(node["name"])
+    for value in node.values():
+        if isinstance(value, (dict, list)):
+            collect_names(value, names, assignments)
+
+
+class Analysis:
+    """Result of analyzing a chunk against one view of the names it uses."""
+
+    def __init__(self, errors, types, assigned):
+        self.errors = errors  # [{"line", "message"}], lines relative to the chunk
+        self.types = types  # Types of the variables the chunk declares
+        self.assigned = assigned  # Types the chunk assigns, by name
+
+
+class Chunk:
+    """One top-level statement, lexed and parsed once per distinct text and
+    analyzed once per distinct view of the variables it uses."""
+
+    def __init__(self, text, modules=None):
+        self.text = text
+        self.modules = modules
+        self.statements = []
+        self.syntax_errors = []
+        try:
+            tokens = lexer(text)
+            self.statements = Parser(tokens).parse_program()["body"]
+        except RuntimeError as e:
+            self.syntax_errors.append(self.diagnostic(e, "lexer"))
+        except SyntaxError as e:
+            self.syntax_errors.append(self.diagnostic(e, "parser"))
+        names = set()
+        self.assignments = []
+        collect_names(self.statements, names, self.assignments)
+        self.names = sorted(names)
+        self.declared = [s["id"] for s in self.statements if s["type"] == "VariableDecl"]
+        self.functions = {s["name"] for s in self.statements if s["type"] == "FunctionDeclaration"}
+        for statement in self.statements:
+            if statement["type"] == "Import" and modules is not None:
+                try:
+                    module = modules.load(statement["module"])
+                except ValueError:
+                    continue  # Reported when the statement is analyzed
+                # An import declares the module's variables and functions.
+                self.declared.extend(module.exports)
+                self.functions |= module.functions
+                self.names = sorted(set(self.names) | module.exports.keys() | module.functions)
+        # Calls whose meaning depends on the functions declared anywhere in
+        # the document: natives a function may shadow, and module functions.
+        self.natives = [name for name in self.names if name in NATIVE_FUNCTIONS or MODULE_SEPARATOR in name]
+        self.analyses = {}
+
+    @staticmethod
+    def diagnostic(error, stage):
+        message = error.msg if isinstance(error, SyntaxError) else str(error)
+        return {
+            "line": getattr(error, "lineno", None) or 1,
+            "column": getattr(error, "offset", None) or 1,
+            "message": message,
+            "stage": stage,
+        }
+
+    def view(self, visible, assigned, current, functions):
+        """What the analysis of this chunk depends on: for every name it
+        mentions, the type of an earlier declaration and the types the
+        statements of the document assign to it, and which natives it calls
+        are shadowed by functions the document declares."""
+        variables = []
+        for name in self.names:
+            assigned_type = assigned.get(name)
+            current_type = current.get(name)
+            if current_type is not None:
+                # join_types() only takes None as "no type" first.
+                assigned_type = join_types(assigned_type, current_type)
+            variables.append((name, visible.get(name), assigned_type))
+        variables = tuple(variables)
+        return variables, tuple(name for name in self.natives if name in functions)
+
+    def analyze(self, view):
+        analysis = self.analyses.get(view)
+        if analysis is not None:
+            return analysis, False
+        variables, shadowed = view
+        visible = {name: join_types(assigned, value_type) for name, value_type, assigned in variables if value_type}
+        program = {"type": "Program", "body": self.statements}
+        analyzer = SemanticAnalyzer(program, visible, collect_errors=True, functions=shadowed, modules=self.modules)
+        analyzer.widened.update((name, assigned) for name, _, assigned in variables if assigned)
+        analyzer.analyze()
+        scope = analyzer.symbol_table.stack[0]
+        types = {name: scope[name] for name in self.declared if name in scope}
+        assigned = {}
+        for node in self.assignments:
+            value_type = node["value"].get("value_type")
+            if value_type is not None:
+                assigned[node["id"]] = join_types(assigned.get(node["id"]), value_type)
+        analysis = Analysis(analyzer.errors, types, assigned)
+        self.analyses[view] = analysis
+        return analysis, True
+
+
+class IncrementalChecker:
+    """Diagnostics for successive versions of one document.
+
+    The document is split into top-level statements; a statement whose text
+    was already seen reuses its tokens and AST, and is only re-analyzed when
+    the variables it uses changed type or declaration."""
+
+    def __init__(self, modules=None):
+        self.modules = modules  # ModuleLibrary for imports, if any
+        self.chunks = {}  # text -> Chunk, for the statements of the last version
+        self.order = []  # (chunk, view, analysis) of each statement of the last version
+        self.assigned = {}  # Types assigned to each name across the document
+        self.lock = threading.Lock()
+
+    def check(self, code):
+        """Return (diagnostics, stats) for this version of the document."""
+        with self.lock:
+            return self.check_locked(code)
+
+    def check_locked(self, code):
+        chunks = []
+        reparsed = 0
+        for text, line, column in split_statements(code):
+            chunk = self.chunks.get(text)
+            if chunk is None:
+                chunk = self.chunks[text] = Chunk(text, self.modules)
+                reparsed += 1
+            chunks.append((chunk, line, column))
+
+        # Statements before the first edited one and after the last edited
+        # one keep their analysis unless they mention a name the edited
+        # statements (old or new) mention.
+        old = self.order
+        prefix = 0
+        limit = min(len(old), len(chunks))
+        while prefix < limit and old[prefix][0] is chunks[prefix][0]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old[-1 - suffix][0] is chunks[-1 - suffix][0]:
+            suffix += 1
+        dirty = set()
+        for chunk, _, _ in old[prefix:len(old) - suffix]:
+            dirty.update(chunk.names)
+        for chunk, _, _ in chunks[prefix:len(chunks) - suffix]:
+            dirty.update(chunk.names)
+        offset = len(old) - len(chunks)
+        functions = set().union(*(chunk.functions for chunk, _, _ in chunks))
+
+        assigned = self.assigned
+        reanalyzed = 0
+        for _ in range(MAX_ROUNDS):
+            # Like the full analyzer's passes: an assignment widens the
+            # variable for the statements after it right away, and for the
+            # ones before it in the next round.
+            visible = {}
+            current = {}
+            order = []
+            for index, (chunk, _, _) in enumerate(chunks):
+                unchanged = None
+                if dirty is not None and index >= len(chunks) - suffix:
+                    unchanged = old[index + offset]
+                if dirty is not None and index < prefix and dirty.isdisjoint(chunk.natives):
+                    # A function declared further down still changes an
+                    # earlier statement if it shadows a native it calls.
+                    _, view, analysis = old[index]
+                elif unchanged is not None and dirty.isdisjoint(chunk.names):
+                    _, view, analysis = unchanged
+                else:
+                    view = chunk.view(visible, assigned, current, functions)
+                    analysis, fresh = chunk.analyze(view)
+                    reanalyzed += fresh
+                    if unchanged is not None:
+                        # What this statement declares or assigns changed
+                        # too, so the statements after it are affected.
+                        previous = unchanged[2]
+                        if previous.types != analysis.types or previous.assigned != analysis.assigned:
+                            dirty.update(previous.types, previous.assigned, analysis.types, analysis.assigned)
+                order.append((chunk, view, analysis))
+                visible.update(analysis.types)
+                for name, value_type in analysis.assigned.items():
+                    current[name] = join_types(current.get(name), value_type)
+            if current == assigned:
+                break
+            # The edit changed what some variable is assigned, which can
+            # reach any statement: the next round looks at all of them.
+            assigned = current
+            dirty = None
+        self.assigned = assigned
+        self.order = order
+
+        # Keep only what this version uses, so the cache follows the document.
+        if len(old) - prefix - suffix:
+            self.chunks = {chunk.text: chunk for chunk, _, _ in order}
+        for chunk, _, _ in order:
+            if len(chunk.analyses) > 1:
+                chunk.analyses = {}
+        for chunk, view, analysis in order:
+            chunk.analyses[view] = analysis
+
+        diagnostics = []
+        for (chunk, line, column), (_, _, analysis) in zip(chunks, order):
+            for error in chunk.syntax_errors:
+                diagnostic = dict(
+                    error,
+                    line=error["line"] + line - 1,
+                    column=error["column"] + (column - 1 if error["line"] == 1 else 0),
+                )
+                if error["stage"] == "lexer":
+                    # The lexer's message repeats the position, counted in the chunk.
+                    diagnostic["message"] = error["message"].replace(
+                        f"at line {error['line']}, column {error['column']}",
+                        f"at line {diagnostic['line']}, column {diagnostic['column']}",
+                    )
+                diagnostics.append(diagnostic)
+            for error in analysis.errors:
+                diagnostics.append({
+                    "line": error["line"] + line - 1,
+                    "column": column if error["line"] == 1 else None,
+                    "message": error["message"],
+                    "stage": "semantic",
+                })
+        stats = {"statements": len(chunks), "reparsed": reparsed, "reanalyzed": reanalyzed}
+        return diagnostics, stats
+
+
+class DocumentCache:
+    """IncrementalCheckers by document id, least recently used dropped first."""
+
+    def __init__(self, max_documents=256, modules=None):
+        self.max_documents = max_documents
+        self.modules = modules
+        self.checkers = OrderedDict()
+        self.lock = threading.Lock()
+
+    def checker(self, document_id):
+        if document_id is None:
+            return IncrementalChecker(self.modules)
+        with self.lock:
+            checker = self.checkers.pop(document_id, None) or IncrementalChecker(self.modules)
+            self.checkers[document_id] = checker
+            while len(self.checkers) > self.max_documents:
+                self.checkers.popitem(last=False)
+            return checker
@@ -0,0 +1,313 @@
+import re
+
+# Functions whose body (after inlining the calls inside it) is longer than
+# this many IR lines stay calls.
+INLINE_MAX_LINES = 12
+
+IR_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|\w+')
+CALL_LINE = re.compile(r'^(\w+) = call (\w+)\((.*)\)$')
+NATIVE_LINE = re.compile(r'^(\w+) = native (\w+)\((.*)\)$')
+LIST_LINE = re.compile(r'^(\w+) = list\((.*)\)$')
+INDEX_LOAD_LINE = re.compile(r'^(\w+) = ("(?:[^"\\]|\\.)*"|\w+)\[(\w+)\]$')
+INDEX_STORE_LINE = re.compile(r'^(\w+)\[(\w+)\] = (.+)$')
+FUNCTION_LINE = re.compile(r'^(?:pure )?function (\w+)\((.*)\) \{$')
+ASSIGNMENT_LINE = re.compile(r'^(?:decl )?(\w+) = ')
+DECLARATION_LINE = re.compile(r'^decl (\w+) = ')
+JUMP_TARGET = re.compile(r'goto (\w+)$')
+TEMP = re.compile(r't(\d+)$')
+LABEL = re.compile(r'L(\d+)$')
+
+
+def split_arguments(arguments):
+    return re.findall(r'"(?:[^"\\]|\\.)*"|[^,\s]+', arguments)
+
+
+def top_level_names(code):
+    """Names assigned outside every function: the program's globals."""
+    names = set()
+    depth = 0
+    for line in code:
+        if FUNCTION_LINE.match(line):
+            depth += 1
+        elif line == "}":
+            depth -= 1
+        elif depth == 0:
+            match = ASSIGNMENT_LINE.match(line)
+            if match:
+                names.add(match.group(1))
+    return names
+
+
+class Function:
+    def __init__(self, name, params, start):
+        self.name = name
+        self.params = params
+        self.start = start  # Index of the "function" line
+        self.end = None  # Index of the closing "}"
+        self.body = []  # Body lines, with the calls inside already inlined
+        self.body_lines = []  # Source line of each body line
+        self.nested = False  # Contains another function definition
+        self.conditional = False  # Defined inside a branch or a loop
+        self.callees = set()
+        self.assigned = set()  # Names the original body assigns
+        self.declared = set()  # Names the original body declares, so local even if global
+
+
+class FunctionInliner:
+    """IR pass that replaces calls to small non-recursive functions with a
+    copy of their body, then drops the functions nothing calls any more.
+
+    The copy gets fresh temporaries and labels, and the function's
+    parameters and locals are renamed to names source code cannot spell, so
+    they cannot capture or clobber the caller's variables. A return becomes
+    an assignment to the call's result and a jump past the copy. Names the
+    body shares with the top level stay as they are: a function reads and
+    writes globals the same way wherever its body runs. Functions in
+    `exported` are called from other code (a module's importers), so they
+    are kept even when nothing here calls them."""
+
+    def __init__(self, code, types=None, source_lines=None, max_lines=INLINE_MAX_LINES, exported=()):
+        self.code = code
+        self.exported = set(exported)
+        self.types = types if types is not None else {}
+        self.source_lines = source_lines
+        self.max_lines = max_lines
+        self.temp_counter = 0
+        self.label_counter = 0
+        self.site_counter = 0
+        self.stats = {"inlined_calls": 0, "removed_functions": []}
+
+    def new_temp(self):
+        self.temp_counter += 1
+        return f"t{self.temp_counter}"
+
+    def new_label(self):
+        self.label_counter += 1
+        return f"L{self.label_counter}"
+
+    def optimize(self):
+        lines = self.source_lines or [None] * len(self.code)
+        for line in self.code:
+            for token in IR_TOKEN.findall(line):
+                if TEMP.match(token):
+                    self.temp_counter = max(self.temp_counter, int(token[1:]))
+                elif LABEL.match(token):
+                    self.label_counter = max(self.label_counter, int(token[1:]))
+        self.functions = self.scan_functions()
+        self.recursive = {}
+        self.globals = top_level_names(self.code)
+        code, lines = self.inline_calls(lines)
+        code, lines = self.remove_dead_functions(code, lines)
+        self.code = code
+        if self.source_lines is not None:
+            self.source_lines = lines
+        return self.code
+
+    def scan_functions(self):
+        """Functions by name, with where they are defined and what they call."""
+        functions = {}
+        self.definitions = {}  # Index of each "function" line -> Function
+        open_functions = []
+        pending_jumps = set()  # Labels of forward jumps at the top level
+        labels = {line[:-1]: index for index, line in enumerate(self.code) if line.endswith(":")}
+        for index, line in enumerate(self.code):
+            match = FUNCTION_LINE.match(line)
+            if match:
+                params = [param.strip() for param in match.group(2).split(",") if param.strip()]
+                function = Function(match.group(1), params, index)
+                function.conditional = bool(pending_jumps)
+                if open_functions:
+                    open_functions[-1].nested = True
+                    function.conditional = True
+                if function.name in functions:
+                    # Which body a call runs depends on the definitions executed.
+                    function.conditional = functions[function.name].conditional = True
+                open_functions.append(function)
+                functions[function.name] = function
+                self.definitions[index] = function
+            elif line == "}" and open_functions:
+                open_functions.pop().end = index
+            elif open_functions:
+                call = CALL_LINE.match(line)
+                if call:
+                    open_functions[-1].callees.add(call.group(2))
+                assignment = ASSIGNMENT_LINE.match(line)
+                if assignment:
+                    open_functions[-1].assigned.add(assignment.group(1))
+                    if DECLARATION_LINE.match(line):
+                        open_functions[-1].declared.add(assignment.group(1))
+            else:
+                # A definition between a forward jump and its label only
+                # happens on some paths.
+                pending_jumps.discard(line[:-1])
+                jump = JUMP_TARGET.search(line)
+                if jump and labels.get(jump.group(1), -1) > index:
+                    pending_jumps.add(jump.group(1))
+        return functions
+
+    def is_recursive(self, name):
+        if name in self.recursive:
+            return self.recursive[name]
+        self.recursive[name] = self.calls_itself(name)
+        return self.recursive[name]
+
+    def calls_itself(self, name):
+        seen = set()
+        pending = list(self.functions[name].callees)
+        while pending:
+            callee = pending.pop()
+            if callee == name:
+                return True
+            if callee in seen or callee not in self.functions:
+                continue
+            seen.add(callee)
+            pending.extend(self.functions[callee].callees)
+        return False
+
+    def locals_of(self, function):
+        """Parameters and the non-global names the current body assigns."""
+        names = set(function.params)
+        for line in function.body:
+            match = ASSIGNMENT_LINE.match(line)
+            if match and match.group(1) not in self.globals:
+                names.add(match.group(1))
+        return names
+
+    def can_inline(self, function, index, caller):
+        if function.nested or function.conditional or function.end is None or index < function.end:
+            return False
+        if len(function.body) > self.max_lines or self.is_recursive(function.name):
+            return False
+        if function.declared & self.globals:
+            # The body may read the global before declaring its own; a
+            # renamed copy could not tell the two apart.
+            return False
+        if caller is not None:
+            # Globals the body uses must not be shadowed by the caller's
+            # locals (all of them, not just the ones assigned so far).
+            caller_locals = set(caller.params) | (caller.assigned - self.globals) | caller.declared
+            shared = {token for line in function.body for token in IR_TOKEN.findall(line)}
+            if shared & (caller_locals - self.locals_of(function)):
+                return False
+        return True
+
+    def inline_calls(self, lines):
+        code, code_lines = [], []
+        open_functions = []
+
+        def emit(line, source_line):
+            code.append(line)
+            code_lines.append(source_line)
+            if open_functions:
+                open_functions[-1].body.append(line)
+                open_functions[-1].body_lines.append(source_line)
+
+        for index, (line, source_line) in enumerate(zip(self.code, lines)):
+            if index in self.definitions:
+                emit(line, source_line)
+                open_functions.append(self.definitions[index])
+                continue
+            if line == "}" and open_functions:
+                open_functions.pop()
+                emit(line, source_line)
+                continue
+            call = CALL_LINE.match(line)
+            callee = self.functions.get(call.group(2)) if call else None
+            caller = open_functions[-1] if open_functions else None
+            arguments = split_arguments(call.group(3)) if call else None
+            if callee is not None and len(arguments) == len(callee.params) and self.can_inline(callee, index, caller):
+                self.stats["inlined_calls"] += 1
+                for new_line, new_source_line in self.expand(callee, call.group(1), arguments, source_line):
+                    emit(new_line, new_source_line)
+            else:
+                emit(line, source_line)
+        return code, code_lines
+
+    def expand(self, function, result, arguments, source_line):
+        """The body of `function` as straight-line IR assigning its return
+        value to `result`."""
+        self.site_counter += 1
+        assigned = {match.group(1) for match in map(ASSIGNMENT_LINE.match, function.body) if match}
+        has_calls = any(CALL_LINE.match(line) for line in function.body)
+        renames = {}
+        moves = []
+        for param, argument in zip(function.params, arguments):
+            # A parameter the body never assigns can read the argument
+            # itself, unless the body could change what the argument holds.
+            stable = (
+                argument.isdigit() or TEMP.match(argument)
+                or (argument.isidentifier() and argument not in assigned and not has_calls)
+            )
+            if stable and param not in assigned:
+                renames[param] = argument
+            else:
+                renames[param] = f"{param}_i{self.site_counter}"
+                moves.append((f"{renames[param]} = {argument}", source_line))
+        for line in function.body:
+            for token in IR_TOKEN.findall(line):
+                if token not in renames and TEMP.match(token):
+                    renames[token] = self.new_temp()
+                elif token not in renames and LABEL.match(token):
+                    renames[token] = self.new_label()
+        for name in self.locals_of(function):
+            renames.setdefault(name, f"{name}_i{self.site_counter}")
+        for name, new_name in renames.items():
+            if name in self.types and new_name not in self.types:
+                self.types[new_name] = self.types[name]
+
+        def rename(line):
+            call = CALL_LINE.match(line) or NATIVE_LINE.match(line)
+            if call:
+                # The callee's name is not a variable, even if a local shares it.
+                return f"{rename(call.group(1))}{line[call.end(1):call.start(3)]}{rename(call.group(3))})"
+            return IR_TOKEN.sub(lambda match: renames.get(match.group(), match.group()), line)
+
+        end_label = self.new_label()
+        expansion = moves
+        jumps_to_end = False
+        for index, (line, body_line) in enumerate(zip(function.body, function.body_lines)):
+            if not line.startswith("return "):
+                expansion.append((rename(line), body_line))
+                continue
+            value = line[len("return "):]
+            previous = function.body[index - 1] if index else ""
+            if TEMP.match(value) and previous.startswith(f"{value} = ") and sum(
+                    value in IR_TOKEN.findall(other) for other in function.body) == 2:
+                # "tN = a + b" then "return tN": compute straight into the result.
+                expansion[-1] = (f"{result} = {rename(previous[len(value) + 3:])}", expansion[-1][1])
+            else:
+                expansion.append((f"{result} = {rename(value)}", body_line))
+            if index < len(function.body) - 1:
+                expansion.append((f"goto {end_label}", body_line))
+                jumps_to_end = True
+        if not function.body or not function.body[-1].startswith("return "):
+            expansion.append((f"{result} = 0", source_line))  # Falling off the end returns 0
+        if jumps_to_end:
+            expansion.append((f"{end_label}:", source_line))
+        return expansion
+
+    def remove_dead_functions(self, code, lines):
+        """Drop the definitions of functions no code outside them calls."""
+        while True:
+            spans = []
+            called = set()
+            open_functions = []
+            for index, line in enumerate(code):
+                match = FUNCTION_LINE.match(line)
+                call = CALL_LINE.match(line)
+                if match:
+                    open_functions.append((match.group(1), index))
+                elif line == "}" and open_functions:
+                    name, start = open_functions.pop()
+                    spans.append((name, start, index))
+                elif call and all(call.group(2) != name for name, _ in open_functions):
+                    called.add(call.group(2))  # Calls from inside the function itself do not count
+            removed = set()
+            for name, start, end in spans:
+                if name not in called and name not in self.exported:
+                    self.stats["removed_functions"].append(name)
+                    removed.update(range(start, end + 1))
+            if not removed:
+                return code, lines
+            code = [line for index, line in enumerate(code) if index not in removed]
+            lines = [line for index, line in enumerate(lines) if index not in removed]
@@ -1,9 +1,21 @@
+from semantic_analyzer import join_types
+
+
 class IntermediateCodeGenerator:
     def __init__(self, ast):
         self.ast = ast
         self.code = []
         self.temp_counter = 0
         self.label_counter = 0
+        # Static type of every IR name, used to pick specialized instructions.
+        # Names are flat in the IR, so types are joined over every assignment.
+        self.types = {}
+        # Source line of every IR line, parallel to self.code.
+        self.source_lines = []
+        self.current_line = None
+
+    def record_type(self, name, value_type):
+        self.types[name] = join_types(self.types.get(name), value_type)
 
     def new_temp(self):
         self.temp_counter += 1
@@ -15,9 +27,25 @@ class IntermediateCodeGenerator:
 
     def generate(self):
         self.visit(self.ast)
+        self.mark_lines()
         return self.code
 
+    def mark_lines(self):
+        """Attribute IR emitted since the last call to the current statement."""
+        self.source_lines.extend([self.current_line] * (len(self.code) - len(self.source_lines)))
+
     def visit(self, node):
+        line = node.get("line")
+        if line is None:
+            return self.visit_node(node)
+        self.mark_lines()
+        outer_line, self.current_line = self.current_line, line
+        result = self.visit_node(node)
+        self.mark_lines()
+        self.current_line = outer_line
+        return result
+
+    def visit_node(self, node):
         node_type = node["type"]
         if node_type == "Program":
             for statement in node["body"]:
@@ -46,21 +74,31 @@ class IntermediateCodeGenerator:
             self.handle_return_statement(node)
         elif node_type == "FunctionCall":
             return self.handle_function_call(node)
+        elif node_type == "ListLiteral":
+            return self.handle_list_literal(node)
+        elif node_type == "IndexExpression":
+            return self.handle_index_expression(node)
+        elif node_type == "IndexAssignment":
+            self.handle_index_assignment(node)
         else:
             # raise ValueError(f"Unknown AST node type: {node_type}")
             pass
 
     def handle_variable_decl(self, node):
+        # "decl" binds in the running frame: a function's own variable,
+        # even where a global has the same name.
         if node["init"]:
             expr_result = self.visit(node["init"])
-            self.code.append(f"{node['id']} = {expr_result}")
+            self.code.append(f"decl {node['id']} = {expr_result}")
         else:
-            self.code.append(f"{node['id']} = 0")  # Default to 0
+            self.code.append(f"decl {node['id']} = 0")  # Default to 0
+        self.record_type(node["id"], node.get("value_type", "any"))
 
     def handle_if_statement(self, node):
         condition = self.visit(node["test"])
         temp_condition = self.new_temp()
         self.code.append(f"{temp_condition} = {condition}")
+        self.record_type(temp_condition, node["test"].get("value_type", "any"))
         true_label = self.new_label()
         end_label = self.new_label()
         self.code.append(f"if {temp_condition} goto {true_label}")
@@ -75,6 +113,7 @@ class IntermediateCodeGenerator:
         right = self.visit(node["right"])
         temp = self.new_temp()
         self.code.append(f"{temp} = {left} {node['operator']} {right}")
+        self.record_type(temp, node.get("value_type", "any"))
         return temp
 
     def handle_print_statement(self, node):
@@ -85,6 +124,8 @@ class IntermediateCodeGenerator:
         func_name = node["name"]
         params = node["params"]
         self.code.append(f"function {func_name}({', '.join(params)}) {{")
+        for param in params:
+            self.record_type(param, "any")
         for stmt in node["body"]:
             self.visit(stmt)
         self.code.append("}")
@@ -92,10 +133,34 @@ class IntermediateCodeGenerator:
     def handle_function_call(self, node):
         args = [self.visit(arg) for arg in node["arguments"]]
         temp = self.new_temp()
-        self.code.append(f"{temp} = call {node['callee']}({', '.join(args)})")
+        # Natives were resolved by the semantic analyzer and run in one step.
+        kind = "native" if node.get("native") else "call"
+        self.code.append(f"{temp} = {kind} {node['callee']}({', '.join(args)})")
+        self.record_type(temp, node.get("value_type", "any"))
         return temp
 
 
+    def handle_list_literal(self, node):
+        elements = [self.visit(element) for element in node["elements"]]
+        temp = self.new_temp()
+        self.code.append(f"{temp} = list({', '.join(elements)})")
+        self.record_type(temp, "list")
+        return temp
+
+    def handle_index_expression(self, node):
+        target = self.visit(node["object"])
+        index = self.visit(node["index"])
+        temp = self.new_temp()
+        self.code.append(f"{temp} = {target}[{index}]")
+        self.record_type(temp, node.get("value_type", "any"))
+        return temp
+
+    def handle_index_assignment(self, node):
+        target = self.visit(node["object"])
+        index = self.visit(node["index"])
+        value = self.visit(node["value"])
+        self.code.append(f"{target}[{index}] = {value}")
+
     def handle_while_statement(self, node):
         condition_label = self.new_label()
         end_label = self.new_label()
@@ -104,6 +169,7 @@ class IntermediateCodeGenerator:
         condition = self.visit(node["test"])
         temp_condition = self.new_temp()
         self.code.append(f"{temp_condition} = {condition}")
+        self.record_type(temp_condition, node["test"].get("value_type", "any"))
         self.code.append(f"if not {temp_condition} goto {end_label}")
 
         for stmt in node["body"]:
@@ -116,10 +182,11 @@ class IntermediateCodeGenerator:
     def handle_assignment(self, node):
         value = self.visit(node["value"])
         self.code.append(f"{node['id']} = {value}")
+        self.record_type(node["id"], node["value"].get("value_type", "any"))
 
 
     def handle_return_statement(self, node):
-        value = self.visit(node["value"])
+        value = self.visit(node["value"]) if node["value"] else "0"
         self.code.append(f"return {value}")
 
 
@@ -128,5 +195,6 @@ class IntermediateCodeGenerator:
         right = self.visit(node["right"])
         temp = self.new_temp()
         self.code.append(f"{temp} = {left} {node['operator']} {right}")
+        self.record_type(temp, node.get("value_type", "any"))
         return temp
 
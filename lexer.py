@@ -1,9 +1,23 @@
 import re
 
 KEYWORDS = {
-    "عرف", "لو", "بينما", "دالة", "عرض", "اعد", "؟", "//", "/*", "*/"
+    "عرف", "لو", "بينما", "دالة", "عرض", "اعد", "استورد", "؟", "//", "/*", "*/"
 }
 
+# "module.name" lexes as one identifier: the name inside the imported
+# module's namespace. A Fekra identifier cannot contain the separator, so
+# these never clash with a program's own names.
+MODULE_SEPARATOR = "_M_"
+
+
+def qualified_name(module, name):
+    return f"{module}{MODULE_SEPARATOR}{name}"
+
+
+def display_name(name):
+    """A name as the programmer wrote it, for error messages."""
+    return name.replace(MODULE_SEPARATOR, ".")
+
 COMPARISON_OPS = {
     "==", "!=", "<", "<=", ">", ">=", "===", "!=="
 }
@@ -14,7 +28,8 @@ OPERATORS = {
 
 token_specification = [
     ('COMMENT', r'//[^\n]*|/\*.*?\*/'), 
-    ('KEYWORD', r'\b(?:عرف|لو|بينما|دالة|عرض|اعد)\b'), 
+    ('QUALIFIED', r'[ء-ي_][ء-ي0-9_]*\.[ء-ي_][ء-ي0-9_]*'),
+    ('KEYWORD', r'\b(?:عرف|لو|بينما|دالة|عرض|اعد|استورد)\b'), 
     ('IDENTIFIER', r'[ء-ي_][ء-ي0-9_]*'),  
     ('NUMBER', r'\b\d+(\.\d*)?\b'), 
     ('STRING', r'"([^"\\]|\\.)*"|"""([^"\\]|\\.)*"""'), 
@@ -24,6 +39,8 @@ token_specification = [
     ('RPAREN', r'\)'), 
     ('LBRACE', r'\{'), 
     ('RBRACE', r'\}'), 
+    ('LBRACKET', r'\['),
+    ('RBRACKET', r'\]'),
     ('COMMA', r','),  
     ('TERMINATOR', r'؟'),  
     ('SKIP', r'[ \t]+'),
@@ -32,52 +49,37 @@ token_specification = [
 ]
 
 master_pattern = '|'.join(f'(?P<{pair[0]}>{pair[1]})' for pair in token_specification)
+# Compiled once at import, so every worker forked after a preload shares it.
+master_regex = re.compile(master_pattern)
+
+# Kinds that become a token as they are matched.
+PLAIN_TOKENS = frozenset(kind for kind, _ in token_specification) - {'SKIP', 'NEWLINE', 'QUALIFIED', 'MISMATCH'}
 
 
 def lexer(code):
     line_num = 1
     line_start = 0
     tokens = []
-    for mo in re.finditer(master_pattern, code):
+    for mo in master_regex.finditer(code):
         kind = mo.lastgroup
         value = mo.group()
         column = mo.start() - line_start
 
-        if kind == 'SKIP':
+        if kind in PLAIN_TOKENS:
+            tokens.append((kind, value, line_num, column + 1))
+        elif kind == 'SKIP':
             continue
-        elif kind == 'COMMENT':
-            tokens.append(('COMMENT', value))
-        elif kind == 'KEYWORD':
-            tokens.append(('KEYWORD', value))
-        elif kind == 'IDENTIFIER':
-            tokens.append(('IDENTIFIER', value))
-        elif kind == 'NUMBER':
-            tokens.append(('NUMBER', value))
-        elif kind == 'STRING':
-            tokens.append(('STRING', value))
-        elif kind == 'COMPARISON_OP':
-            tokens.append(('COMPARISON_OP', value))
-        elif kind == 'OPERATOR':
-            tokens.append(('OPERATOR', value))
-        elif kind == 'LPAREN':
-            tokens.append(('LPAREN', value))
-        elif kind == 'RPAREN':
-            tokens.append(('RPAREN', value))
-        elif kind == 'LBRACE':
-            tokens.append(('LBRACE', value))
-        elif kind == 'RBRACE':
-            tokens.append(('RBRACE', value))
-        elif kind == 'COMMA':
-            tokens.append(('COMMA', value))
-        elif kind == 'TERMINATOR':
-            tokens.append(('TERMINATOR', value))
+        elif kind == 'QUALIFIED':
+            tokens.append(('IDENTIFIER', qualified_name(*value.split('.')), line_num, column + 1))
         elif kind == 'NEWLINE':
             line_num += 1
             line_start = mo.end()
         elif kind == 'MISMATCH':
-            raise RuntimeError(
+            error = RuntimeError(
                 f'start Unexpected character {value!r} at line {line_num}, column {column + 1} end'
             )
+            error.lineno, error.offset = line_num, column + 1
+            raise error
 
     return tokens
 
@@ -0,0 +1,93 @@
+from array import array
+
+from string_value import text_of
+
+# Bytes an element takes: a 64-bit array item, or a pointer in a list.
+ITEM_BYTES = 8
+
+
+def check_list_limit(length, limit):
+    """Raise MemoryError if a list of `length` elements would take more
+    than `limit` bytes."""
+    if limit is not None and length * ITEM_BYTES > limit:
+        raise MemoryError(f"List too long: {length} elements is over the limit of {limit // 1024} KB.")
+
+
+def storage_for(values):
+    """Contiguous storage for a list's elements: an array of 64-bit ints or
+    of doubles while they are all numbers of one kind, else a Python list."""
+    if values and all(type(value) is int for value in values):
+        try:
+            return array("q", values)
+        except OverflowError:
+            return list(values)  # Some int does not fit in 64 bits
+    if values and all(type(value) is float for value in values):
+        return array("d", values)
+    # Strings still being built are joined: lists hold plain values.
+    return [text_of(value) for value in values]
+
+
+class ListValue:
+    """A Fekra list. Lists are mutable and shared by reference, like Python
+    lists; indexes start at 0 and must be in range."""
+
+    __slots__ = ("items",)
+
+    def __init__(self, values=()):
+        self.items = storage_for(values)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __eq__(self, other):
+        return isinstance(other, ListValue) and list(self.items) == list(other.items)
+
+    __hash__ = None  # Mutable: never a memo key
+
+    def __add__(self, other):
+        if not isinstance(other, ListValue):
+            return NotImplemented
+        if isinstance(self.items, array) and isinstance(other.items, array) \
+                and self.items.typecode == other.items.typecode:
+            result = ListValue()
+            result.items = self.items + other.items
+            return result
+        return ListValue(list(self.items) + list(other.items))
+
+    def __repr__(self):
+        return repr(self.to_python())
+
+    def check_index(self, index):
+        if type(index) is not int:
+            raise ValueError(f"List index must be an integer, got {index!r}.")
+        if not 0 <= index < len(self.items):
+            raise ValueError(f"List index {index} out of range for a list of length {len(self.items)}.")
+        return index
+
+    def get(self, index):
+        return self.items[self.check_index(index)]
+
+    def set(self, index, value):
+        value = text_of(value)
+        self.make_room_for(value)[self.check_index(index)] = value
+
+    def append(self, value):
+        value = text_of(value)
+        self.make_room_for(value).append(value)
+
+    def make_room_for(self, value):
+        """The storage, switched to a Python list if `value` does not fit
+        the array it is in now."""
+        items = self.items
+        if isinstance(items, array):
+            fits = type(value) is int and -2**63 <= value < 2**63 if items.typecode == "q" else type(value) is float
+            if not fits:
+                items = self.items = list(items)
+        return items
+
+    def to_python(self):
+        """The elements as (nested) Python lists, for output."""
+        return [value.to_python() if isinstance(value, ListValue) else value for value in self.items]
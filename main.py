@@ -57,13 +57,13 @@ print("Optimized Code:")
 print("\n".join(optimized_code))
 
 # Step 6: Generate Target Code
-tcg = TargetCodeGenerator(ir_code)
+tcg = TargetCodeGenerator(ir_code, icg.types, icg.source_lines)
 target_code = tcg.generate()
 print("Target Code:")
 print("\n".join(target_code))
 
 # Step 7: Execute with Virtual Machine
-vm = VirtualMachine(target_code)
+vm = VirtualMachine(target_code, debug=True, source_map=tcg.source_map)
 output = vm.run()
 print("VM Execution Output:")
 print(output)
@@ -0,0 +1,40 @@
+from collections import OrderedDict
+
+
+class MemoCache:
+    """Results of pure function calls for one run, keyed by function and
+    argument tuple. Least recently used entries are evicted first once
+    max_entries is reached."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """Return (True, value) on a hit and (False, None) on a miss. Raises
+        TypeError if the key holds an unhashable value."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, self.entries[key]
+        self.misses += 1
+        return False, None
+
+    def store(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+        }
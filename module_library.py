@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+
+from inliner import FunctionInliner
+from intermediate_code_generator import IntermediateCodeGenerator
+from lexer import MODULE_SEPARATOR, lexer, qualified_name
+from parser import Parser
+from purity_analyzer import PurityAnalyzer
+from semantic_analyzer import SemanticAnalyzer
+from target_code_generator import TargetCodeGenerator
+
+# Target instructions whose first operand is a name: a variable, function
+# or label, all of which move into the module's namespace.
+NAME_OPERANDS = {
+    "PUSH", "STORE", "STORE_LOCAL", "PARAM", "CALL", "TAIL_CALL", "FUNC_DEFINE", "LABEL", "JUMP", "JUMP_IF_TRUE",
+    "JUMP_IF_FALSE",
+}
+
+
+def namespaced(instruction, module):
+    """The instruction with the name it uses moved into `module`'s namespace.
+    Literals, and names already in another module's namespace, are kept."""
+    command, _, operand = instruction.partition(" ")
+    if command not in NAME_OPERANDS or not operand:
+        return instruction
+    if command == "PUSH" and (operand.startswith('"') or operand.replace('.', '', 1).lstrip('-').isdigit()):
+        return instruction
+    name, _, flags = operand.partition(" ")
+    if MODULE_SEPARATOR in name:
+        return instruction
+    return f"{command} {qualified_name(module, name)}{' ' + flags if flags else ''}"
+
+
+def linked_modules(imports):
+    """The modules a program importing `imports` is linked with, each once
+    and after the modules it imports itself."""
+    modules = []
+    for module in imports:
+        for dependency in module.modules + [module]:
+            if dependency not in modules:
+                modules.append(dependency)
+    return modules
+
+
+def link(modules, target_code, source_map=None):
+    """The program's target code after the code of its modules, which runs
+    first and defines their functions and variables, and its source map
+    moved to match. Modules are already compiled: this only concatenates."""
+    code = [instruction for module in modules for instruction in module.target_code]
+    offset = len(code)
+    code.extend(target_code)
+    return code, source_map.shifted(offset) if source_map is not None else None
+
+
+class ModuleArtifact:
+    """A module compiled once: its AST, IR and target code, with every name
+    in the target code in the module's namespace, and what it exports to
+    the programs that import it."""
+
+    def __init__(self, name, digest, ast, ir_code, target_code, exports, functions, pure_functions, modules):
+        self.name = name
+        self.digest = digest  # sha256 of the source it was compiled from
+        self.ast = ast
+        self.ir_code = ir_code
+        self.target_code = target_code
+        self.exports = exports  # Qualified variable names -> type
+        self.functions = functions  # Qualified names of its functions
+        self.pure_functions = pure_functions
+        self.modules = modules  # Modules it is linked with, see linked_modules()
+
+
+class ModuleLibrary:
+    """The modules programs can import: "<name>.fk" files in one directory.
+
+    A module is compiled on its first import and the artifact is reused
+    until the file's content changes (or a module it imports changes), so a
+    program only pays for compiling its own code."""
+
+    def __init__(self, path):
+        self.path = path
+        self.artifacts = {}  # name -> (file stat, ModuleArtifact)
+        self.loading = []  # Modules being compiled, innermost last
+        self.lock = threading.RLock()
+        self.compiled = 0
+
+    def load(self, name):
+        """The artifact of module `name`, raising ValueError if it does not
+        exist or does not compile."""
+        with self.lock:
+            if name in self.loading:
+                raise ValueError(f"Circular import: {' -> '.join(self.loading[self.loading.index(name):] + [name])}.")
+            path = os.path.join(self.path, f"{name}.fk")
+            try:
+                stat = os.stat(path)
+            except OSError:
+                raise ValueError(f"Unknown module '{name}'.") from None
+            stat = (stat.st_mtime_ns, stat.st_size)
+            cached_stat, artifact = self.artifacts.get(name, (None, None))
+            if artifact is not None and cached_stat == stat and self.up_to_date(artifact):
+                return artifact
+            with open(path, encoding="utf-8") as f:
+                source = f.read()
+            digest = hashlib.sha256(source.encode()).hexdigest()
+            if artifact is None or artifact.digest != digest or not self.up_to_date(artifact):
+                artifact = self.compile(name, source, digest)
+            self.artifacts[name] = (stat, artifact)
+            return artifact
+
+    def up_to_date(self, artifact):
+        return all(self.load(module.name) is module for module in artifact.modules)
+
+    def compile(self, name, source, digest):
+        self.loading.append(name)
+        try:
+            try:
+                ast = Parser(lexer(source)).parse_program()
+                analyzer = SemanticAnalyzer(ast, modules=self)
+                analyzer.analyze()
+            except (RuntimeError, SyntaxError, ValueError) as e:
+                raise ValueError(f"Error in module '{name}': {e}") from None
+        finally:
+            self.loading.pop()
+        imports = list(analyzer.imports.values())
+        functions = {s["name"] for s in ast["body"] if s["type"] == "FunctionDeclaration"}
+        icg = IntermediateCodeGenerator(ast)
+        ir_code = FunctionInliner(icg.generate(), icg.types, exported=functions).optimize()
+        purity = PurityAnalyzer(ir_code, set().union(*(module.pure_functions for module in imports)))
+        ir_code = purity.analyze()
+        target_code = TargetCodeGenerator(ir_code, icg.types).generate()
+        self.compiled += 1
+
+        scope = analyzer.symbol_table.stack[0]
+        return ModuleArtifact(
+            name, digest, ast, ir_code,
+            [namespaced(instruction, name) for instruction in target_code],
+            exports={
+                qualified_name(name, variable): value_type
+                for variable, value_type in scope.items() if MODULE_SEPARATOR not in variable
+            },
+            functions={qualified_name(name, function) for function in functions},
+            pure_functions={qualified_name(name, function) for function in purity.pure_functions & functions},
+            modules=linked_modules(imports),
+        )
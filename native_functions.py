@@ -0,0 +1,228 @@
+import importlib
+import re
+from array import array
+
+from list_value import ListValue, check_list_limit
+from string_value import StringValue, check_limit
+
+# Native functions are called like user functions, so their names must lex
+# as identifiers.
+NATIVE_NAME = re.compile(r'[ء-ي_][ء-ي0-9_]*$')
+
+NUMBER = {"int", "float", "bool"}
+INT = {"int", "bool"}
+STRING = {"string"}
+LIST = {"list"}
+
+
+class NativeFunction:
+    """A builtin implemented in Python. `arity` is a count or a (min, max)
+    pair with max None for any number of arguments. `param_types` holds the
+    static types each argument may have, None for any (the last entry
+    covers the rest),
+    `result_type` is a type or a function of the argument types. Pure
+    natives depend only on their arguments, and neither change a list nor
+    return a new one. Strings arrive as str, unless `flat_strings` is False:
+    then a string still being built comes as a StringValue, which supports
+    len() without joining its text. A `limited` native builds a value of a
+    size its arguments pick, and gets the run's byte limit as `limit` to
+    check before allocating."""
+
+    def __init__(
+        self, name, function, arity, result_type="any", param_types=None, pure=True, flat_strings=True, limited=False,
+    ):
+        self.name = name
+        self.function = function
+        self.min_args, self.max_args = (arity, arity) if isinstance(arity, int) else arity
+        self.result_type = result_type
+        self.param_types = param_types
+        self.pure = pure
+        self.flat_strings = flat_strings
+        self.limited = limited
+
+    def check_arity(self, count):
+        if count < self.min_args or (self.max_args is not None and count > self.max_args):
+            if self.max_args is None:
+                expected = f"at least {self.min_args}"
+            elif self.min_args == self.max_args:
+                expected = str(self.min_args)
+            else:
+                expected = f"{self.min_args} to {self.max_args}"
+            plural = "" if expected == "1" else "s"
+            raise ValueError(f"Function '{self.name}' takes {expected} argument{plural}, got {count}.")
+
+    def check(self, arg_types):
+        """Result type of a call with these argument types, raising
+        ValueError on a wrong argument type."""
+        if self.param_types:
+            for index, arg_type in enumerate(arg_types):
+                allowed = self.param_types[min(index, len(self.param_types) - 1)]
+                if arg_type != "any" and allowed is not None and arg_type not in allowed:
+                    raise ValueError(
+                        f"Type error: argument {index + 1} of '{self.name}' must be "
+                        f"{' or '.join(sorted(allowed))}, got {arg_type}."
+                    )
+        if callable(self.result_type):
+            return self.result_type(arg_types)
+        return self.result_type
+
+    def call(self, args, limit=None):
+        if self.flat_strings and StringValue in map(type, args):
+            args = [value.flatten() if type(value) is StringValue else value for value in args]
+        try:
+            if self.limited:
+                return self.function(*args, limit=limit)
+            return self.function(*args)
+        except TypeError as e:
+            raise ValueError(f"Invalid arguments for '{self.name}': {e}") from e
+
+
+# Natives by name. User functions with the same name shadow them.
+NATIVE_FUNCTIONS = {}
+
+
+def register_native(
+    name, function, arity, result_type="any", param_types=None, pure=True, flat_strings=True, limited=False,
+):
+    """Make `function` callable from Fekra programs as `name`."""
+    if not NATIVE_NAME.match(name):
+        raise ValueError(f"Invalid native function name: {name!r}")
+    if name in NATIVE_FUNCTIONS:
+        raise ValueError(f"Native function '{name}' is already registered.")
+    NATIVE_FUNCTIONS[name] = NativeFunction(
+        name, function, arity, result_type, param_types, pure, flat_strings, limited,
+    )
+    return function
+
+
+def native(name, arity, **options):
+    """Decorator form of register_native."""
+    def decorator(function):
+        return register_native(name, function, arity, **options)
+    return decorator
+
+
+def load_native_modules(modules):
+    """Import the comma-separated modules, which register their own natives
+    (a deployment's helpers, named in FEKRA_NATIVE_MODULES)."""
+    for module in modules.split(","):
+        if module.strip():
+            importlib.import_module(module.strip())
+
+
+def numeric_result(arg_types):
+    if all(arg_type in INT for arg_type in arg_types):
+        return "int"
+    if all(arg_type in NUMBER for arg_type in arg_types):
+        return "float"
+    return "any"
+
+
+@native("طول", 1, result_type="int", param_types=[STRING | LIST], flat_strings=False)
+def length(value):
+    return len(value)
+
+
+@native("جزء", (2, 3), result_type="string", param_types=[STRING, INT])
+def substring(text, start, end=None):
+    return text[start:end]
+
+
+@native("مطلق", 1, result_type=numeric_result, param_types=[NUMBER])
+def absolute(number):
+    return abs(number)
+
+
+def as_list(name, value):
+    if not isinstance(value, ListValue):
+        raise ValueError(f"'{name}' needs a list, got {value!r}.")
+    return value
+
+
+def numbers_of(name, numbers):
+    """The numbers to compare: the elements of a single list argument, or
+    the arguments themselves."""
+    if len(numbers) > 1:
+        return numbers
+    if not isinstance(numbers[0], ListValue):
+        raise ValueError(f"'{name}' needs a list or at least two numbers.")
+    if not numbers[0]:
+        raise ValueError(f"'{name}' of an empty list.")
+    return numbers[0]
+
+
+@native("اصغر", (1, None), result_type=numeric_result, param_types=[NUMBER | LIST, NUMBER])
+def minimum(*numbers):
+    return min(numbers_of("اصغر", numbers))
+
+
+@native("اكبر", (1, None), result_type=numeric_result, param_types=[NUMBER | LIST, NUMBER])
+def maximum(*numbers):
+    return max(numbers_of("اكبر", numbers))
+
+
+@native("تنسيق", 2, result_type="string", param_types=[NUMBER, INT], limited=True)
+def format_number(number, digits, limit=None):
+    if digits < 0:
+        raise ValueError("The number of digits cannot be negative.")
+    check_limit(digits, 1, 1, limit)  # The digits after the point alone
+    return f"{number:.{digits}f}"
+
+
+@native("نص", 1, result_type="string")
+def to_string(value):
+    return str(value)
+
+
+@native("عدد", 1, result_type="any", param_types=[STRING | NUMBER])
+def to_number(value):
+    if not isinstance(value, str):
+        return value
+    try:
+        return float(value) if "." in value else int(value)
+    except ValueError:
+        raise ValueError(f"Cannot convert {value!r} to a number.") from None
+
+
+@native("مجموع", 1, param_types=[LIST])
+def total(values):
+    return sum(as_list("مجموع", values).items)
+
+
+@native("رتب", 1, result_type="list", param_types=[LIST], pure=False)
+def sort(values):
+    """A sorted copy of the list."""
+    return ListValue(sorted(as_list("رتب", values).items))
+
+
+@native("املأ", 2, result_type="list", param_types=[INT, None], pure=False, limited=True)
+def fill(count, value, limit=None):
+    """A new list of `count` copies of `value`."""
+    if count < 0:
+        raise ValueError("A list cannot have a negative length.")
+    check_list_limit(count, limit)
+    if type(value) is int and -2**63 <= value < 2**63:
+        result = ListValue()
+        result.items = array("q", [value]) * count
+        return result
+    return ListValue([value] * count)
+
+
+@native("مدى", (1, 3), result_type="list", param_types=[INT], pure=False, limited=True)
+def number_range(*bounds, limit=None):
+    """The ints from 0 (or the first bound) up to, not including, the last
+    bound, like Python's range()."""
+    numbers = range(*bounds)
+    # len() overflows past sys.maxsize elements; count them exactly.
+    step = numbers.step
+    check_list_limit(max(0, (numbers.stop - numbers.start + step - (1 if step > 0 else -1)) // step), limit)
+    result = ListValue()
+    result.items = array("q", numbers)
+    return result
+
+
+@native("أضف", 2, result_type="list", param_types=[LIST, None], pure=False)
+def append(values, value):
+    """Add `value` at the end of the list, and return the list."""
+    as_list("أضف", values).append(value)
+    return values
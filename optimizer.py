@@ -58,15 +58,16 @@ class Optimizer:
         new_code = []
         for line in reversed(self.code):
             if "=" in line:
-                target = line.split("=")[0].strip()
+                target = line.split("=")[0].strip().removeprefix("decl ")
                 if target in used_vars or "if" in line or "goto" in line or "print" in line:
                     used_vars.update(line.split())  # Add used vars
-                    new_code.insert(0, line)
+                    new_code.append(line)
                 else:
                     # Remove unused assignments
                     pass
             else:
-                new_code.insert(0, line)
+                new_code.append(line)
+        new_code.reverse()  # Built back to front; appending keeps this linear
         self.code = new_code
 
     def common_subexpression_elimination(self):
@@ -81,7 +82,7 @@ class Optimizer:
                 if expr in expr_map:
                     new_code.append(f"{target} = {expr_map[expr]}")
                 else:
-                    expr_map[expr] = target
+                    expr_map[expr] = target.removeprefix("decl ")
                     new_code.append(line)
             else:
                 new_code.append(line)
@@ -1,3 +1,6 @@
+from lexer import MODULE_SEPARATOR, display_name
+
+
 class Parser:
     def __init__(self, tokens):
         self.tokens = tokens
@@ -14,34 +17,59 @@ class Parser:
         if token and token[0] == token_type:
             self.advance()
             return token
-        raise SyntaxError(f"Expected {token_type} at position {self.pos}, got {token}")
+        raise self.syntax_error(f"Expected {token_type} at position {self.pos}, got {token}")
+
+    def syntax_error(self, message):
+        """SyntaxError carrying the source position of the current token (or
+        the last one, at the end of input)."""
+        token = self.current_token() or (self.tokens[-1] if self.tokens else None)
+        error = SyntaxError(message)
+        if token is not None:
+            error.lineno, error.offset = token[2], token[3]
+        return error
 
     def parse_program(self):
         statements = []
         while self.current_token():
-            statements.append(self.parse_statement())
+            statements.append(self.parse_statement(top_level=True))
         return {"type": "Program", "body": statements}
 
-    def parse_statement(self):
+    def parse_statement(self, top_level=False):
         token = self.current_token()
-        if token[0] == "KEYWORD" and token[1] == "عرف":
-            return self.parse_variable_decl()
+        if token[0] == "KEYWORD" and token[1] == "استورد":
+            if not top_level:
+                raise self.syntax_error(f"Modules can only be imported at the top level, at position {self.pos}")
+            statement = self.parse_import()
+        elif token[0] == "KEYWORD" and token[1] == "عرف":
+            statement = self.parse_variable_decl()
         elif token[0] == "KEYWORD" and token[1] == "لو":
-            return self.parse_if_statement()
+            statement = self.parse_if_statement()
         elif token[0] == "KEYWORD" and token[1] == "بينما":
-            return self.parse_while_statement()
+            statement = self.parse_while_statement()
         elif token[0] == "KEYWORD" and token[1] == "دالة":
-            return self.parse_function_decl()
+            statement = self.parse_function_decl()
         elif token[0] == "KEYWORD" and token[1] == "عرض":
-            return self.parse_print_statement()
+            statement = self.parse_print_statement()
         elif token[0] == "IDENTIFIER":
-            return self.parse_assignment_or_function_call()
+            statement = self.parse_assignment_or_function_call()
         elif token[0] == "KEYWORD" and token[1] == "اعد":
-            return self.parse_return_statement()
+            statement = self.parse_return_statement()
         elif token[0] == "COMMENT":
-            return self.parse_comment()
+            statement = self.parse_comment()
         else:
-            raise SyntaxError(f"Unexpected token {token} at position {self.pos}")
+            raise self.syntax_error(f"Unexpected token {token} at position {self.pos}")
+        # Source line of the statement, carried through IR and target code
+        # into the program's source map.
+        statement["line"] = token[2]
+        return statement
+
+    def parse_import(self):
+        self.match("KEYWORD")  # "استورد"
+        module = self.match("IDENTIFIER")
+        if MODULE_SEPARATOR in module[1]:
+            raise self.syntax_error(f"Expected a module name at position {self.pos - 1}, got {display_name(module[1])}")
+        self.match("TERMINATOR")
+        return {"type": "Import", "module": module[1]}
 
     def parse_variable_decl(self):
         self.match("KEYWORD")  # "عرف"
@@ -56,6 +84,8 @@ class Parser:
     # 1-7-2025
     def parse_assignment_or_function_call(self):
         identifier = self.match("IDENTIFIER")[1]
+        if self.current_token() and self.current_token()[0] == "LBRACKET":
+            return self.parse_index_assignment(identifier)
         if self.current_token() and self.current_token()[0] == "OPERATOR" and self.current_token()[1] == "=":
             # Assignment
             self.match("OPERATOR")  # "="
@@ -69,8 +99,38 @@ class Parser:
             self.match("TERMINATOR")
             return value
         else:
-            raise SyntaxError(f"Expected assignment or function call at position {self.pos}")
+            raise self.syntax_error(f"Expected assignment or function call at position {self.pos}")
     
+    def parse_index_assignment(self, identifier):
+        # س[ي] = ... ؟, or س[ي][ج] = ... ؟ for an element of a nested list
+        target = self.parse_indexes({"type": "Identifier", "name": identifier})
+        token = self.current_token()
+        if not (token and token[0] == "OPERATOR" and token[1] == "="):
+            raise self.syntax_error(f"Expected '=' after list element at position {self.pos}")
+        self.advance()
+        value = self.parse_expression()
+        self.match("TERMINATOR")
+        return {"type": "IndexAssignment", "object": target["object"], "index": target["index"], "value": value}
+
+    def parse_indexes(self, expr):
+        while self.current_token() and self.current_token()[0] == "LBRACKET":
+            self.advance()
+            index = self.parse_expression()
+            self.match("RBRACKET")
+            expr = {"type": "IndexExpression", "object": expr, "index": index}
+        return expr
+
+    def parse_list(self):
+        self.match("LBRACKET")
+        elements = []
+        if self.current_token() and self.current_token()[0] != "RBRACKET":
+            elements.append(self.parse_expression())
+            while self.current_token() and self.current_token()[0] == "COMMA":
+                self.advance()
+                elements.append(self.parse_expression())
+        self.match("RBRACKET")
+        return {"type": "ListLiteral", "elements": elements}
+
     def parse_function_call(self, identifier):
         self.match("LPAREN")
         args = []
@@ -124,10 +184,16 @@ class Parser:
         return left
 
     def parse_factor(self):
+        return self.parse_indexes(self.parse_primary())
+
+    def parse_primary(self):
         token = self.current_token()
+        if token is None:
+            raise self.syntax_error("Unexpected end of input")
         if token[0] == "NUMBER":
             self.advance()
-            return {"type": "Literal", "value": int(token[1])}
+            value = float(token[1]) if "." in token[1] else int(token[1])
+            return {"type": "Literal", "value": value}
         elif token[0] == "STRING":
             self.advance()
             return {"type": "Literal", "value": token[1]}
@@ -142,8 +208,10 @@ class Parser:
             expr = self.parse_expression()
             self.match("RPAREN")
             return expr
+        elif token[0] == "LBRACKET":
+            return self.parse_list()
         else:
-            raise SyntaxError(f"Unexpected token {token} at position {self.pos}")
+            raise self.syntax_error(f"Unexpected token {token} at position {self.pos}")
 
     def parse_if_statement(self):
         self.match("KEYWORD")  # "لو"
@@ -0,0 +1,153 @@
+from collections import Counter
+
+MAIN = "<main>"
+
+
+class Frame:
+    def __init__(self, name):
+        self.name = name
+        self.exclusive = 0.0
+        self.children = 0.0
+        self.instructions = 0
+
+
+class Profiler:
+    """Opt-in hotspot profiler for a VirtualMachine run.
+
+    The VM reports every executed instruction with its duration and the call
+    depth around it. Counts and times are only kept per PC and per call
+    frame while running; per-opcode, per-loop and per-line totals are derived
+    from the per-PC tables when the report is built."""
+
+    def __init__(self, instructions, source_map=None):
+        self.instructions = instructions
+        self.source_map = source_map
+        self.counts = [0] * len(instructions)
+        self.times = [0.0] * len(instructions)
+        self.frames = [Frame(MAIN)]
+        self.functions = {}
+        self.stacks = Counter()
+        self.stack_key = MAIN
+
+    def record(self, pc, elapsed, depth_before, depth_after):
+        self.counts[pc] += 1
+        self.times[pc] += elapsed
+        frame = self.frames[-1]
+        frame.exclusive += elapsed
+        frame.instructions += 1
+        self.stacks[self.stack_key] += 1
+        if depth_after > depth_before:
+            self.enter(self.instructions[pc].split()[1])
+        elif depth_after < depth_before and len(self.frames) > 1:
+            self.exit()
+        elif len(self.frames) > 1 and self.instructions[pc].startswith("TAIL_CALL"):
+            # The callee replaces the running function's frame.
+            self.exit()
+            self.enter(self.instructions[pc].split()[1])
+
+    def function_stats(self, name):
+        if name not in self.functions:
+            self.functions[name] = {"calls": 0, "inclusive": 0.0, "exclusive": 0.0, "instructions": 0}
+        return self.functions[name]
+
+    def enter(self, name):
+        self.function_stats(name)["calls"] += 1
+        self.frames.append(Frame(name))
+        self.stack_key = f"{self.stack_key};{name}"
+
+    def exit(self):
+        frame = self.frames.pop()
+        inclusive = frame.exclusive + frame.children
+        self.frames[-1].children += inclusive
+        stats = self.function_stats(frame.name)
+        stats["exclusive"] += frame.exclusive
+        stats["instructions"] += frame.instructions
+        # Only the outermost activation of a recursive function counts towards
+        # its inclusive time, so recursion is not counted twice.
+        if all(outer.name != frame.name for outer in self.frames):
+            stats["inclusive"] += inclusive
+        self.stack_key = self.stack_key.rsplit(";", 1)[0]
+
+    def line_for(self, pc):
+        return self.source_map.line_for(pc) if self.source_map is not None else None
+
+    def loops(self):
+        """Loops are found from backward jumps: the region from a label to the
+        last jump back to it is that label's loop body."""
+        labels = {}
+        regions = {}
+        for pc, instr in enumerate(self.instructions):
+            parts = instr.split()
+            if parts[0] == "LABEL":
+                labels[parts[1]] = pc
+            elif parts[0].startswith("JUMP") and parts[1] in labels:
+                regions[parts[1]] = (labels[parts[1]], pc)
+        loops = []
+        for label, (start, end) in regions.items():
+            loops.append({
+                "label": label,
+                "start_pc": start,
+                "end_pc": end,
+                "line": self.line_for(start),
+                "iterations": self.counts[end],
+                "count": sum(self.counts[start:end + 1]),
+                "time_ms": sum(self.times[start:end + 1]) * 1000,
+            })
+        return sorted(loops, key=lambda loop: loop["time_ms"], reverse=True)
+
+    def report(self, top=20):
+        opcodes = {}
+        lines = {}
+        for pc, count in enumerate(self.counts):
+            if not count:
+                continue
+            opcode = self.instructions[pc].split()[0]
+            stats = opcodes.setdefault(opcode, {"count": 0, "time_ms": 0.0})
+            stats["count"] += count
+            stats["time_ms"] += self.times[pc] * 1000
+            line = self.line_for(pc)
+            if line is not None:
+                stats = lines.setdefault(line, {"count": 0, "time_ms": 0.0})
+                stats["count"] += count
+                stats["time_ms"] += self.times[pc] * 1000
+
+        hottest = sorted((pc for pc, count in enumerate(self.counts) if count), key=lambda pc: self.times[pc], reverse=True)
+        main = self.frames[0]
+        functions = {
+            name: {
+                "calls": stats["calls"],
+                "instructions": stats["instructions"],
+                "inclusive_ms": stats["inclusive"] * 1000,
+                "exclusive_ms": stats["exclusive"] * 1000,
+            }
+            for name, stats in self.functions.items()
+        }
+        functions[MAIN] = {
+            "calls": 1,
+            "instructions": main.instructions,
+            "inclusive_ms": (main.exclusive + main.children) * 1000,
+            "exclusive_ms": main.exclusive * 1000,
+        }
+        return {
+            "total_instructions": sum(self.counts),
+            "total_time_ms": sum(self.times) * 1000,
+            "instructions": [
+                {
+                    "pc": pc,
+                    "instruction": self.instructions[pc],
+                    "line": self.line_for(pc),
+                    "count": self.counts[pc],
+                    "time_ms": self.times[pc] * 1000,
+                }
+                for pc in hottest[:top]
+            ],
+            "opcodes": opcodes,
+            "loops": self.loops(),
+            "functions": functions,
+            "lines": lines,
+        }
+
+    def collapsed_stacks(self):
+        """Executed instructions per call stack, one "main;f;g count" line per
+        stack, the input format of flamegraph.pl and speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(self.stacks.items()))
@@ -0,0 +1,88 @@
+from inliner import (
+    ASSIGNMENT_LINE, CALL_LINE, DECLARATION_LINE, FUNCTION_LINE, INDEX_STORE_LINE, IR_TOKEN, LABEL, LIST_LINE,
+    NATIVE_LINE, TEMP, top_level_names,
+)
+from native_functions import NATIVE_FUNCTIONS
+
+IR_KEYWORDS = {"if", "not", "goto", "call", "native", "list", "return", "print"}
+
+
+class PurityAnalyzer:
+    """IR pass that marks functions whose result depends only on their
+    arguments, so the VM can cache it: "function f(a) {" becomes
+    "pure function f(a) {".
+
+    A function is pure when its body prints nothing, reads and writes only
+    its parameters and locals (no globals), defines no functions, creates
+    or changes no list (a cached list would be shared between callers) and
+    only calls pure functions and pure natives. Recursion is fine.
+    `known_pure` names pure functions defined outside this code, in
+    imported modules."""
+
+    def __init__(self, code, known_pure=()):
+        self.code = code
+        self.known_pure = set(known_pure)
+        self.pure_functions = set()
+
+    def analyze(self):
+        globals_ = top_level_names(self.code)
+        functions = {}  # name -> (index of the "function" line, callees), None if defined twice
+        open_functions = []  # [name, index, params, locals, names used, callees, impure]
+        for index, line in enumerate(self.code):
+            match = FUNCTION_LINE.match(line)
+            if match:
+                if open_functions:
+                    open_functions[-1][6] = True  # Defines a function when called
+                params = {param.strip() for param in match.group(2).split(",") if param.strip()}
+                open_functions.append([match.group(1), index, params, set(), set(), set(), False])
+                continue
+            if not open_functions:
+                continue
+            function = open_functions[-1]
+            if line == "}":
+                name, start, params, local_names, used, callees, impure = open_functions.pop()
+                # Everything read must be a parameter or a local the body assigns.
+                impure = impure or bool(used - params - local_names)
+                functions[name] = None if name in functions else (start, callees, impure)
+                continue
+            if line.startswith("print ") or LIST_LINE.match(line) or INDEX_STORE_LINE.match(line):
+                function[6] = True
+            call = CALL_LINE.match(line)
+            if call:
+                function[5].add(call.group(2))
+                line = f"{call.group(1)} = {call.group(3)}"
+            native = NATIVE_LINE.match(line)
+            if native:
+                if not NATIVE_FUNCTIONS[native.group(2)].pure:
+                    function[6] = True
+                line = f"{native.group(1)} = {native.group(3)}"
+            assignment = ASSIGNMENT_LINE.match(line)
+            if assignment:
+                name = assignment.group(1)
+                # Declaring a global's name makes a local, unless the body
+                # read the global first.
+                declared = DECLARATION_LINE.match(line) and name not in function[4]
+                if name in globals_ and not declared:
+                    function[6] = True
+                function[3].add(name)
+            for token in IR_TOKEN.findall(line):
+                if token.startswith('"') or token.isdigit() or token in IR_KEYWORDS:
+                    continue
+                if TEMP.match(token) or LABEL.match(token):
+                    continue
+                function[4].add(token)
+
+        # Assume every candidate is pure, then drop the ones calling an
+        # impure or unknown function until nothing changes.
+        pure = {name for name, function in functions.items() if function is not None and not function[2]}
+        changed = True
+        while changed:
+            changed = False
+            for name in list(pure):
+                if any(callee not in pure and callee not in self.known_pure for callee in functions[name][1]):
+                    pure.discard(name)
+                    changed = True
+        self.pure_functions = pure
+        starts = {functions[name][0] for name in pure}
+        self.code = [f"pure {line}" if index in starts else line for index, line in enumerate(self.code)]
+        return self.code
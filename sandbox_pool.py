@@ -0,0 +1,219 @@
+import math
+import multiprocessing
+import queue
+import resource
+import signal
+import threading
+import time
+
+from grader import GradedOutput
+from native_functions import load_native_modules
+from threaded_virtual_machine import ThreadedVirtualMachine  # noqa: F401 - warm in the fork server
+from virtual_machine import VirtualMachine  # noqa: F401
+
+# Instructions a sandboxed run executes between checks of its deadline.
+QUANTUM = 1000
+
+
+class SandboxResult:
+    """What a sandboxed run sends back: the parts of the VM /run reports."""
+
+    def __init__(self, output, instructions_executed, finished, state=None, timed_out=False):
+        self.output = output
+        self.instructions_executed = instructions_executed
+        self.is_finished = finished
+        self.state = state  # VM snapshot of an unfinished run
+        self.timed_out = timed_out
+        self.memo = None
+
+    def finished(self):
+        return self.is_finished
+
+    def snapshot(self):
+        return self.state
+
+
+def execute(job):
+    """Run one job in a sandbox process, returning a SandboxResult or the
+    exception the program raised."""
+    expected = job.get("expected_output")
+    vm = job["engine"](
+        job["target_code"], source_map=job["source_map"], memo_size=job["memo_size"],
+        output=None if expected is None else GradedOutput(expected), max_string_bytes=job["max_string_bytes"],
+    )
+    if job["state"] is not None:
+        vm.restore(job["state"])
+    deadline = time.monotonic() + job["timeout"]
+    budget = job["max_instructions"]
+    executed = 0
+    timed_out = False
+    try:
+        while not vm.finished():
+            if budget is not None and executed >= budget:
+                break
+            if time.monotonic() > deadline:
+                timed_out = True
+                break
+            before = vm.instructions_executed
+            vm.step(QUANTUM if budget is None else min(QUANTUM, budget - executed))
+            executed += vm.instructions_executed - before
+    except MemoryError as e:
+        if e.args:  # A limit the VM enforces, such as the string limit
+            e.instructions_executed = vm.instructions_executed
+            return e
+        return MemoryError("Memory limit exceeded.")
+    except Exception as e:
+        e.instructions_executed = vm.instructions_executed
+        return e
+    finished = vm.finished()
+    return SandboxResult(list(vm.output), vm.instructions_executed, finished, None if finished else vm.snapshot(), timed_out)
+
+
+def serve(connection, cpu_seconds, memory_bytes, native_modules):
+    """Main loop of a sandbox process: register the deployment's natives,
+    apply the limits, then run the jobs that arrive on `connection` until
+    told to stop."""
+    # Already imported in the fork server; this raises if they failed there.
+    load_native_modules(native_modules)
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    connection.send(True)  # Ready
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        if cpu_seconds:
+            # RLIMIT_CPU counts the process's whole life, so each run gets
+            # its budget on top of what the earlier runs used. Going over it
+            # kills the process with SIGXCPU.
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            limit = math.ceil(usage.ru_utime + usage.ru_stime) + cpu_seconds
+            if cpu_hard != resource.RLIM_INFINITY:
+                limit = min(limit, cpu_hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (limit, cpu_hard))
+        result = execute(job)
+        try:
+            connection.send(result)
+        except MemoryError:
+            connection.send(MemoryError("Memory limit exceeded."))
+        if isinstance(result, MemoryError):
+            return  # The heap may be fragmented; start over in a fresh process
+
+
+class SandboxWorker:
+    def __init__(self, context, cpu_seconds, memory_bytes, native_modules):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=serve, args=(child_connection, cpu_seconds, memory_bytes, native_modules), daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        self.connection.recv()  # Only hand out sandboxes that are ready
+        self.runs = 0
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.connection.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class SandboxPool:
+    """A pool of warm processes that run programs outside the web worker.
+
+    The processes are forked from a fork server that has already imported
+    the compiler and VMs, so they start in milliseconds. Each one runs under
+    OS limits on CPU seconds per run and on address space, so a runaway
+    program kills its sandbox, not the web worker. A sandbox is replaced
+    after `max_runs` runs, or as soon as it dies. `native_modules` names
+    the modules registering a deployment's natives, as for
+    load_native_modules."""
+
+    def __init__(self, size=4, max_runs=100, cpu_seconds=10, memory_bytes=512 * 1024 * 1024, native_modules=""):
+        self.size = size
+        self.max_runs = max_runs
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.native_modules = native_modules
+        self.context = multiprocessing.get_context("forkserver")
+        modules = [module.strip() for module in native_modules.split(",") if module.strip()]
+        self.context.set_forkserver_preload([__name__] + modules)
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        """Fork the sandboxes. Safe to call more than once; like the
+        scheduler's thread, the pool belongs to the process that starts it."""
+        with self.lock:
+            if self.started:
+                return
+            workers = []
+            try:
+                for _ in range(self.size):
+                    workers.append(self.new_worker())
+            except BaseException:
+                # Leave the pool unstarted, so the next run tries again.
+                for worker in workers:
+                    worker.stop()
+                raise
+            for worker in workers:
+                self.idle.put(worker)
+            self.started = True
+
+    def new_worker(self):
+        return SandboxWorker(self.context, self.cpu_seconds, self.memory_bytes, self.native_modules)
+
+    def replace(self, worker):
+        worker.stop()
+        try:
+            self.idle.put(self.new_worker())
+        except (EOFError, OSError):
+            pass  # The fork server is gone: the process is shutting down
+
+    def run(self, job, timeout):
+        """Run `job` in a sandbox and return its SandboxResult, raising the
+        program's error. The job's own deadline is `timeout`; a sandbox
+        that does not answer shortly after it is killed."""
+        self.start()
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError("No sandbox is available to run the program.") from None
+        worker.runs += 1
+        reusable = False
+        try:
+            worker.connection.send(dict(job, timeout=timeout))
+            if not worker.connection.poll(timeout + 5):
+                worker.process.kill()
+                raise TimeoutError(f"Execution did not finish within {timeout} seconds.")
+            result = worker.connection.recv()
+            # After running out of memory the sandbox exits by itself.
+            reusable = not isinstance(result, MemoryError) and worker.runs < self.max_runs
+        except (EOFError, OSError):
+            worker.process.join()
+            raise RuntimeError(self.death_message(worker.process.exitcode)) from None
+        finally:
+            if reusable:
+                self.idle.put(worker)
+            else:
+                # Replacing takes a few milliseconds: do it off the request.
+                threading.Thread(target=self.replace, args=(worker,), daemon=True).start()
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    @staticmethod
+    def death_message(exitcode):
+        if exitcode == -signal.SIGXCPU:
+            return "Execution was stopped: CPU time limit exceeded."
+        return f"Execution was stopped: the sandbox exited unexpectedly (code {exitcode})."
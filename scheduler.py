@@ -0,0 +1,119 @@
+import heapq
+import itertools
+import threading
+
+
+class Task:
+    def __init__(self, vm, priority, max_instructions=None):
+        self.vm = vm
+        self.priority = priority
+        # The task stops, unfinished, once it has run this many instructions.
+        self.max_instructions = max_instructions
+        self.executed = 0
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the program finishes or uses up its instruction
+        budget, and return its output. If it is still running after timeout
+        seconds it is cancelled and TimeoutError is raised; the VM is left
+        between two instructions, so its state can still be saved."""
+        if not self.done.wait(timeout):
+            self.cancelled = True
+            self.done.wait()  # At most the rest of the running quantum
+            raise TimeoutError(f"Execution did not finish within {timeout} seconds.")
+        if self.error is not None:
+            raise self.error
+        return self.vm.output
+
+
+class Scheduler:
+    """Holds many suspended VM instances and runs each one for a fixed
+    instruction quantum at a time, so a long program cannot hold up the short
+    ones queued behind it.
+
+    With the "round_robin" policy every task gets a turn in submission order.
+    With "priority" the lowest priority number always runs first, and tasks
+    with equal priority share turns round-robin."""
+
+    POLICIES = ("round_robin", "priority")
+
+    def __init__(self, quantum=1000, policy="round_robin"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.quantum = quantum
+        self.policy = policy
+        self.ready = []  # Heap of (priority, sequence, task)
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def submit(self, vm, priority=0, max_instructions=None):
+        # Checked before it reaches the heap: a priority that cannot be
+        # compared with the others would break every later pop.
+        if type(priority) is not int:
+            raise ValueError(f"Priority must be an integer, got {priority!r}.")
+        task = Task(vm, priority if self.policy == "priority" else 0, max_instructions)
+        with self.condition:
+            self.enqueue(task)
+            self.condition.notify()
+        return task
+
+    def enqueue(self, task):
+        heapq.heappush(self.ready, (task.priority, next(self.sequence), task))
+
+    def run_once(self):
+        """Give the next ready task one quantum. Returns False when idle."""
+        with self.condition:
+            if not self.ready:
+                return False
+            _, _, task = heapq.heappop(self.ready)
+        try:
+            self.run_quantum(task)
+        except Exception as e:
+            # A task that fails outside its VM stops, not the scheduler.
+            task.error = e
+            task.done.set()
+        return True
+
+    def run_quantum(self, task):
+        if task.cancelled:
+            task.done.set()
+            return
+        quantum = self.quantum
+        if task.max_instructions is not None:
+            quantum = min(quantum, task.max_instructions - task.executed)
+        executed_before = task.vm.instructions_executed
+        try:
+            finished = task.vm.step(quantum)
+        except Exception as e:
+            task.error = e
+            finished = True
+        task.executed += task.vm.instructions_executed - executed_before
+        if finished or task.executed == task.max_instructions:
+            task.done.set()
+        else:
+            with self.condition:
+                self.enqueue(task)
+
+    def run_until_idle(self):
+        while self.run_once():
+            pass
+
+    def start(self):
+        """Run tasks on a background thread. Safe to call more than once; the
+        thread is started lazily so it belongs to the process that uses it
+        (gunicorn forks workers after importing the app)."""
+        with self.condition:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.serve, name="fekra-scheduler", daemon=True)
+            self.thread.start()
+
+    def serve(self):
+        while True:
+            with self.condition:
+                while not self.ready:
+                    self.condition.wait()
+            self.run_once()
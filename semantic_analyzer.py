@@ -1,3 +1,100 @@
+from lexer import MODULE_SEPARATOR, display_name
+from native_functions import NATIVE_FUNCTIONS
+
+NUMERIC_TYPES = {"int", "float", "bool"}
+INT_TYPES = {"int", "bool"}  # Comparisons leave 1/0 on the stack, so bools are ints at runtime
+ORDERING_OPS = {"<", ">", "<=", ">="}
+EQUALITY_OPS = {"==", "!=", "===", "!=="}
+
+
+def literal_type(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "string"
+    return "any"
+
+
+def join_types(first, second):
+    """Smallest type that can hold values of both types."""
+    if first is None:
+        return second
+    if first == second:
+        return first
+    if first in INT_TYPES and second in INT_TYPES:
+        return "int"
+    if first in NUMERIC_TYPES and second in NUMERIC_TYPES:
+        return "float"
+    return "any"
+
+
+def binary_result_type(operator, left, right):
+    """Infer the result type of a binary operator, raising ValueError on a type error."""
+    if operator in ("&&", "||") or operator in EQUALITY_OPS:
+        return "bool"
+    if left == "any" or right == "any":
+        return "bool" if operator in ORDERING_OPS else "any"
+    numeric = left in NUMERIC_TYPES and right in NUMERIC_TYPES
+    if operator in ORDERING_OPS:
+        if numeric or left == right == "string":
+            return "bool"
+        raise ValueError(f"Type error: cannot compare {left} with {right} using '{operator}'.")
+    if operator == "/" and numeric:
+        return "float"
+    if operator in ("+", "-", "*") and numeric:
+        return "float" if "float" in (left, right) else "int"
+    if operator == "+" and left == right == "string":
+        return "string"
+    if operator == "*" and {left, right} == {"string", "int"}:
+        return "string"
+    if operator == "+" and left == right == "list":
+        return "list"
+    raise ValueError(f"Type error: unsupported operand types for '{operator}': {left} and {right}.")
+
+
+def check_assignable(name):
+    """Raise ValueError if `name` is a module's variable: importers can
+    read those, but not assign or redeclare them."""
+    if MODULE_SEPARATOR in name:
+        raise ValueError(f"Cannot assign to '{display_name(name)}': variables of imported modules are read-only.")
+
+
+def declared_functions(statements):
+    """Names of the functions declared anywhere in these statements."""
+    names = set()
+    for statement in statements:
+        if statement["type"] == "FunctionDeclaration":
+            names.add(statement["name"])
+            names |= declared_functions(statement["body"])
+        elif statement["type"] == "IfStatement":
+            names |= declared_functions(statement["consequent"])
+        elif statement["type"] == "WhileStatement":
+            names |= declared_functions(statement["body"])
+    return names
+
+
+def index_result_type(object_type, index_type):
+    """Type of object[index], raising ValueError on a type error. Lists hold
+    values of any type."""
+    if index_type != "any" and index_type not in INT_TYPES:
+        raise ValueError(f"Type error: an index must be an int, got {index_type}.")
+    if object_type == "string":
+        return "string"
+    if object_type in ("list", "any"):
+        return "any"
+    raise ValueError(f"Type error: cannot index a value of type {object_type}.")
+
+
+def element_assignment_type(object_type, index_type):
+    if object_type == "string":
+        raise ValueError("Type error: strings cannot be changed; build a new one instead.")
+    return index_result_type(object_type, index_type)
+
+
 class SymbolTable:
     def __init__(self):
         self.stack = [{}]  # Stack to track scopes
@@ -11,34 +108,112 @@ class SymbolTable:
     def declare(self, name, value_type):
         current_scope = self.stack[-1]
         if name in current_scope:
-            raise ValueError(f"Variable '{name}' already declared in this scope.")
+            raise ValueError(f"Variable '{display_name(name)}' already declared in this scope.")
         current_scope[name] = value_type
 
     def lookup(self, name):
         for scope in reversed(self.stack):
             if name in scope:
                 return scope[name]
-        raise ValueError(f"Variable '{name}' not declared.")
+        raise ValueError(f"Variable '{display_name(name)}' not declared.")
+
+    def update(self, name, value_type):
+        for scope in reversed(self.stack):
+            if name in scope:
+                scope[name] = value_type
+                return
+        raise ValueError(f"Variable '{display_name(name)}' not declared.")
 
 class SemanticAnalyzer:
-    def __init__(self, ast):
+    def __init__(self, ast, globals=None, collect_errors=False, functions=(), modules=None):
         self.ast = ast
-        self.symbol_table = SymbolTable()
+        # Variables already in scope before the program starts, {name: type}
+        # (earlier statements of a document that is checked piece by piece).
+        self.globals = globals or {}
+        # User functions, declared here or elsewhere in the document; calls
+        # to any other name in NATIVE_FUNCTIONS are native calls.
+        self.functions = set(functions) | declared_functions(ast.get("body", []))
+        # The ModuleLibrary imports are loaded from, and the modules this
+        # program imports, by name.
+        self.modules = modules
+        self.imports = {}
+        # Types a variable is widened to by later assignments, keyed by name.
+        self.widened = {}
+        self.symbol_table = self.new_symbol_table()
+        self.strict = True
+        # With collect_errors, a statement with an error is recorded in
+        # self.errors and skipped instead of aborting the analysis.
+        self.errors = [] if collect_errors else None
 
     def analyze(self):
-        self.visit(self.ast)
+        # Re-run until no assignment widens a variable, so every use of a
+        # variable is typed with all of the values it can hold. Type errors
+        # only count once the types are final.
+        self.strict = False
+        while True:
+            self.start_pass()
+            self.changed = False
+            self.deferred_errors = 0
+            self.visit(self.ast)
+            if not self.changed:
+                break
+        if self.deferred_errors:
+            self.strict = True
+            self.start_pass()
+            self.visit(self.ast)
+
+    def new_symbol_table(self):
+        symbol_table = SymbolTable()
+        for name, value_type in self.globals.items():
+            symbol_table.declare(name, join_types(self.widened.get(name), value_type))
+        return symbol_table
+
+    def start_pass(self):
+        self.symbol_table = self.new_symbol_table()
+        if self.errors is not None:
+            self.errors = []  # Only the errors of the final pass count
+
+    def declare(self, name, value_type):
+        value_type = join_types(self.widened.get(name), value_type)
+        self.symbol_table.declare(name, value_type)
+        return value_type
+
+    def widen(self, name, value_type):
+        declared = self.symbol_table.lookup(name)
+        widened = join_types(declared, value_type)
+        if widened != declared:
+            # Later uses in this pass see the wider type right away; only
+            # uses before this assignment need another pass.
+            self.symbol_table.update(name, widened)
+            self.widened[name] = join_types(self.widened.get(name), widened)
+            self.changed = True
 
     def visit(self, node):
+        if self.errors is None or "line" not in node:
+            return self.visit_node(node)
+        depth = len(self.symbol_table.stack)
+        try:
+            return self.visit_node(node)
+        except ValueError as e:
+            self.errors.append({"line": node["line"], "message": str(e)})
+            del self.symbol_table.stack[depth:]  # Drop scopes the statement left open
+
+    def visit_node(self, node):
         node_type = node["type"]
         if node_type == "Program":
             for statement in node["body"]:
                 self.visit(statement)
         elif node_type == "VariableDecl":
-            self.symbol_table.declare(node["id"], "any") 
-            if node["init"]:
-                self.visit(node["init"])
+            init_type = self.visit(node["init"]) if node["init"] else "int"  # Default to 0
+            check_assignable(node["id"])
+            node["value_type"] = self.declare(node["id"], init_type)
+        elif node_type == "Assignment":
+            value_type = self.visit(node["value"])
+            check_assignable(node["id"])
+            self.widen(node["id"], value_type)
         elif node_type == "Identifier":
-            self.symbol_table.lookup(node["name"])
+            node["value_type"] = self.symbol_table.lookup(node["name"])
+            return node["value_type"]
         elif node_type == "IfStatement":
             self.visit(node["test"])
             self.symbol_table.enter_scope()
@@ -51,13 +226,75 @@ class SemanticAnalyzer:
             for stmt in node["body"]:
                 self.visit(stmt)
             self.symbol_table.exit_scope()
+        elif node_type == "FunctionDeclaration":
+            self.symbol_table.enter_scope()
+            for param in node["params"]:
+                self.symbol_table.declare(param, "any")
+            for stmt in node["body"]:
+                self.visit(stmt)
+            self.symbol_table.exit_scope()
+        elif node_type == "Import":
+            module = self.import_module(node["module"])
+            scope = self.symbol_table.stack[-1]
+            for name, value_type in module.exports.items():
+                if name not in scope:  # Not imported already
+                    self.declare(name, value_type)
+        elif node_type == "FunctionCall":
+            if MODULE_SEPARATOR in node["callee"] and node["callee"] not in self.functions:
+                raise ValueError(f"Function '{display_name(node['callee'])}' is not defined by an imported module.")
+            arg_types = [self.visit(arg) for arg in node["arguments"]]
+            native = None if node["callee"] in self.functions else NATIVE_FUNCTIONS.get(node["callee"])
+            node["native"] = native is not None
+            node["value_type"] = "any" if native is None else self.native_result_type(native, arg_types)
+            return node["value_type"]
+        elif node_type == "ReturnStatement":
+            if node["value"]:
+                self.visit(node["value"])
         elif node_type == "PrintStatement":
             self.visit(node["expression"])
-        elif node_type == "BinaryExpression":
-            self.visit(node["left"])
-            self.visit(node["right"])
+        elif node_type in ("BinaryExpression", "LogicalExpression"):
+            left = self.visit(node["left"])
+            right = self.visit(node["right"])
+            node["value_type"] = self.checked(binary_result_type, node["operator"], left, right)
+            return node["value_type"]
+        elif node_type == "ListLiteral":
+            for element in node["elements"]:
+                self.visit(element)
+            node["value_type"] = "list"
+            return "list"
+        elif node_type == "IndexExpression":
+            object_type = self.visit(node["object"])
+            node["value_type"] = self.checked(index_result_type, object_type, self.visit(node["index"]))
+            return node["value_type"]
+        elif node_type == "IndexAssignment":
+            object_type = self.visit(node["object"])
+            self.checked(element_assignment_type, object_type, self.visit(node["index"]))
+            self.visit(node["value"])
         elif node_type == "Literal":
-            pass  # Literals are valid as-is
+            node["value_type"] = literal_type(node["value"])
+            return node["value_type"]
         else:
             # raise ValueError(f"Unknown AST node type: {node_type}")
             pass
+
+    def import_module(self, name):
+        if self.modules is None:
+            raise ValueError(f"Cannot import '{name}': no module library is configured.")
+        module = self.imports[name] = self.modules.load(name)
+        self.functions |= module.functions
+        return module
+
+    def native_result_type(self, native, arg_types):
+        native.check_arity(len(arg_types))
+        return self.checked(native.check, arg_types)
+
+    def checked(self, check, *types):
+        """Result type of check(*types). A type error only counts once the
+        types are final; before that the result is "any"."""
+        try:
+            return check(*types)
+        except ValueError:
+            if self.strict:
+                raise
+            self.deferred_errors += 1
+            return "any"
@@ -0,0 +1,65 @@
+import base64
+import hashlib
+import hmac
+import io
+import pickle
+import time
+import zlib
+
+# The only classes a snapshot may contain besides plain data.
+SNAPSHOT_CLASSES = {
+    ("list_value", "ListValue"),
+    ("string_value", "StringValue"),
+    ("array", "array"),
+    ("array", "_array_reconstructor"),
+}
+
+
+def program_id(target_code):
+    """Identity of a compiled program: a snapshot only resumes the program
+    it was taken from."""
+    return hashlib.sha256("\n".join(target_code).encode()).hexdigest()
+
+
+class SnapshotUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) not in SNAPSHOT_CLASSES:
+            raise pickle.UnpicklingError(f"Unexpected class in snapshot: {module}.{name}")
+        return super().find_class(module, name)
+
+
+class SnapshotCodec:
+    """Turns VM state into a compact resume token and back.
+
+    A token is the compressed, pickled state, signed with HMAC-SHA256 so a
+    client can carry it between requests but not forge or alter it. Any
+    worker holding the same secret can resume it until it expires."""
+
+    def __init__(self, secret, ttl=3600):
+        self.secret = secret
+        self.ttl = ttl  # Seconds a token stays valid
+
+    def sign(self, payload):
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()
+
+    def dump(self, vm, program):
+        state = {"program": program, "created": time.time(), "vm": vm.snapshot()}
+        payload = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+        return base64.urlsafe_b64encode(self.sign(payload) + payload).decode()
+
+    def load(self, token, program):
+        """The VM state in `token`, raising ValueError unless it is a valid,
+        unexpired token taken from `program`."""
+        try:
+            data = base64.urlsafe_b64decode(token.encode())
+        except (ValueError, AttributeError):
+            raise ValueError("Invalid resume token.") from None
+        signature, payload = data[:32], data[32:]
+        if not hmac.compare_digest(signature, self.sign(payload)):
+            raise ValueError("Invalid resume token.")
+        state = SnapshotUnpickler(io.BytesIO(zlib.decompress(payload))).load()
+        if state["program"] != program:
+            raise ValueError("The resume token belongs to a different program.")
+        if time.time() - state["created"] > self.ttl:
+            raise ValueError("The resume token has expired.")
+        return state["vm"]
@@ -0,0 +1,38 @@
+import bisect
+
+
+class SourceMap:
+    """Maps a program counter back to the Fekra source line it came from.
+
+    Consecutive instructions from the same line are stored as one run, so the
+    table is two short parallel lists: starts[i] is the first PC of a run and
+    lines[i] its source line (None for compiler-generated code)."""
+
+    def __init__(self, starts, lines):
+        self.starts = starts
+        self.lines = lines
+
+    @classmethod
+    def from_lines(cls, pc_lines):
+        """Build the table from one source line per instruction."""
+        starts = []
+        lines = []
+        for pc, line in enumerate(pc_lines):
+            if not lines or lines[-1] != line:
+                starts.append(pc)
+                lines.append(line)
+        return cls(starts, lines)
+
+    def line_for(self, pc):
+        index = bisect.bisect_right(self.starts, pc) - 1
+        return self.lines[index] if index >= 0 else None
+
+    def to_json(self):
+        return [[start, line] for start, line in zip(self.starts, self.lines)]
+
+    def shifted(self, offset):
+        """The map of the same code placed after `offset` instructions that
+        have no source line (the code of linked modules)."""
+        if not offset:
+            return self
+        return SourceMap([0] + [start + offset for start in self.starts], [None] + self.lines)
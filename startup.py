@@ -0,0 +1,104 @@
+"""Startup work of a server process, for gunicorn.conf.py: warming up the
+pipeline before a process takes traffic, and reporting what starting it
+cost in time and memory."""
+import contextlib
+import io
+import resource
+
+from fused_compiler import FusedCompiler
+from inliner import FunctionInliner
+from intermediate_code_generator import IntermediateCodeGenerator
+from lexer import lexer
+from parser import Parser
+from purity_analyzer import PurityAnalyzer
+from semantic_analyzer import SemanticAnalyzer
+from target_code_generator import TargetCodeGenerator
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+# Touches every compiler stage and most instructions: recursion (memoized),
+# loops, strings, lists and natives.
+SELF_TEST_PROGRAM = """\
+دالة فيب (ن) {
+    لو (ن < 2) {
+        اعد (ن) ؟
+    }
+    اعد (فيب(ن - 1) + فيب(ن - 2)) ؟
+}
+عرف ع = 0 ؟
+عرف نص_ = "" ؟
+عرف ق = [3, 1, 2] ؟
+بينما (ع < 3) {
+    نص_ = نص_ + "ا" ؟
+    ق[ع] = ق[ع] * 2 ؟
+    ع = ع + 1 ؟
+}
+عرض (فيب(15)) ؟
+عرض (نص_) ؟
+عرض (رتب(ق)) ؟
+عرض (مجموع(ق) / 4) ؟
+"""
+SELF_TEST_OUTPUT = [610, "ااا", [2, 4, 6], 3.0]
+
+
+def check_output(where, output):
+    if output != SELF_TEST_OUTPUT:
+        raise RuntimeError(f"Self-test failed ({where}): expected {SELF_TEST_OUTPUT!r}, got {output!r}")
+
+
+def warm_up(app):
+    """Compile and run the self-test program on both engines, and send the
+    app a /check request, without starting any thread or process. Safe in
+    the gunicorn master before it forks: what this builds lazily (Flask's
+    URL matcher, specialized bytecode) is then shared by every worker."""
+    # The code generators trace to stdout.
+    with contextlib.redirect_stdout(io.StringIO()):
+        tokens = lexer(SELF_TEST_PROGRAM)
+        ast = Parser(tokens).parse_program()
+        SemanticAnalyzer(ast).analyze()
+        icg = IntermediateCodeGenerator(ast)
+        ir_code = icg.generate()
+        fused = FusedCompiler(tokens)
+        if not fused.compile() or (fused.code, fused.types) != (ir_code, icg.types):
+            raise RuntimeError("Self-test failed (fused front end): its IR differs from the full pipeline's")
+        ir_code = FunctionInliner(ir_code, icg.types).optimize()
+        target_code = TargetCodeGenerator(PurityAnalyzer(ir_code).analyze(), icg.types).generate()
+    check_output("interpreter", VirtualMachine(target_code, debug=False).run())
+    check_output("threaded", ThreadedVirtualMachine(target_code).run())
+    response = app.test_client().post("/check", json={"code": SELF_TEST_PROGRAM})
+    if response.status_code != 200 or response.json["diagnostics"]:
+        raise RuntimeError(f"Self-test failed (/check): {response.status_code} {response.json}")
+
+
+def self_test(app):
+    """Run the self-test program through /run, the way a request does, so a
+    worker only takes traffic once it can serve it. This starts the
+    worker's scheduler thread (and sandbox pool, if enabled)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = app.test_client().post("/run", json={"code": SELF_TEST_PROGRAM, "engine": "threaded"})
+    if response.status_code != 200:
+        raise RuntimeError(f"Self-test failed (/run): {response.status_code} {response.json}")
+    check_output("/run", response.json["output"])
+
+
+def memory_usage():
+    """(rss, private) of this process in kB. Private is what it does not
+    share with any other process, such as the master it was forked from;
+    None where /proc/self/smaps_rollup is missing (RSS is then the peak)."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            sizes = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    sizes[parts[0].rstrip(":")] = int(parts[1])
+        return sizes["Rss"], sizes["Private_Clean"] + sizes["Private_Dirty"]
+    except (OSError, KeyError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, None
+
+
+def describe_memory():
+    rss, private = memory_usage()
+    if private is None:
+        return f"RSS {rss / 1024:.1f} MB"
+    return f"RSS {rss / 1024:.1f} MB, {private / 1024:.1f} MB private"
@@ -0,0 +1,190 @@
+# Concatenations shorter than this stay plain str: copying them costs less
+# than keeping a builder.
+MIN_BUILDER_LENGTH = 256
+# Short pieces are merged up to this length, so a string built one
+# character at a time is not a list of one-character strings.
+CHUNK_LENGTH = 1024
+# Accounted bytes per piece besides its characters: the list slot and the
+# str header.
+PIECE_OVERHEAD = 64
+
+
+def char_width(text):
+    """Bytes per character CPython stores `text` with."""
+    if text.isascii():
+        return 1
+    widest = ord(max(text))
+    return 1 if widest < 0x100 else 2 if widest < 0x10000 else 4
+
+
+def check_limit(length, width, count, limit):
+    """Raise MemoryError if a string of `length` characters `width` bytes
+    wide, in `count` pieces, would be accounted more than `limit` bytes."""
+    if limit is not None and length * width + count * PIECE_OVERHEAD > limit:
+        raise MemoryError(f"String too long: {length} characters is over the limit of {limit // 1024} KB.")
+
+
+class StringBuffer:
+    """Pieces shared by strings built from one another by appending. Each
+    of those strings is a prefix of the buffer."""
+
+    __slots__ = ("pieces", "length", "width")
+
+    def __init__(self, pieces, length, width):
+        self.pieces = pieces
+        self.length = length  # Characters in all pieces
+        self.width = width  # Widest char_width of any piece
+
+
+class StringValue:
+    """A Fekra string built by concatenation: the first `count` pieces of a
+    buffer, joined into one str only when the text is needed (to print,
+    compare, index or pass it to a native). Appending to the newest string
+    of a buffer extends the buffer in place, so building a string in a loop
+    costs amortized O(1) per append instead of a copy of the whole string.
+    Like str, a StringValue never changes."""
+
+    __slots__ = ("buffer", "count", "length")
+
+    def __init__(self, text=""):
+        self.buffer = StringBuffer([text], len(text), char_width(text))
+        self.count = 1
+        self.length = len(text)
+
+    def __reduce__(self):
+        return (StringValue, (self.flatten(),))  # Snapshots hold the text
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return self.flatten()
+
+    def __repr__(self):
+        return repr(self.flatten())
+
+    def __hash__(self):
+        return hash(self.flatten())
+
+    def __eq__(self, other):
+        if type(other) in STRING_TYPES:
+            return self.length == len(other) and self.flatten() == text_of(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    # Anything else works on the text, with str's results and errors.
+    def __lt__(self, other):
+        return self.flatten() < text_of(other)
+
+    def __le__(self, other):
+        return self.flatten() <= text_of(other)
+
+    def __gt__(self, other):
+        return self.flatten() > text_of(other)
+
+    def __ge__(self, other):
+        return self.flatten() >= text_of(other)
+
+    def __mul__(self, other):
+        return self.flatten() * other
+
+    def __rmul__(self, other):
+        return other * self.flatten()
+
+    def __sub__(self, other):
+        return self.flatten() - other
+
+    def __rsub__(self, other):
+        return other - self.flatten()
+
+    def __truediv__(self, other):
+        return self.flatten() / other
+
+    def __rtruediv__(self, other):
+        return other / self.flatten()
+
+    def flatten(self):
+        """The text as one str. It becomes this string's only piece, so the
+        next call is free and an append continues from it."""
+        buffer = self.buffer
+        if self.count == 1 and len(buffer.pieces[0]) == self.length:
+            return buffer.pieces[0]
+        text = "".join(buffer.pieces[:self.count])
+        if len(text) > self.length:
+            text = text[:self.length]  # A newer string extended the last piece
+        self.buffer = StringBuffer([text], self.length, buffer.width)
+        self.count = 1
+        return text
+
+    def appended(self, piece, limit=None):
+        """This string followed by the str `piece`, raising MemoryError if it
+        would be accounted more than `limit` bytes."""
+        if not piece:
+            return self
+        if self.length != self.buffer.length:
+            # An older string of its buffer: a newer one already appended
+            # to it, so continue from a copy of the text instead.
+            self.flatten()
+        buffer = self.buffer
+        pieces = buffer.pieces
+        merge = len(pieces[-1]) < CHUNK_LENGTH and len(piece) < CHUNK_LENGTH
+        length = self.length + len(piece)
+        width = max(buffer.width, char_width(piece))
+        count = len(pieces) if merge else len(pieces) + 1
+        check_limit(length, width, count, limit)
+        if merge:
+            pieces[-1] += piece
+        else:
+            pieces.append(piece)
+        buffer.length = length
+        buffer.width = width
+        result = StringValue.__new__(StringValue)
+        result.buffer = buffer
+        result.count = count
+        result.length = length
+        return result
+
+
+STRING_TYPES = (str, StringValue)
+
+
+def text_of(value):
+    """`value` with a StringValue joined into a str; anything else as is."""
+    return value.flatten() if type(value) is StringValue else value
+
+
+def concat(a, b, limit=None):
+    """a + b for two strings, each a str or a StringValue. Long results are
+    StringValues; see StringValue.appended() for `limit`."""
+    if type(b) is StringValue:
+        b = b.flatten()
+    if type(a) is str:
+        if len(a) + len(b) < MIN_BUILDER_LENGTH:
+            return a + b
+        a = StringValue(a)
+    return a.appended(b, limit)
+
+
+def add(a, b, limit=None):
+    """a + b for any two values, concatenating strings with concat()."""
+    if type(a) in STRING_TYPES:
+        if type(b) in STRING_TYPES:
+            return concat(a, b, limit)
+        a = text_of(a)
+    elif type(b) is StringValue:
+        b = b.flatten()
+    return a + b
+
+
+def multiply(a, b, limit=None):
+    """a * b for any two values. A repeated string is held to `limit` like
+    concat(), checked before it is built."""
+    if type(a) in STRING_TYPES or type(b) in STRING_TYPES:
+        a, b = text_of(a), text_of(b)
+        text, times = (a, b) if type(a) is str else (b, a)
+        if type(text) is str and type(times) is int and times > 1:
+            check_limit(len(text) * times, char_width(text), 1, limit)
+    return a * b
@@ -1,7 +1,34 @@
+from inliner import INDEX_LOAD_LINE, INDEX_STORE_LINE, LIST_LINE, NATIVE_LINE, split_arguments
+from semantic_analyzer import INT_TYPES
+from source_map import SourceMap
+
+ARITHMETIC_INSTRUCTIONS = {
+    "+": "ADD",
+    "-": "SUB",
+    "*": "MUL",
+    "/": "DIV",
+}
+
+COMPARISON_INSTRUCTIONS = {
+    ">": "COMPARE_GT",
+    "<": "COMPARE_LT",
+    "==": "COMPARE_EQ",
+    "!=": "COMPARE_NE",
+    ">=": "COMPARE_GTE",
+    "<=": "COMPARE_LTE",
+    "&&": "LOGICAL_AND",
+    "||": "LOGICAL_OR",
+}
+
+
 class TargetCodeGenerator:
-    def __init__(self, optimized_code):
+    def __init__(self, optimized_code, types=None, source_lines=None):
         self.optimized_code = optimized_code
+        self.types = types or {}
+        self.source_lines = source_lines  # Source line of each IR line, if known
         self.target_code = []
+        self.target_lines = []
+        self.source_map = None
         self.label_counter = 0
 
     def new_label(self):
@@ -9,18 +36,37 @@ class TargetCodeGenerator:
         return f"L{self.label_counter}"
 
     def generate(self):
-        for line in self.optimized_code:
-            self.translate(line)
+        tail_calls = self.find_tail_calls()
+        for index, line in enumerate(self.optimized_code):
+            if index in tail_calls:
+                self.handle_tail_call(line)
+            elif index - 1 not in tail_calls:  # Else the return was part of the tail call
+                self.translate(line)
+            if self.source_lines is not None:
+                new_instructions = len(self.target_code) - len(self.target_lines)
+                self.target_lines.extend([self.source_lines[index]] * new_instructions)
+        if self.source_lines is not None:
+            self.source_map = SourceMap.from_lines(self.target_lines)
         return self.target_code
 
     def translate(self, line):
         print(f"Translating IR Line: {line}")
-        if "print" in line:
+        if line.startswith("decl "):
+            self.handle_declaration(line)
+        elif "print" in line:
             self.handle_print(line)
         elif line == "}":
             self.handle_function_end(line)
         elif "function" in line:
             self.handle_function_definition(line)
+        elif " = native " in line:
+            self.handle_native_call(line)
+        elif LIST_LINE.match(line):
+            self.handle_list(line)
+        elif INDEX_LOAD_LINE.match(line):
+            self.handle_index_load(line)
+        elif INDEX_STORE_LINE.match(line):
+            self.handle_index_store(line)
         elif "=" in line and "call" in line:
             self.handle_function_call(line)
         elif "return" in line:
@@ -56,7 +102,7 @@ class TargetCodeGenerator:
             self.add_push(value)  # Preserve the quotes for string literals
         elif value.isidentifier():  # Check if it's a valid identifier
             self.add_push(value)
-        elif value.isdigit(): 
+        elif self.is_number_literal(value):
             self.add_push(value)
         else:
             raise ValueError(f"Invalid print value: {value}")
@@ -64,13 +110,21 @@ class TargetCodeGenerator:
         self.target_code.append("PRINT")
 
 
+    def handle_declaration(self, line):
+        target, value = line[len("decl "):].split(" = ", maxsplit=1)
+        self.add_push(value.strip())
+        self.target_code.append(f"STORE_LOCAL {target}")
+
     def handle_comparison(self, target, expr):
         left, op, right = map(str.strip, expr.split())
         self.add_push(left)
         self.add_push(right)
         operator_map = self.get_operator_map()
         if op in operator_map:
-            self.target_code.append(operator_map[op])
+            instruction = operator_map[op]
+            if self.is_int_operand(left) and self.is_int_operand(right):
+                instruction += "_INT"
+            self.target_code.append(instruction)
         else:
             raise ValueError(f"Unknown comparison operator: {op}")
         self.target_code.append(f"STORE {target}")
@@ -81,10 +135,13 @@ class TargetCodeGenerator:
         name, params = definition.split("(", maxsplit=1)
         name = name.strip()
         params = params.split(")", maxsplit=1)[0] 
-        params = [param.strip() for param in params.split(",")]
+        params = [param.strip() for param in params.split(",") if param.strip()]
         
-        # Add a FUNC_DEFINE instruction
-        self.target_code.append(f"FUNC_DEFINE {name}")
+        # Add a FUNC_DEFINE instruction; pure functions may have their results cached
+        if line.startswith("pure "):
+            self.target_code.append(f"FUNC_DEFINE {name} PURE")
+        else:
+            self.target_code.append(f"FUNC_DEFINE {name}")
 
         # Add PARAM instructions for each parameter
         for param in params:
@@ -100,12 +157,68 @@ class TargetCodeGenerator:
         target, call_expr = map(str.strip, line.split("=", maxsplit=1))
         _, call_details = call_expr.split("call", maxsplit=1)
         name, args = call_details.split("(", maxsplit=1)
-        args = args.strip(" )").split(",")
+        args = [arg.strip() for arg in args.strip(" )").split(",") if arg.strip()]
         for arg in args:
-            self.add_push(arg.strip())
+            self.add_push(arg)
         self.target_code.append(f"CALL {name.strip()}")
         self.target_code.append(f"STORE {target}")
 
+    def handle_native_call(self, line):
+        target, name, args = NATIVE_LINE.match(line).groups()
+        args = split_arguments(args)
+        for arg in args:
+            self.add_push(arg)
+        self.target_code.append(f"CALL_NATIVE {name} {len(args)}")
+        self.target_code.append(f"STORE {target}")
+
+    def handle_list(self, line):
+        target, elements = LIST_LINE.match(line).groups()
+        elements = split_arguments(elements)
+        for element in elements:
+            self.add_push(element)
+        self.target_code.append(f"BUILD_LIST {len(elements)}")
+        self.target_code.append(f"STORE {target}")
+
+    def handle_index_load(self, line):
+        target, value, index = INDEX_LOAD_LINE.match(line).groups()
+        self.add_push(value)
+        self.add_push(index)
+        self.target_code.append("INDEX_LOAD")
+        self.target_code.append(f"STORE {target}")
+
+    def handle_index_store(self, line):
+        target, index, value = INDEX_STORE_LINE.match(line).groups()
+        self.add_push(target)
+        self.add_push(index)
+        self.add_push(value)
+        self.target_code.append("INDEX_STORE")
+
+    def find_tail_calls(self):
+        """Indexes of "t = call f(...)" lines inside a function that are
+        followed by "return t": the call's result is the function's result."""
+        tail_calls = set()
+        depth = 0
+        code = self.optimized_code
+        for index, line in enumerate(code):
+            if line.startswith(("function ", "pure function ")):
+                depth += 1
+            elif line == "}":
+                depth -= 1
+            elif depth and " = call " in line and index + 1 < len(code):
+                target = line.split("=", maxsplit=1)[0].strip()
+                if code[index + 1] == f"return {target}":
+                    tail_calls.add(index)
+        return tail_calls
+
+    def handle_tail_call(self, line):
+        _, call_expr = map(str.strip, line.split("=", maxsplit=1))
+        _, call_details = call_expr.split("call", maxsplit=1)
+        name, args = call_details.split("(", maxsplit=1)
+        args = [arg.strip() for arg in args.strip(" )").split(",") if arg.strip()]
+        for arg in args:
+            self.add_push(arg)
+        self.target_code.append(f"TAIL_CALL {name.strip()}")
+
     def handle_return(self, line):
         _, value = line.split("return", maxsplit=1)
         self.add_push(value.strip())
@@ -141,15 +254,15 @@ class TargetCodeGenerator:
         operands = expr.split()
         self.add_push(operands[0])
         self.add_push(operands[2])
-        operator_map = {
-            "+": "ADD",
-            "-": "SUB",
-            "*": "MUL",
-            "/": "DIV",
-        }
+        operator_map = ARITHMETIC_INSTRUCTIONS
         op = operands[1]
         if op in operator_map:
-            self.target_code.append(operator_map[op])
+            instruction = operator_map[op]
+            if op != "/" and self.is_int_operand(operands[0]) and self.is_int_operand(operands[2]):
+                instruction += "_INT"
+            elif op == "+" and self.operand_type(operands[0]) == self.operand_type(operands[2]) == "string":
+                instruction = "CONCAT"
+            self.target_code.append(instruction)
         else:
             raise ValueError(f"Unknown arithmetic operator: {op}")
         self.target_code.append(f"STORE {target}")
@@ -199,28 +312,37 @@ class TargetCodeGenerator:
         """Utility function to add a PUSH operation."""
         value = value.strip()
         if value.isdigit():
+            self.target_code.append(f"PUSH_INT {value}")
+        elif self.is_number_literal(value):
             self.target_code.append(f"PUSH {value}")
         elif value.isidentifier():
             self.target_code.append(f"PUSH {value}")
         elif value.startswith('"') and value.endswith('"'):
             # Handle string literals with surrounding quotes preserved
-            self.target_code.append(f'PUSH {value}')
+            self.target_code.append(f'PUSH_STR {value}')
         else:
             raise ValueError(f"Invalid or undefined value: {value}")
 
+    def is_number_literal(self, value):
+        return value.replace(".", "", 1).lstrip("-").isdigit()
+
+    def operand_type(self, value):
+        """Static type of an IR operand: a literal or a typed name."""
+        if value.lstrip("-").isdigit():
+            return "int"
+        if self.is_number_literal(value):
+            return "float"
+        if value.startswith('"'):
+            return "string"
+        return self.types.get(value, "any")
+
+    def is_int_operand(self, value):
+        return self.operand_type(value) in INT_TYPES
+
 
     def get_operator_map(self):
         """Returns a map of comparison operators to VM instructions."""
-        return {
-            ">": "COMPARE_GT",
-            "<": "COMPARE_LT",
-            "==": "COMPARE_EQ",
-            "!=": "COMPARE_NE",
-            ">=": "COMPARE_GTE",
-            "<=": "COMPARE_LTE",
-            "&&": "LOGICAL_AND",
-            "||": "LOGICAL_OR",
-        }
+        return COMPARISON_INSTRUCTIONS
 
 
 
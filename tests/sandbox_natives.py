@@ -0,0 +1,7 @@
+from native_functions import INT, native
+
+
+# A deployment's own native, loaded by name like FEKRA_NATIVE_MODULES does.
+@native("ضعف_اختبار", 1, result_type="int", param_types=[INT])
+def double(value):
+    return value * 2
@@ -0,0 +1,63 @@
+import pytest
+
+from benchmarks import compile_program
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+ENGINES = {
+    "interpreter": lambda target_code: VirtualMachine(target_code, memo_size=0),
+    "threaded": lambda target_code: ThreadedVirtualMachine(target_code, memo_size=0),
+    "memoized": ThreadedVirtualMachine,
+}
+
+PROGRAMS = {
+    # Every call has its own frame, so recursion keeps the caller's locals.
+    "recursion": (
+        'دالة فيب (ن) {\n    لو (ن < 2) {\n        اعد (ن) ؟\n    }\n'
+        '    عرف أ = فيب(ن - 1) ؟\n    عرف ب = فيب(ن - 2) ؟\n    اعد (أ + ب) ؟\n}\n'
+        'عرض (فيب(10)) ؟\n',
+        [55],
+    ),
+    # Globals are visible in a function, and assigning one writes the global.
+    "global write": (
+        'عرف ع = 1 ؟\nدالة زد (م) {\n    ع = ع + م ؟\n    اعد (ع) ؟\n}\n'
+        'عرض (زد(2)) ؟\nعرض (ع) ؟\n',
+        [3, 3],
+    ),
+    # A parameter belongs to the call, even when a global has its name.
+    "parameter": (
+        'عرف م = 1 ؟\nدالة ف (م) {\n    م = م * 10 ؟\n    اعد (م) ؟\n}\n'
+        'عرض (ف(5)) ؟\nعرض (م) ؟\n',
+        [50, 1],
+    ),
+    # A declaration in a function makes a local, even over a global.
+    "declaration shadows global": (
+        'عرف ي = 100 ؟\nدالة عد (ن) {\n    عرف ي = 0 ؟\n    بينما (ي < ن) {\n        ي = ي + 1 ؟\n    }\n'
+        '    اعد (ي) ؟\n}\nعرض (عد(5)) ؟\nعرض (ي) ؟\n',
+        [5, 100],
+    ),
+    # Reading the global before declaring the local still sees the global,
+    # and the result is not cached as if it depended on the argument only.
+    "global read before declaration": (
+        'عرف ي = 1 ؟\nدالة ف (ن) {\n    عرف س = ي + ن ؟\n    عرف ي = 0 ؟\n    اعد (س + ي) ؟\n}\n'
+        'عرض (ف(1)) ؟\nي = 10 ؟\nعرض (ف(1)) ؟\nعرض (ي) ؟\n',
+        [2, 11, 10],
+    ),
+    # Falling off the end of a function returns 0.
+    "default return": (
+        'عرف ع = 0 ؟\nدالة ف (م) {\n    ع = م ؟\n}\nعرض (ف(4)) ؟\nعرض (ع) ؟\n',
+        [0, 4],
+    ),
+    "no parameters": (
+        'دالة ثابت () {\n    اعد (7) ؟\n}\nعرض (ثابت() + ثابت()) ؟\n',
+        [14],
+    ),
+}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("inline", [False, True])
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_call_semantics(engine, inline, name):
+    code, expected = PROGRAMS[name]
+    assert ENGINES[engine](compile_program(code, inline=inline)).run() == expected
@@ -0,0 +1,34 @@
+import pytest
+
+from benchmarks import compile_program
+from benchmarks.corpus import load_corpus
+from benchmarks.generator import ProgramGenerator
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+PROGRAMS = list(load_corpus(generated_blocks=20).values()) + [ProgramGenerator(seed).generate(30) for seed in range(20)]
+
+
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_engines_count_the_same_instructions(code):
+    target_code = compile_program(code)
+    interpreter = VirtualMachine(target_code)
+    threaded = ThreadedVirtualMachine(target_code)
+    assert interpreter.run() == threaded.run()
+    assert interpreter.instructions_executed == threaded.instructions_executed
+
+
+@pytest.mark.parametrize("code", PROGRAMS[:8])
+def test_engines_stop_at_the_same_instruction(code):
+    target_code = compile_program(code)
+    interpreter = VirtualMachine(target_code)
+    threaded = ThreadedVirtualMachine(target_code)
+    for budget in (1, 7, 50, 333):
+        interpreter.step(budget)
+        threaded.step(budget)
+        assert (interpreter.pc, interpreter.output) == (threaded.pc, threaded.output)
+
+
+def test_interpreter_does_not_trace_by_default(capsys):
+    VirtualMachine(compile_program('عرض (1 + 2) ؟\n')).run()
+    assert capsys.readouterr().out == ""
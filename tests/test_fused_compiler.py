@@ -0,0 +1,58 @@
+import contextlib
+import io
+
+import pytest
+
+from benchmarks.corpus import load_corpus
+from benchmarks.generator import ProgramGenerator
+from fused_compiler import FusedCompiler
+from intermediate_code_generator import IntermediateCodeGenerator
+from lexer import lexer
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from test_calls import PROGRAMS as CALL_PROGRAMS
+from test_incremental_checker import REASSIGNING_PROGRAMS
+
+PROGRAMS = {
+    **load_corpus(generated_blocks=20),
+    **{f"generated {seed}": ProgramGenerator(seed).generate(30) for seed in range(30)},
+    **{f"calls: {name}": code for name, (code, _) in CALL_PROGRAMS.items()},
+    # A use before an assignment widens the variable: a second pass.
+    "widened": 'عرف ع = 0 ؟\nعرض (ع + 1) ؟\nع = 1.5 ؟\n',
+    # A function declared after a call shadows the native of that name.
+    "hoisted": 'عرض (مطلق(2)) ؟\nدالة مطلق (س) {\n    اعد (س * 10) ؟\n}\n',
+    "lists": 'عرف م = [[1, 2], [3]] ؟\nم[0][1] = م[1][0] ؟\nعرض (م) ؟\n',
+}
+ERRORS = [
+    'عرض (س) ؟\n',
+    'عرف ع = 1 ؟\nعرف ع = 2 ؟\n',
+    'عرض ("ا" - 1) ؟\n',
+    'عرض (1 ؟\n',
+    'عرض (طول(1, 2)) ؟\n',
+]
+
+
+def full_pipeline(code):
+    with contextlib.redirect_stdout(io.StringIO()):
+        ast = Parser(lexer(code)).parse_program()
+        SemanticAnalyzer(ast).analyze()
+        icg = IntermediateCodeGenerator(ast)
+        return icg.generate(), icg.types, icg.source_lines
+
+
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_fused_ir_matches_full_pipeline(name):
+    code = PROGRAMS[name]
+    fused = FusedCompiler(lexer(code))
+    assert fused.compile()
+    assert (fused.code, fused.types, fused.source_lines) == full_pipeline(code)
+
+
+@pytest.mark.parametrize("code", REASSIGNING_PROGRAMS + ERRORS)
+def test_fused_compiler_fails_where_the_pipeline_does(code):
+    try:
+        full_pipeline(code)
+    except (SyntaxError, ValueError):
+        assert not FusedCompiler(lexer(code)).compile()
+    else:
+        assert FusedCompiler(lexer(code)).compile()
@@ -0,0 +1,35 @@
+import pytest
+
+from app import app
+from grader import ExpectedOutput
+
+DIVIDES_BY_ZERO = 'عرض (1) ؟\nعرف ع = 0 ؟\nعرض (1 / ع) ؟\n'
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "threaded"])
+def test_runtime_error_has_a_verdict(engine):
+    response = app.test_client().post("/run", json={
+        "code": DIVIDES_BY_ZERO, "engine": engine, "expected_output": ["1", "2"],
+    })
+    assert response.status_code == 200
+    assert response.json["verdict"] == "runtime_error"
+    assert response.json["line"] == 3
+    assert response.json["instructions_executed"] > 0
+
+
+@pytest.mark.parametrize("pattern", [r"(a+)+$", r"(?:x|y*)*", "a" * 300, 5, "("])
+def test_slow_or_invalid_regex_is_rejected(pattern):
+    with pytest.raises(ValueError):
+        ExpectedOutput([{"regex": pattern}])
+
+
+def test_regex_rule_is_matched():
+    expected = ExpectedOutput([{"regex": r"\d+\.\d+"}, {"regex": r"[ا-ي]+ \d*"}])
+    expected.check([3.25, "مرحبا 12"])
+
+
+def test_run_rejects_slow_regex():
+    response = app.test_client().post("/run", json={
+        "code": DIVIDES_BY_ZERO, "expected_output": [{"regex": r"(a+)+$"}],
+    })
+    assert response.status_code == 400
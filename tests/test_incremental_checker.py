@@ -0,0 +1,81 @@
+import re
+
+import pytest
+
+from benchmarks.generator import ProgramGenerator
+from incremental_checker import IncrementalChecker
+from lexer import lexer
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+
+REASSIGNING_PROGRAMS = [
+    'عرف ع = 0 ؟\nع = 1 ؟\nعرض ("x" < ع) ؟\n',
+    'عرف ع = 0 ؟\nع = 1.5 ؟\nعرض ("x" < ع) ؟\n',
+    'عرف ع = 0 ؟\nعرض ("x" < ع) ؟\nع = 2 ؟\n',
+    'عرف س = "ا" ؟\nس = "ب" ؟\nعرض (س < 1) ؟\n',
+    'عرف س = "ا" ؟\nس = 1 ؟\nعرض (س < 1) ؟\n',
+    'عرف ع = 0 ؟\nبينما (ع < 3) {\n    ع = ع + 1 ؟\n}\nعرض (ع - "x") ؟\n',
+    'عرف ق = [1, 2] ؟\nق = [3] ؟\nعرض (ق < 1) ؟\n',
+]
+
+TOP_LEVEL_DECLARATION = re.compile(r"^عرف (\S+) = ", re.MULTILINE)
+
+
+def full_diagnostics(code):
+    analyzer = SemanticAnalyzer(Parser(lexer(code)).parse_program(), collect_errors=True)
+    analyzer.analyze()
+    return sorted((error["line"], error["message"]) for error in analyzer.errors)
+
+
+def check_diagnostics(code):
+    diagnostics, _ = IncrementalChecker().check(code)
+    return sorted((diagnostic["line"], diagnostic["message"]) for diagnostic in diagnostics)
+
+
+@pytest.mark.parametrize("code", REASSIGNING_PROGRAMS)
+def test_reassigned_variables_match_full_analyzer(code):
+    assert check_diagnostics(code) == full_diagnostics(code)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_generated_programs_match_full_analyzer(seed):
+    code = ProgramGenerator(seed).generate(25)
+    # Compare every top-level variable with a string after the program
+    # reassigned it: an error exactly when it is not a string.
+    for name in TOP_LEVEL_DECLARATION.findall(code):
+        code += f'عرض ("x" < {name}) ؟\n'
+    assert check_diagnostics(code) == full_diagnostics(code)
+
+
+def test_edit_keeps_reassigned_type():
+    checker = IncrementalChecker()
+    code = 'عرف ع = 0 ؟\nع = 1 ؟\nعرض (ع) ؟\n'
+    assert checker.check(code)[0] == []
+    diagnostics, _ = checker.check(code.replace("عرض (ع)", 'عرض ("x" < ع)'))
+    assert [diagnostic["line"] for diagnostic in diagnostics] == [3]
+
+
+@pytest.mark.parametrize("code", [
+    'عرف ع = 0 ؟\nعرض (ع) ؟\nعرف س = 1 $ 2 ؟\n',
+    'عرف ع = 0 ؟ عرض (ع) ؟ عرض (ع $ 1) ؟\n',
+])
+def test_lexer_error_is_placed_in_the_document(code):
+    with pytest.raises(RuntimeError) as error:
+        lexer(code)
+    diagnostics, _ = IncrementalChecker().check(code)
+    assert [(d["line"], d["column"], d["message"]) for d in diagnostics] == [
+        (error.value.lineno, error.value.offset, str(error.value)),
+    ]
+
+
+@pytest.mark.parametrize("body", [
+    {"data": "not json", "content_type": "application/json"},
+    {"json": None},
+    {"json": ["code"]},
+    {"json": {"code": 5}},
+    {"json": {"code": "عرض (1) ؟\n", "document_id": ["x"]}},
+])
+def test_check_rejects_malformed_requests(body):
+    from app import app
+
+    assert app.test_client().post("/check", **body).status_code == 400
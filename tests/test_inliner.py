@@ -0,0 +1,61 @@
+import pytest
+
+from benchmarks import compile_program
+from benchmarks.corpus import load_corpus
+from benchmarks.generator import ProgramGenerator
+from virtual_machine import VirtualMachine
+
+CORPUS = load_corpus(generated_blocks=20)
+
+PROGRAMS = {
+    # A small function called in a loop: inlined at the call.
+    "loop": (
+        'دالة مربع (س) {\n    اعد (س * س) ؟\n}\n'
+        'عرف ع = 0 ؟\nعرف مجموع = 0 ؟\nبينما (ع < 10) {\n'
+        '    مجموع = مجموع + مربع(ع) ؟\n    ع = ع + 1 ؟\n}\nعرض (مجموع) ؟\n'
+    ),
+    # The inlined body's locals must not clobber the caller's variables.
+    "same names": (
+        'دالة ف (س) {\n    عرف ص = س + 1 ؟\n    اعد (ص * 2) ؟\n}\n'
+        'عرف ص = 100 ؟\nعرف س = 7 ؟\nعرض (ف(س)) ؟\nعرض (ص) ؟\nعرض (س) ؟\n'
+    ),
+    "nested calls": (
+        'دالة زد (س) {\n    اعد (س + 1) ؟\n}\nدالة ضعف (س) {\n    اعد (زد(س) * 2) ؟\n}\n'
+        'عرض (ضعف(زد(3))) ؟\n'
+    ),
+    # A function writing a global is inlined without making it a local.
+    "global write": (
+        'عرف عداد = 0 ؟\nدالة عد () {\n    عداد = عداد + 1 ؟\n    اعد (عداد) ؟\n}\n'
+        'عرض (عد() + عد()) ؟\nعرض (عداد) ؟\n'
+    ),
+}
+
+
+def outputs(code):
+    return [VirtualMachine(compile_program(code, inline=inline), memo_size=0).run() for inline in (False, True)]
+
+
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_inlined_output_matches(name):
+    plain, inlined = outputs(PROGRAMS[name])
+    assert inlined == plain
+
+
+@pytest.mark.parametrize("name", CORPUS)
+def test_corpus_output_matches(name):
+    plain, inlined = outputs(CORPUS[name])
+    assert inlined == plain
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_generated_output_matches(seed):
+    plain, inlined = outputs(ProgramGenerator(seed).generate(30))
+    assert inlined == plain
+
+
+def test_small_function_is_inlined():
+    calls = [
+        sum(instruction.startswith("CALL ") for instruction in compile_program(PROGRAMS["loop"], inline=inline))
+        for inline in (False, True)
+    ]
+    assert calls == [1, 0]
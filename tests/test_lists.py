@@ -0,0 +1,53 @@
+import pytest
+
+from benchmarks import compile_program
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+ENGINES = [VirtualMachine, ThreadedVirtualMachine]
+
+
+def run(engine, code):
+    return engine(compile_program(code), memo_size=0).run()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code, expected", [
+    ('عرف ق = [1, 2, 3] ؟\nق[0] = 10 ؟\nعرض (ق[0] + ق[2]) ؟\nعرض (ق) ؟\n', [13, [10, 2, 3]]),
+    # Elements of another type move the list out of its int array.
+    ('عرف ق = [1, 2] ؟\nق[1] = 2.5 ؟\nعرض (ق) ؟\nق[0] = "س" ؟\nعرض (ق) ؟\n', [[1, 2.5], ["س", 2.5]]),
+    ('عرف م = [[1, 2], [3, 4]] ؟\nم[1][0] = 9 ؟\nعرض (م) ؟\nعرض (م[1][0]) ؟\n', [[[1, 2], [9, 4]], 9]),
+    # Lists are shared by reference.
+    ('عرف ق = [1, 2] ؟\nعرف ر = ق ؟\nر[0] = 5 ؟\nعرض (ق[0]) ؟\n', [5]),
+    ('عرف ق = [] ؟\nأضف(ق, 3) ؟\nعرض (طول(ق)) ؟\nعرض (ق + [4]) ؟\n', [1, [3, 4]]),
+    ('عرف ق = [1, 2] ؟\nدالة غير (ل) {\n    ل[1] = 7 ؟\n}\nغير(ق) ؟\nعرض (ق) ؟\n', [[1, 7]]),
+])
+def test_indexing_and_assignment(engine, code, expected):
+    assert run(engine, code) == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code, message", [
+    ('عرف ق = [1, 2] ؟\nعرض (ق[2]) ؟\n', "List index 2 out of range for a list of length 2."),
+    ('عرف ق = [1, 2] ؟\nعرف ع = 0 - 1 ؟\nعرض (ق[ع]) ؟\n', "List index -1 out of range for a list of length 2."),
+    ('عرف ق = [1, 2] ؟\nق[5] = 1 ؟\n', "List index 5 out of range for a list of length 2."),
+    ('عرف ق = [] ؟\nعرض (ق[0]) ؟\n', "List index 0 out of range for a list of length 0."),
+    # The index's type is only known when the function runs.
+    ('عرف ق = [1, 2] ؟\nدالة خذ (ع) {\n    اعد (ق[ع]) ؟\n}\nعرض (خذ("س")) ؟\n',
+     "List index must be an integer, got 'س'."),
+])
+def test_runtime_errors(engine, code, message):
+    with pytest.raises(ValueError) as error:
+        run(engine, code)
+    assert str(error.value) == message
+
+
+@pytest.mark.parametrize("code, message", [
+    ('عرف ق = [1, 2] ؟\nعرض (ق["س"]) ؟\n', "Type error: an index must be an int, got string."),
+    ('عرف ق = [1, 2] ؟\nق[1.5] = 1 ؟\n', "Type error: an index must be an int, got float."),
+    ('عرف ع = 5 ؟\nعرض (ع[0]) ؟\n', "Type error: cannot index a value of type int."),
+])
+def test_type_errors_are_found_at_compile_time(code, message):
+    with pytest.raises(ValueError) as error:
+        compile_program(code)
+    assert str(error.value) == message
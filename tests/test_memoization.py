@@ -0,0 +1,76 @@
+import pytest
+
+from app import app
+from benchmarks import compile_program
+from memo_cache import MemoCache
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+ENGINES = [VirtualMachine, ThreadedVirtualMachine]
+
+FIB = (
+    'دالة فيب (ن) {\n    لو (ن < 2) {\n        اعد (ن) ؟\n    }\n'
+    '    اعد (فيب(ن - 1) + فيب(ن - 2)) ؟\n}\nعرض (فيب(20)) ؟\n'
+)
+# Writes a global, so every call must run.
+COUNTER = (
+    'عرف عداد = 0 ؟\nدالة عد (ن) {\n    عداد = عداد + ن ؟\n    اعد (عداد) ؟\n}\n'
+    'عرض (عد(1)) ؟\nعرض (عد(1)) ؟\nعرض (عد(1)) ؟\n'
+)
+
+
+def run(engine, code, memo_size):
+    vm = engine(compile_program(code), memo_size=memo_size)
+    vm.run()
+    return vm
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_pure_calls_are_cached(engine):
+    cached, uncached = run(engine, FIB, 4096), run(engine, FIB, 0)
+    assert cached.output == uncached.output == [6765]
+    # Each argument from 0 to 20 is computed once. فيب(ن - 2) hits for every
+    # ن from 3 up: the call for ن - 1 computed it first.
+    assert cached.memo.misses == 21
+    assert cached.memo.hits == 18
+    assert cached.instructions_executed * 50 < uncached.instructions_executed
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_memo_size_zero_turns_caching_off(engine):
+    assert run(engine, FIB, 0).memo is None
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_impure_calls_are_not_cached(engine):
+    vm = run(engine, COUNTER, 4096)
+    assert vm.output == [1, 2, 3]
+    assert vm.memo.hits == vm.memo.misses == 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_evictions_keep_the_output(engine):
+    vm = run(engine, FIB, 2)
+    assert vm.output == [6765]
+    assert vm.memo.evictions > 0
+    assert len(vm.memo.entries) == 2
+
+
+def test_least_recently_used_is_evicted():
+    memo = MemoCache(2)
+    memo.store("a", 1)
+    memo.store("b", 2)
+    assert memo.lookup("a") == (True, 1)
+    memo.store("c", 3)
+    assert memo.lookup("b") == (False, None)
+    assert memo.stats() == {"hits": 1, "misses": 1, "evictions": 1, "entries": 2, "max_entries": 2}
+
+
+@pytest.mark.parametrize("memoize", [True, False])
+def test_run_memoize_switch(memoize):
+    response = app.test_client().post("/run", json={"code": FIB, "memoize": memoize, "profile": True})
+    assert response.status_code == 200
+    assert response.json["output"] == [6765]
+    assert ("memoization" in response.json["profile"]) == memoize
+    if memoize:
+        assert response.json["profile"]["memoization"]["hits"] == 18
@@ -0,0 +1,82 @@
+import pytest
+
+import app as app_module
+from lexer import qualified_name
+from module_library import ModuleLibrary
+
+MATH = (
+    'عرف ثابت = 3 ؟\nعرف عداد = 0 ؟\n'
+    'دالة ضعف (س) {\n    اعد (س * 2) ؟\n}\n'
+    'دالة عد () {\n    عداد = عداد + 1 ؟\n    اعد (عداد) ؟\n}\n'
+)
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    (tmp_path / "رياضيات.fk").write_text(MATH, encoding="utf-8")
+    library = ModuleLibrary(str(tmp_path))
+    monkeypatch.setattr(app_module, "library", library)
+    return library
+
+
+def run(code, include_ast):
+    return app_module.app.test_client().post("/run", json={"code": code, "include_ast": include_ast})
+
+
+def test_exports_are_qualified_and_typed(library):
+    module = library.load("رياضيات")
+    assert module.exports == {qualified_name("رياضيات", "ثابت"): "int", qualified_name("رياضيات", "عداد"): "int"}
+    assert module.functions == {qualified_name("رياضيات", "ضعف"), qualified_name("رياضيات", "عد")}
+    assert qualified_name("رياضيات", "ضعف") in module.pure_functions
+
+
+@pytest.mark.parametrize("include_ast", [False, True])
+def test_imported_functions_and_variables(library, include_ast):
+    code = (
+        'استورد رياضيات ؟\nعرض (رياضيات.ضعف(رياضيات.ثابت)) ؟\n'
+        'عرض (رياضيات.عد()) ؟\nعرض (رياضيات.عد()) ؟\nعرض (رياضيات.عداد) ؟\n'
+    )
+    response = run(code, include_ast)
+    assert response.status_code == 200, response.json
+    assert response.json["output"] == [6, 1, 2, 2]
+
+
+def test_module_is_compiled_once_until_it_changes(library, tmp_path):
+    code = 'استورد رياضيات ؟\nعرض (رياضيات.ثابت) ؟\n'
+    assert run(code, False).json["output"] == [3]
+    assert run(code, True).json["output"] == [3]
+    assert library.compiled == 1
+    (tmp_path / "رياضيات.fk").write_text(MATH.replace("= 3", "= 30"), encoding="utf-8")
+    assert run(code, False).json["output"] == [30]
+    assert library.compiled == 2
+
+
+@pytest.mark.parametrize("include_ast", [False, True])
+@pytest.mark.parametrize("statement", [
+    'رياضيات.ثابت = "س" ؟\n',
+    'رياضيات.ثابت = 5 ؟\n',
+    'عرف رياضيات.ثابت = "س" ؟\n',
+    'دالة ف () {\n    رياضيات.عداد = 1 ؟\n}\n',
+])
+def test_exports_are_read_only(library, include_ast, statement):
+    response = run('استورد رياضيات ؟\n' + statement, include_ast)
+    assert response.status_code == 400
+    assert "'رياضيات.ثابت'" in response.json["error"] or "'رياضيات.عداد'" in response.json["error"]
+    assert "read-only" in response.json["error"]
+
+
+@pytest.mark.parametrize("code, message", [
+    ('استورد مجهول ؟\n', "Unknown module 'مجهول'."),
+    ('استورد رياضيات ؟\nعرض (رياضيات.نصف(2)) ؟\n', "Function 'رياضيات.نصف' is not defined by an imported module."),
+])
+def test_import_errors(library, code, message):
+    response = run(code, False)
+    assert response.status_code == 400
+    assert message in response.json["error"]
+
+
+def test_circular_import(library, tmp_path):
+    (tmp_path / "أ.fk").write_text('استورد ب ؟\n', encoding="utf-8")
+    (tmp_path / "ب.fk").write_text('استورد أ ؟\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="Circular import: أ -> ب -> أ."):
+        library.load("أ")
@@ -0,0 +1,54 @@
+import pytest
+
+from benchmarks import compile_program
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+ENGINES = [VirtualMachine, ThreadedVirtualMachine]
+LIMIT = 64 * 1024
+
+
+def run(engine, code, limit=LIMIT):
+    return engine(compile_program(code), memo_size=0, max_string_bytes=limit).run()
+
+
+@pytest.mark.parametrize("code, message", [
+    ('عرض (طول(1, 2)) ؟\n', "Function 'طول' takes 1 argument, got 2."),
+    ('عرض (مدى()) ؟\n', "Function 'مدى' takes 1 to 3 arguments, got 0."),
+    ('عرض (جزء(5, 1)) ؟\n', "Type error: argument 1 of 'جزء' must be string, got int."),
+    ('عرض (املأ("س", 1)) ؟\n', "Type error: argument 1 of 'املأ' must be bool or int, got string."),
+])
+def test_calls_are_checked_at_compile_time(code, message):
+    with pytest.raises(ValueError) as error:
+        compile_program(code)
+    assert str(error.value) == message
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_natives_under_the_limit(engine):
+    code = (
+        'عرض (طول(املأ(100, 7))) ؟\nعرض (مجموع(مدى(10, 0, 0 - 3))) ؟\n'
+        'عرض (تنسيق(1.5, 2)) ؟\n'
+    )
+    assert run(engine, code) == [100, 22, "1.50"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code, message", [
+    ('عرف ل = املأ(100000, 0) ؟\n', "List too long: 100000 elements is over the limit of 64 KB."),
+    ('عرف ل = املأ(100000, "س") ؟\n', "List too long: 100000 elements is over the limit of 64 KB."),
+    ('عرف ل = مدى(100000) ؟\n', "List too long: 100000 elements is over the limit of 64 KB."),
+    # Too many elements to count with len(), let alone store.
+    ('عرف ل = مدى(0, 100000000000000000000, 1) ؟\n',
+     "List too long: 100000000000000000000 elements is over the limit of 64 KB."),
+    ('عرض (تنسيق(1.5, 100000)) ؟\n', "String too long: 100000 characters is over the limit of 64 KB."),
+])
+def test_natives_over_the_limit(engine, code, message):
+    with pytest.raises(MemoryError) as error:
+        run(engine, code)
+    assert str(error.value) == message
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_no_limit_by_default(engine):
+    assert run(engine, 'عرض (طول(مدى(100000))) ؟\n', limit=None) == [100000]
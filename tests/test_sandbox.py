@@ -0,0 +1,51 @@
+import pytest
+
+from benchmarks import compile_program
+from native_functions import load_native_modules
+from sandbox_pool import SandboxPool
+from virtual_machine import VirtualMachine
+
+NATIVE_MODULES = "sandbox_natives"
+
+
+def job(code):
+    return {
+        "engine": VirtualMachine,
+        "target_code": compile_program(code),
+        "source_map": None,
+        "memo_size": 0,
+        "state": None,
+        "max_instructions": None,
+        "max_string_bytes": 1024 * 1024,
+        "expected_output": None,
+    }
+
+
+@pytest.fixture
+def pool():
+    load_native_modules(NATIVE_MODULES)
+    pool = SandboxPool(size=1, cpu_seconds=5, memory_bytes=0, native_modules=NATIVE_MODULES)
+    yield pool
+    while not pool.idle.empty():
+        pool.idle.get().stop()
+
+
+def test_sandbox_has_the_deployment_natives(pool):
+    result = pool.run(job('عرض (ضعف_اختبار(21)) ؟\n'), timeout=5)
+    assert result.output == [42]
+
+
+def test_failed_start_is_retried(pool, monkeypatch):
+    new_worker = pool.new_worker
+    failures = [OSError("fork failed")]
+
+    def flaky_new_worker():
+        if failures:
+            raise failures.pop()
+        return new_worker()
+
+    monkeypatch.setattr(pool, "new_worker", flaky_new_worker)
+    with pytest.raises(OSError):
+        pool.run(job('عرض (1) ؟\n'), timeout=5)
+    assert not pool.started
+    assert pool.run(job('عرض (2) ؟\n'), timeout=5).output == [2]
@@ -0,0 +1,48 @@
+import pytest
+
+from benchmarks import compile_program
+from scheduler import Scheduler
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+PROGRAM = 'عرف ع = 0 ؟\nبينما (ع < 50) {\n    ع = ع + 1 ؟\n}\nعرض (ع) ؟\n'
+
+
+class BrokenVM:
+    """Fails outside step(), where the scheduler reads its counters."""
+
+    def step(self, n):
+        return False
+
+    @property
+    def instructions_executed(self):
+        raise RuntimeError("broken")
+
+
+@pytest.mark.parametrize("priority", ["x", None, [1], 1.5, True])
+def test_non_integer_priority_is_rejected(priority):
+    scheduler = Scheduler(quantum=10, policy="priority")
+    target_code = compile_program(PROGRAM)
+    with pytest.raises(ValueError):
+        scheduler.submit(VirtualMachine(target_code, debug=False), priority=priority)
+    task = scheduler.submit(ThreadedVirtualMachine(target_code), priority=1)
+    scheduler.run_until_idle()
+    assert task.wait(0) == [50]
+
+
+def test_failing_task_does_not_stop_the_others():
+    scheduler = Scheduler(quantum=10)
+    broken = scheduler.submit(BrokenVM())
+    task = scheduler.submit(ThreadedVirtualMachine(compile_program(PROGRAM)))
+    scheduler.run_until_idle()
+    with pytest.raises(RuntimeError):
+        broken.wait(0)
+    assert task.wait(0) == [50]
+
+
+def test_run_rejects_non_integer_priority():
+    from app import app
+
+    response = app.test_client().post("/run", json={"code": PROGRAM, "priority": "x"})
+    assert response.status_code == 400
+    assert "priority" in response.json["error"]
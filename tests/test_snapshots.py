@@ -0,0 +1,120 @@
+import base64
+import pickle
+import zlib
+
+import pytest
+
+from app import app
+from benchmarks import compile_program
+from snapshot import SnapshotCodec, program_id
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+ENGINES = [VirtualMachine, ThreadedVirtualMachine]
+
+# Stops with calls on the stack, lists and a string still being built.
+PROGRAM = (
+    'عرف ق = [1, 2] ؟\nعرف س = "" ؟\n'
+    'دالة جمع (ن) {\n    لو (ن == 0) {\n        اعد (0) ؟\n    }\n    اعد (ن + جمع(ن - 1)) ؟\n}\n'
+    'عرف ع = 0 ؟\nبينما (ع < 30) {\n    أضف(ق, جمع(ع)) ؟\n    س = س + "ب" ؟\n    عرض (ع) ؟\n    ع = ع + 1 ؟\n}\n'
+    'عرض (مجموع(ق)) ؟\nعرض (طول(س)) ؟\n'
+)
+
+
+@pytest.fixture
+def codec():
+    return SnapshotCodec(b"secret")
+
+
+def run_in_slices(codec, target_code, engines, budget):
+    program = program_id(target_code)
+    token = None
+    for index in range(10_000):
+        vm = engines[index % len(engines)](target_code, memo_size=0)
+        if token is not None:
+            vm.restore(codec.load(token, program))
+        vm.step(budget)
+        if vm.finished():
+            return vm.output
+        token = codec.dump(vm, program)
+    raise AssertionError("The run did not finish.")
+
+
+@pytest.mark.parametrize("engines", [[VirtualMachine], [ThreadedVirtualMachine], ENGINES])
+@pytest.mark.parametrize("budget", [7, 100])
+def test_resumed_run_matches_uninterrupted_run(codec, engines, budget):
+    target_code = compile_program(PROGRAM)
+    expected = VirtualMachine(target_code, memo_size=0).run()
+    assert run_in_slices(codec, target_code, engines, budget) == expected
+
+
+def token(codec, engine=VirtualMachine):
+    target_code = compile_program(PROGRAM)
+    vm = engine(target_code, memo_size=0)
+    vm.step(50)
+    return codec.dump(vm, program_id(target_code)), program_id(target_code)
+
+
+def test_tampered_token_is_rejected(codec):
+    valid, program = token(codec)
+    data = bytearray(base64.urlsafe_b64decode(valid))
+    data[-1] ^= 1
+    with pytest.raises(ValueError, match="Invalid resume token."):
+        codec.load(base64.urlsafe_b64encode(bytes(data)).decode(), program)
+
+
+@pytest.mark.parametrize("bad_token", ["", "not base64!", "AAAA", 5])
+def test_malformed_token_is_rejected(codec, bad_token):
+    _, program = token(codec)
+    with pytest.raises(ValueError, match="Invalid resume token."):
+        codec.load(bad_token, program)
+
+
+def test_token_from_another_secret_is_rejected(codec):
+    valid, program = token(SnapshotCodec(b"other"))
+    with pytest.raises(ValueError, match="Invalid resume token."):
+        codec.load(valid, program)
+
+
+def test_token_of_another_program_is_rejected(codec):
+    valid, _ = token(codec)
+    with pytest.raises(ValueError, match="different program"):
+        codec.load(valid, program_id(compile_program('عرض (1) ؟\n')))
+
+
+def test_expired_token_is_rejected():
+    codec = SnapshotCodec(b"secret", ttl=-1)
+    valid, program = token(codec)
+    with pytest.raises(ValueError, match="expired"):
+        codec.load(valid, program)
+
+
+def test_signed_token_cannot_load_other_classes(codec):
+    # Even with the secret, a token only unpickles the VM's own classes.
+    payload = zlib.compress(pickle.dumps({"program": "x", "created": 0, "vm": print}))
+    forged = base64.urlsafe_b64encode(codec.sign(payload) + payload).decode()
+    with pytest.raises(pickle.UnpicklingError):
+        codec.load(forged, "x")
+
+
+def test_run_resumes_across_requests():
+    client = app.test_client()
+    body = {"code": PROGRAM, "include_ast": False, "max_instructions": 500}
+    full = client.post("/run", json={"code": PROGRAM}).json["output"]
+    response = client.post("/run", json=body).json
+    requests = 1
+    while not response["finished"]:
+        response = client.post("/run", json=dict(body, resume_token=response["resume_token"])).json
+        requests += 1
+    assert requests > 2
+    assert response["output"] == full
+
+
+def test_run_rejects_tampered_token():
+    client = app.test_client()
+    body = {"code": PROGRAM, "max_instructions": 500}
+    resume_token = client.post("/run", json=body).json["resume_token"]
+    tampered = resume_token[:-4] + ("AAAA" if not resume_token.endswith("AAAA") else "BBBB")
+    response = client.post("/run", json=dict(body, resume_token=tampered))
+    assert response.status_code == 400
+    assert response.json["error"] == "Invalid resume token."
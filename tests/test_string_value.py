@@ -0,0 +1,47 @@
+import pytest
+
+from benchmarks import compile_program
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+ENGINES = {
+    "interpreter": lambda target_code, limit: VirtualMachine(target_code, debug=False, max_string_bytes=limit),
+    "threaded": lambda target_code, limit: ThreadedVirtualMachine(target_code, max_string_bytes=limit),
+}
+
+LIMIT = 64 * 1024
+
+
+def run(engine, code, limit=LIMIT):
+    return ENGINES[engine](compile_program(code), limit).run()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code", [
+    'عرف س = "a" * 100000000 ؟\n',
+    'عرف س = 100000000 * "a" ؟\n',
+    'عرف ع = 100000000 ؟\nعرف س = "ab" * ع ؟\n',
+])
+def test_repetition_is_held_to_the_limit(engine, code):
+    with pytest.raises(MemoryError, match="String too long"):
+        run(engine, code)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_repetition_within_the_limit(engine):
+    assert run(engine, 'عرف س = "ab" * 1000 ؟\nعرض (طول(س)) ؟\nعرض ("ab" * 0) ؟\n') == [2000, ""]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_repeated_built_string_is_held_to_the_limit(engine):
+    code = 'عرف س = "" ؟\nعرف ع = 0 ؟\nبينما (ع < 300) {\n    س = س + "a" ؟\n    ع = ع + 1 ؟\n}\nعرض (طول(س * 10)) ؟\n'
+    assert run(engine, code) == [3000]
+    with pytest.raises(MemoryError, match="String too long"):
+        run(engine, code.replace("س * 10", "س * 1000"))
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_appending_is_held_to_the_limit(engine):
+    code = 'عرف س = "" ؟\nبينما (1 < 2) {\n    س = س + "aaaaaaaa" ؟\n}\n'
+    with pytest.raises(MemoryError, match="String too long"):
+        run(engine, code)
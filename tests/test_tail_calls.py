@@ -0,0 +1,53 @@
+import pytest
+
+import virtual_machine
+from benchmarks import compile_program
+from threaded_virtual_machine import ThreadedVirtualMachine
+from virtual_machine import VirtualMachine
+
+ENGINES = [VirtualMachine, ThreadedVirtualMachine]
+DEPTH = 5000
+
+# The recursive call is the function's result: a tail call.
+TAIL_SUM = (
+    'دالة جمع (ن, مجموع) {\n    لو (ن == 0) {\n        اعد (مجموع) ؟\n    }\n'
+    '    اعد (جمع(ن - 1, مجموع + ن)) ؟\n}\n'
+    f'عرض (جمع({DEPTH}, 0)) ؟\n'
+)
+# The addition runs after the recursive call returns: not a tail call.
+SUM = (
+    'دالة جمع (ن) {\n    لو (ن == 0) {\n        اعد (0) ؟\n    }\n'
+    '    اعد (ن + جمع(ن - 1)) ؟\n}\n'
+    f'عرض (جمع({DEPTH})) ؟\n'
+)
+
+
+@pytest.fixture(autouse=True)
+def shallow_call_stack(monkeypatch):
+    monkeypatch.setattr(virtual_machine, "MAX_CALL_DEPTH", DEPTH // 5)
+
+
+def max_depth(vm):
+    depth = 0
+    while not vm.finished():
+        vm.step(10)
+        depth = max(depth, len(vm.call_stack))
+    return depth
+
+
+def test_tail_calls_are_compiled():
+    assert any(instruction.startswith("TAIL_CALL ") for instruction in compile_program(TAIL_SUM, inline=False))
+    assert not any(instruction.startswith("TAIL_CALL ") for instruction in compile_program(SUM, inline=False))
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tail_recursion_runs_in_constant_stack_depth(engine):
+    vm = engine(compile_program(TAIL_SUM), memo_size=0)
+    assert max_depth(vm) == 1
+    assert vm.output == [DEPTH * (DEPTH + 1) // 2]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_other_recursion_is_held_to_the_call_depth(engine):
+    with pytest.raises(ValueError, match="Maximum call depth exceeded"):
+        engine(compile_program(SUM), memo_size=0).run()
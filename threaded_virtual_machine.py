@@ -0,0 +1,264 @@
+import operator
+
+from list_value import ListValue
+from native_functions import NATIVE_FUNCTIONS
+from string_value import add, multiply
+from virtual_machine import INT_OPERATIONS, MEMO_SIZE, VirtualMachine, load_element
+
+GENERIC_ARITHMETIC = {
+    "SUB": operator.sub,
+}
+
+# Operations that can build a string, held to max_string_bytes.
+STRING_BUILDING = {
+    "ADD": add,
+    "CONCAT": add,
+    "MUL": multiply,
+}
+
+GENERIC_COMPARISONS = {
+    "COMPARE_GT": operator.gt,
+    "COMPARE_LT": operator.lt,
+    "COMPARE_EQ": operator.eq,
+    "COMPARE_NE": operator.ne,
+    "COMPARE_GTE": operator.ge,
+    "COMPARE_LTE": operator.le,
+}
+
+
+class ThreadedVirtualMachine(VirtualMachine):
+    """Runs the same instructions as VirtualMachine, but compiles each one
+    once into a closure with its operands bound. Every closure returns the
+    index of the next instruction to run, so the run loop does no decoding
+    and no dispatch lookup. There is no per-instruction debug trace, and
+    profiled runs go through the interpreter's timed loop."""
+
+    def __init__(
+        self, instructions, source_map=None, profiler=None, memo_size=MEMO_SIZE, output=None, max_string_bytes=None,
+    ):
+        super().__init__(
+            instructions, debug=False, source_map=source_map, profiler=profiler, memo_size=memo_size, output=output,
+            max_string_bytes=max_string_bytes,
+        )
+        self.code = [self.compile_instruction(index, instr) for index, instr in enumerate(instructions)]
+
+    def step(self, n=None):
+        if self.profiler is not None:
+            return self.profiled_step(n)
+        code = self.code
+        end = len(code)
+        pc = self.pc
+        executed = 0
+        try:
+            if n is None:
+                while pc < end:
+                    pc = code[pc]()
+                    executed += 1
+            else:
+                while pc < end and executed < n:
+                    pc = code[pc]()
+                    executed += 1
+        except Exception as error:
+            self.pc = pc
+            self.annotate_error(error)
+            raise
+        finally:
+            self.pc = pc
+            self.instructions_executed += executed
+        return pc >= end
+
+    def compile_instruction(self, index, instr):
+        parts = instr.split()
+        command = parts[0]
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        next_pc = index + 1
+
+        if command == "PUSH_INT":
+            value = int(parts[1])
+
+            def push_constant():
+                push(value)
+                return next_pc
+            return push_constant
+
+        if command == "PUSH_STR":
+            value = instr[len("PUSH_STR "):].strip('"')
+
+            def push_constant():
+                push(value)
+                return next_pc
+            return push_constant
+
+        if command == "PUSH":
+            value = " ".join(parts[1:])
+            if value.startswith('"') and value.endswith('"'):
+                constant = value.strip('"')
+            elif value.replace('.', '', 1).lstrip('-').isdigit():
+                constant = float(value) if '.' in value else int(value)
+            else:
+                global_variables = self.globals
+
+                def push_variable():
+                    memory = self.memory
+                    if value in memory:
+                        push(memory[value])
+                    elif value in global_variables:
+                        push(global_variables[value])
+                    else:
+                        raise ValueError(f"Undefined variable or invalid value: {value}")
+                    return next_pc
+                return push_variable
+
+            def push_constant():
+                push(constant)
+                return next_pc
+            return push_constant
+
+        if command == "STORE":
+            name = parts[1]
+
+            frame_for = self.frame_for
+
+            def store():
+                if not stack:
+                    raise ValueError("Stack underflow: Cannot STORE without a value on the stack.")
+                frame_for(name)[name] = pop()
+                return next_pc
+            return store
+
+        if command == "STORE_LOCAL":
+            name = parts[1]
+
+            def store_local():
+                if not stack:
+                    raise ValueError("Stack underflow: Cannot STORE without a value on the stack.")
+                self.memory[name] = pop()
+                return next_pc
+            return store_local
+
+        if command in INT_OPERATIONS or command in GENERIC_COMPARISONS:
+            function = INT_OPERATIONS.get(command) or GENERIC_COMPARISONS[command]
+            operation = "arithmetic operation" if command in INT_OPERATIONS else "comparison"
+
+            def compare_or_int_operation():
+                if len(stack) < 2:
+                    raise ValueError(f"Stack underflow: Not enough values for {operation}.")
+                b = pop()
+                push(int(function(pop(), b)))
+                return next_pc
+            return compare_or_int_operation
+
+        if command in STRING_BUILDING:
+            function = STRING_BUILDING[command]
+            limit = self.max_string_bytes
+
+            def string_building():
+                if len(stack) < 2:
+                    raise ValueError("Stack underflow: Not enough values for arithmetic operation.")
+                b = pop()
+                push(function(pop(), b, limit))
+                return next_pc
+            return string_building
+
+        if command in GENERIC_ARITHMETIC:
+            function = GENERIC_ARITHMETIC[command]
+
+            def arithmetic():
+                if len(stack) < 2:
+                    raise ValueError("Stack underflow: Not enough values for arithmetic operation.")
+                b = pop()
+                push(function(pop(), b))
+                return next_pc
+            return arithmetic
+
+        if command == "PRINT":
+            output = self.output
+            handle_print = self.handle_print
+
+            def print_value():
+                output.append(handle_print())
+                return next_pc
+            return print_value
+
+        if command == "CALL_NATIVE" and parts[1] in NATIVE_FUNCTIONS:
+            call = NATIVE_FUNCTIONS[parts[1]].call
+            count = int(parts[2])
+            limit = self.max_string_bytes
+
+            def call_native():
+                if len(stack) < count:
+                    raise ValueError("Stack underflow: Not enough arguments for native call.")
+                args = stack[len(stack) - count:]
+                if count:
+                    del stack[-count:]
+                push(call(args, limit))
+                return next_pc
+            return call_native
+
+        if command == "INDEX_LOAD":
+            def index_load():
+                if len(stack) < 2:
+                    raise ValueError("Stack underflow: Not enough values for INDEX_LOAD.")
+                index = pop()
+                target = pop()
+                # Lists are the common case: skip load_element's dispatch.
+                push(target.get(index) if type(target) is ListValue else load_element(target, index))
+                return next_pc
+            return index_load
+
+        if command == "INDEX_STORE":
+            handle_index_store = self.handle_index_store
+
+            def index_store():
+                handle_index_store()
+                return next_pc
+            return index_store
+
+        if command in ("JUMP", "JUMP_IF_TRUE", "JUMP_IF_FALSE"):
+            return self.compile_jump(command, parts[1], next_pc)
+
+        if command in ("LABEL", "FUNC_START", "PARAM"):
+            def no_op():
+                return next_pc
+            return no_op
+
+        # Calls, returns and the remaining instructions are rare enough to go
+        # through the interpreter's handlers, with the program counter synced.
+        def interpreted():
+            self.pc = index
+            result = self.execute(instr)
+            if result is not None:
+                self.output.append(result)
+            return self.pc + 1
+        return interpreted
+
+    def compile_jump(self, command, label, next_pc):
+        stack = self.stack
+        pop = stack.pop
+        if label not in self.labels:
+            def invalid_jump():
+                raise ValueError(f"Invalid jump label: {label}")
+            return invalid_jump
+        # Land on the label, as the interpreter does, so both engines count
+        # the same instructions against max_instructions.
+        target = self.labels[label]
+
+        if command == "JUMP":
+            def jump():
+                return target
+            return jump
+
+        if command == "JUMP_IF_TRUE":
+            def jump_if_true():
+                if not stack:
+                    raise ValueError("Stack underflow: Nothing to evaluate for JUMP_IF_TRUE.")
+                return target if pop() else next_pc
+            return jump_if_true
+
+        def jump_if_false():
+            if not stack:
+                raise ValueError("Stack underflow: Nothing to evaluate for JUMP_IF_FALSE.")
+            return next_pc if pop() else target
+        return jump_if_false
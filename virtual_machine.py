@@ -1,12 +1,70 @@
+import operator
+import time
+
+from list_value import ListValue
+from memo_cache import MemoCache
+from native_functions import NATIVE_FUNCTIONS
+from string_value import StringValue, add, multiply, text_of
+
+# Type-specialized instructions emitted when both operands are statically ints.
+INT_OPERATIONS = {
+    "ADD_INT": operator.add,
+    "SUB_INT": operator.sub,
+    "MUL_INT": operator.mul,
+    "COMPARE_GT_INT": operator.gt,
+    "COMPARE_LT_INT": operator.lt,
+    "COMPARE_EQ_INT": operator.eq,
+    "COMPARE_NE_INT": operator.ne,
+    "COMPARE_GTE_INT": operator.ge,
+    "COMPARE_LTE_INT": operator.le,
+}
+
+# Default bound on cached results of pure function calls per run.
+MEMO_SIZE = 4096
+
+# Nested calls allowed before a run fails; tail calls do not nest.
+MAX_CALL_DEPTH = 100_000
+
+
+def load_element(target, index):
+    """target[index] for a list or a string."""
+    if isinstance(target, ListValue):
+        return target.get(index)
+    if type(target) is StringValue:
+        target = target.flatten()
+    if isinstance(target, str):
+        if type(index) is not int or not 0 <= index < len(target):
+            raise ValueError(f"String index {index!r} out of range for a string of length {len(target)}.")
+        return target[index]
+    raise ValueError(f"Cannot index {type(target).__name__} value {target!r}.")
+
+
 class VirtualMachine:
-    def __init__(self, instructions):
+    def __init__(
+        self, instructions, debug=False, source_map=None, profiler=None, memo_size=MEMO_SIZE, output=None,
+        max_string_bytes=None,
+    ):
         self.instructions = instructions
+        self.debug = debug  # Trace every instruction to stdout
+        self.source_map = source_map
+        self.profiler = profiler
         self.stack = []
-        self.memory = {}
+        self.globals = {}
+        self.memory = self.globals  # Variables of the running frame
         self.labels = self.scan_labels()
+        self.function_layouts = self.scan_functions()
         self.functions = {}
-        self.call_stack = []
+        self.pure_functions = set()  # Defined with FUNC_DEFINE name PURE
+        # Results of pure function calls; memo_size=0 turns caching off.
+        self.memo = MemoCache(memo_size) if memo_size else None
+        self.call_stack = []  # (return PC, caller's frame, memo key or None)
         self.pc = 0  # Program counter
+        # Printed values; a grader's list checks each one as it is appended.
+        self.output = [] if output is None else output
+        self.instructions_executed = 0
+        # Largest string the run may build by concatenation, in the bytes
+        # StringValue accounts for it; None for no limit.
+        self.max_string_bytes = max_string_bytes
 
     def scan_labels(self):
         labels = {}
@@ -16,6 +74,23 @@ class VirtualMachine:
                 labels[label_name] = index
         return labels
 
+    def scan_functions(self):
+        """Map each FUNC_DEFINE's PC to its parameters, the PC its body starts
+        at and the PC of its FUNC_END, in one pass over the program."""
+        layouts = {}
+        open_functions = []  # [define PC, parameters, body PC]
+        for index, instr in enumerate(self.instructions):
+            if instr.startswith("FUNC_DEFINE"):
+                open_functions.append([index, [], None])
+            elif instr.startswith("PARAM") and open_functions:
+                open_functions[-1][1].append(instr.split()[1])
+            elif instr.startswith("FUNC_START") and open_functions:
+                open_functions[-1][2] = index
+            elif instr.startswith("FUNC_END") and open_functions:
+                define_pc, params, body_pc = open_functions.pop()
+                layouts[define_pc] = (params, index if body_pc is None else body_pc, index)
+        return layouts
+
     def debug_state(self):
         print(f"PC: {self.pc}, Instruction: {self.instructions[self.pc]}")
         print(f"Stack: {self.stack}")
@@ -23,36 +98,151 @@ class VirtualMachine:
         print("-------------")
 
     def run(self):
-        output = []
-        while self.pc < len(self.instructions):
-            self.debug_state()
-            instr = self.instructions[self.pc]
-            result = self.execute(instr)
-            if result is not None:
-                output.append(result)
-            self.pc += 1
-        return output
+        self.step()
+        return self.output
+
+    def finished(self):
+        return self.pc >= len(self.instructions)
+
+    def snapshot(self):
+        """The execution state, for snapshot.py. Frames and lists shared
+        between variables are shared in the returned data too."""
+        return {
+            "pc": self.pc,
+            "stack": self.stack,
+            "globals": self.globals,
+            "memory": self.memory,
+            # Pending memo stores are dropped: the cache is rebuilt as it runs.
+            "call_stack": [(return_pc, memory) for return_pc, memory, _ in self.call_stack],
+            "functions": self.functions,
+            "pure_functions": sorted(self.pure_functions),
+            "output": list(self.output),
+            "instructions_executed": self.instructions_executed,
+        }
+
+    def restore(self, state):
+        """Continue from a state returned by snapshot(). The stack, globals
+        and output are updated in place, since the threaded VM's compiled
+        instructions hold on to them."""
+        def frame(memory):
+            return self.globals if memory is state["globals"] else memory
+
+        self.pc = state["pc"]
+        self.stack[:] = state["stack"]
+        self.globals.clear()
+        self.globals.update(state["globals"])
+        self.memory = frame(state["memory"])
+        self.call_stack = [(return_pc, frame(memory), None) for return_pc, memory in state["call_stack"]]
+        self.functions = state["functions"]
+        self.pure_functions = set(state["pure_functions"])
+        self.output[:] = state["output"]
+        self.instructions_executed = state["instructions_executed"]
+
+    def step(self, n=None):
+        """Execute up to n instructions (all of them if n is None) and return
+        whether the program has finished. All execution state lives on the
+        instance, so the next call resumes where this one stopped."""
+        if self.profiler is not None:
+            return self.profiled_step(n)
+        end = len(self.instructions)
+        executed = 0
+        try:
+            while self.pc < end:
+                if n is not None and executed >= n:
+                    return False
+                if self.debug:
+                    self.debug_state()
+                instr = self.instructions[self.pc]
+                result = self.execute(instr)
+                if result is not None:
+                    self.output.append(result)
+                self.pc += 1
+                executed += 1
+        except Exception as error:
+            self.annotate_error(error)
+            raise
+        finally:
+            self.instructions_executed += executed
+        return True
+
+    def profiled_step(self, n=None):
+        """step() that also times every instruction into self.profiler."""
+        end = len(self.instructions)
+        executed = 0
+        profiler = self.profiler
+        clock = time.perf_counter
+        try:
+            while self.pc < end:
+                if n is not None and executed >= n:
+                    return False
+                if self.debug:
+                    self.debug_state()
+                pc = self.pc
+                depth = len(self.call_stack)
+                start = clock()
+                result = self.execute(self.instructions[pc])
+                elapsed = clock() - start
+                profiler.record(pc, elapsed, depth, len(self.call_stack))
+                if result is not None:
+                    self.output.append(result)
+                self.pc += 1
+                executed += 1
+        except Exception as error:
+            self.annotate_error(error)
+            raise
+        finally:
+            self.instructions_executed += executed
+        return True
+
+    def annotate_error(self, error):
+        """Name the source line of the failing instruction on a runtime error."""
+        if self.source_map is None:
+            return
+        line = self.source_map.line_for(self.pc)
+        if line is not None:
+            error.source_line = line
+            error.add_note(f"at line {line}")
 
     def execute(self, instr):
         parts = instr.split()
         command = parts[0]
 
-        if command == "PUSH":
+        if command == "PUSH_INT":
+            self.stack.append(int(parts[1]))
+        elif command in INT_OPERATIONS:
+            self.handle_int_operation(command)
+        elif command == "PUSH_STR":
+            self.stack.append(instr[len("PUSH_STR "):].strip('"'))
+        elif command == "CONCAT":
+            self.handle_concat()
+        elif command == "PUSH":
             self.handle_push(parts[1:])
         elif command == "STORE":
             self.handle_store(parts[1:])
+        elif command == "STORE_LOCAL":
+            self.handle_store_local(parts[1])
         elif command == "RETURN":
             self.handle_return()
         elif command == "FUNC_DEFINE":
-            self.handle_func_define(parts[1])
+            self.handle_func_define(*parts[1:])
         elif command == "FUNC_START":
             pass  
         elif command == "FUNC_END":
             self.handle_func_end() 
         elif command == "PARAM":
-            self.handle_param(parts[1])
+            pass  # Parameters are bound by CALL
         elif command == "CALL":
             self.handle_call(parts[1])
+        elif command == "TAIL_CALL":
+            self.handle_call(parts[1], tail=True)
+        elif command == "CALL_NATIVE":
+            self.handle_call_native(parts[1], int(parts[2]))
+        elif command == "BUILD_LIST":
+            self.handle_build_list(int(parts[1]))
+        elif command == "INDEX_LOAD":
+            self.handle_index_load()
+        elif command == "INDEX_STORE":
+            self.handle_index_store()
         elif command in {"ADD", "SUB", "MUL", "DIV"}:
             self.handle_arithmetic(command)
         elif command.startswith("COMPARE"):
@@ -78,6 +268,8 @@ class VirtualMachine:
             self.stack.append(value.strip('"'))
         elif value in self.memory:
             self.stack.append(self.memory[value])
+        elif value in self.globals:
+            self.stack.append(self.globals[value])
         elif value.replace('.', '', 1).lstrip('-').isdigit():  # Handles integers and floats
             self.stack.append(float(value) if '.' in value else int(value))
         else:
@@ -88,8 +280,23 @@ class VirtualMachine:
         if not self.stack:
             raise ValueError("Stack underflow: Cannot STORE without a value on the stack.")
         var_name = args[0]
+        frame = self.frame_for(var_name)
+        frame[var_name] = self.stack.pop()
+        if self.debug:
+            print(f"DEBUG: Stored {frame[var_name]} in {var_name}")
+
+    def handle_store_local(self, var_name):
+        # A declaration: always the running frame, even over a global.
+        if not self.stack:
+            raise ValueError("Stack underflow: Cannot STORE without a value on the stack.")
         self.memory[var_name] = self.stack.pop()
-        print(f"DEBUG: Stored {self.memory[var_name]} in {var_name}")
+
+    def frame_for(self, var_name):
+        """Inside a function, names that are not yet local but exist as
+        globals are global writes; everything else is local to the call."""
+        if var_name not in self.memory and var_name in self.globals:
+            return self.globals
+        return self.memory
 
     def handle_arithmetic(self, command):
         if len(self.stack) < 2:
@@ -97,16 +304,55 @@ class VirtualMachine:
         b = self.stack.pop()
         a = self.stack.pop()
         if command == "ADD":
-            self.stack.append(a + b)
+            self.stack.append(add(a, b, self.max_string_bytes))
         elif command == "SUB":
             self.stack.append(a - b)
         elif command == "MUL":
-            self.stack.append(a * b)
+            self.stack.append(multiply(a, b, self.max_string_bytes))
         elif command == "DIV":
             if b == 0:
                 raise ZeroDivisionError("Division by zero.")
             self.stack.append(a / b)
 
+    def handle_int_operation(self, command):
+        if len(self.stack) < 2:
+            raise ValueError("Stack underflow: Not enough values for arithmetic operation.")
+        b = self.stack.pop()
+        a = self.stack.pop()
+        # Comparisons keep the VM's 1/0 convention for booleans.
+        self.stack.append(int(INT_OPERATIONS[command](a, b)))
+
+    def handle_concat(self):
+        if len(self.stack) < 2:
+            raise ValueError("Stack underflow: Not enough values for arithmetic operation.")
+        b = self.stack.pop()
+        a = self.stack.pop()
+        self.stack.append(add(a, b, self.max_string_bytes))
+
+    def handle_build_list(self, count):
+        if len(self.stack) < count:
+            raise ValueError("Stack underflow: Not enough values for BUILD_LIST.")
+        values = self.stack[len(self.stack) - count:]
+        if count:
+            del self.stack[-count:]
+        self.stack.append(ListValue(values))
+
+    def handle_index_load(self):
+        if len(self.stack) < 2:
+            raise ValueError("Stack underflow: Not enough values for INDEX_LOAD.")
+        index = self.stack.pop()
+        self.stack.append(load_element(self.stack.pop(), index))
+
+    def handle_index_store(self):
+        if len(self.stack) < 3:
+            raise ValueError("Stack underflow: Not enough values for INDEX_STORE.")
+        value = self.stack.pop()
+        index = self.stack.pop()
+        target = text_of(self.stack.pop())
+        if not isinstance(target, ListValue):
+            raise ValueError(f"Cannot assign to an element of {type(target).__name__} value {target!r}.")
+        target.set(index, value)
+
     def handle_comparison(self, command):
         if len(self.stack) < 2:
             raise ValueError("Stack underflow: Not enough values for comparison.")
@@ -139,7 +385,12 @@ class VirtualMachine:
         if not self.stack:
             raise ValueError("Stack underflow: Nothing to PRINT.")
         value = self.stack.pop()
-        print(f"OUTPUT: {value}")
+        if isinstance(value, ListValue):
+            value = value.to_python()  # Output is plain JSON data
+        elif type(value) is StringValue:
+            value = value.flatten()
+        if self.debug:
+            print(f"OUTPUT: {value}")
         return value
 
     def handle_jump(self, args):
@@ -169,32 +420,78 @@ class VirtualMachine:
     
 
 
-    def handle_func_define(self, func_name):
-        self.functions[func_name] = self.pc + 1
-        # Skip to FUNC_END
-        while not self.instructions[self.pc].startswith("FUNC_END"):
-            if self.pc >= len(self.instructions):
-                raise ValueError(f"FUNC_END not found for function {func_name}")
-            self.pc += 1
-
-    def handle_param(self, param_name):
-        if not self.call_stack:
-            raise ValueError("No active function call to assign parameter.")
-        if not self.stack:
-            raise ValueError("Stack underflow: Cannot assign parameter without a value on the stack.")
-        value = self.stack.pop(0)
-        self.memory[param_name] = value
+    def handle_func_define(self, func_name, *flags):
+        if self.pc not in self.function_layouts:
+            raise ValueError(f"FUNC_END not found for function {func_name}")
+        params, body_pc, end_pc = self.function_layouts[self.pc]
+        self.functions[func_name] = (params, body_pc)
+        if "PURE" in flags:
+            self.pure_functions.add(func_name)
+        else:
+            self.pure_functions.discard(func_name)
+        self.pc = end_pc  # Skip the body
 
-    def handle_call(self, func_name):
+    def handle_call(self, func_name, tail=False):
+        """Call a function. A tail call (whose result is the running
+        function's result) reuses the running function's call-stack entry,
+        so tail recursion runs in constant stack space."""
         if func_name not in self.functions:
             raise ValueError(f"Undefined function: {func_name}")
-        self.call_stack.append(self.pc)  # Save the current program counter
-        self.pc = self.functions[func_name] - 1  # Jump to the function's start
+        params, body_pc = self.functions[func_name]
+        count = len(params)
+        if len(self.stack) < count:
+            raise ValueError("Stack underflow: Cannot assign parameter without a value on the stack.")
+        # Arguments are the top `count` values, pushed in parameter order.
+        args = self.stack[len(self.stack) - count:]
+        if count:
+            del self.stack[-count:]
+        memo_key = None
+        if self.memo is not None and func_name in self.pure_functions:
+            # The types are part of the key: f(1) and f(1.0) may differ.
+            memo_key = (func_name, tuple(args), tuple(map(type, args)))
+            try:
+                found, value = self.memo.lookup(memo_key)
+            except TypeError:
+                found, memo_key = False, None  # Unhashable argument
+            if found:
+                self.stack.append(value)
+                if tail and self.call_stack:
+                    self.return_to_caller()
+                return
+        if tail and self.call_stack:
+            # The callee returns straight to this function's caller; its
+            # result is also the result this function's memo key waits for.
+            return_pc, caller_memory, pending_key = self.call_stack[-1]
+            self.call_stack[-1] = (return_pc, caller_memory, pending_key or memo_key)
+        else:
+            if len(self.call_stack) >= MAX_CALL_DEPTH:
+                raise ValueError(f"Maximum call depth exceeded ({MAX_CALL_DEPTH} nested calls).")
+            # Save the current program counter and the caller's variables, and
+            # give the call a fresh frame so recursion does not clobber them.
+            self.call_stack.append((self.pc, self.memory, memo_key))
+        self.memory = dict(zip(params, args))
+        self.pc = body_pc - 1  # Jump to the function's start
+
+    def handle_call_native(self, func_name, count):
+        if func_name not in NATIVE_FUNCTIONS:
+            raise ValueError(f"Undefined native function: {func_name}")
+        if len(self.stack) < count:
+            raise ValueError("Stack underflow: Not enough arguments for native call.")
+        args = self.stack[len(self.stack) - count:]
+        if count:
+            del self.stack[-count:]
+        self.stack.append(NATIVE_FUNCTIONS[func_name].call(args, self.max_string_bytes))
 
     def handle_return(self):
         if self.call_stack:
-            self.pc = self.call_stack.pop() 
-    
+            self.return_to_caller()
+
     def handle_func_end(self):
         if self.call_stack:
-            self.pc = self.call_stack.pop() 
+            self.stack.append(0)  # Functions without a return value return 0
+            self.return_to_caller()
+
+    def return_to_caller(self):
+        self.pc, self.memory, memo_key = self.call_stack.pop()
+        if memo_key is not None:
+            self.memo.store(memo_key, self.stack[-1])